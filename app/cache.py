@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from app.db_pool import pool
+
+# Limites del cache de respuestas; RESPONSE_CACHE_MAX_ENTRIES=0 lo desactiva
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "64"))
+
+# Dominios de datos con versiones propias: cada uno agrupa las tablas que alimentan
+# a los endpoints que se cachean
+EXPENSES = "expenses"
+INCOMES = "incomes"
+CARDS = "cards"
+
+
+log = logging.getLogger(__name__)
+
+
+def mes_de(fecha) -> str:
+    """'2024-03-15T10:00:00' -> '2024-03' (tambien acepta date/datetime)."""
+    return str(fecha)[:7]
+
+
+class Versiones:
+    """
+    Contador de versiones por (dominio, mes) mas uno por dominio completo.
+
+    Los caminos de escritura lo incrementan despues de confirmar la transaccion; una
+    respuesta cacheada solo se sirve si fue calculada con las mismas versiones que hay
+    ahora. Como la version se lee antes de consultar la base, una escritura que confirma
+    en el medio deja la entrada con una version vieja y nunca se sirve.
+
+    Con usar_base() los contadores tambien se guardan en la tabla cache_versions, asi una
+    escritura en un worker invalida el cache de los demas (cada uno tiene su propio LRU).
+    La version es la compartida mas la local; la local cubre las bases todavia sin migrar.
+    version() consulta la base: desde el event loop se llama en el executor de lectura.
+    """
+
+    def __init__(self):
+        self._meses = {}
+        self._dominios = {}
+        self._lock = threading.Lock()
+        self._base = None
+
+    def usar_base(self, db_path):
+        """db_path(): base con la tabla cache_versions (se resuelve en cada uso)."""
+        self._base = db_path
+
+    def bump(self, dominio, meses=None):
+        """meses: iterable de 'YYYY-MM'; None invalida el dominio entero (por ejemplo cotizaciones)."""
+        meses = None if meses is None else list(meses)
+        with self._lock:
+            if meses is None:
+                self._dominios[dominio] = self._dominios.get(dominio, 0) + 1
+            else:
+                for mes in meses:
+                    clave = (dominio, mes)
+                    self._meses[clave] = self._meses.get(clave, 0) + 1
+        if self._base is None or meses == []:
+            return
+        try:
+            with pool.escritura(self._base()) as conn:
+                conn.executemany("""
+                    INSERT INTO cache_versions (domain, month, version) VALUES (?, ?, 1)
+                    ON CONFLICT(domain, month) DO UPDATE SET version = version + 1
+                """, [(dominio, mes) for mes in (meses if meses is not None else [""])])
+        except sqlite3.OperationalError as e:
+            log.warning("no se pudo compartir la version del cache", extra={"domain": dominio, "error": str(e)})
+
+    def version(self, dominio, anio, mes):
+        mes = f"{int(anio):04d}-{int(mes):02d}"
+        compartidas = {}
+        if self._base is not None:
+            try:
+                with pool.lectura(self._base()) as conn:
+                    compartidas = dict(conn.execute(
+                        "SELECT month, version FROM cache_versions WHERE domain = ? AND month IN ('', ?)", (dominio, mes)
+                    ).fetchall())
+            except sqlite3.OperationalError:
+                pass
+        return (
+            self._dominios.get(dominio, 0) + compartidas.get("", 0),
+            self._meses.get((dominio, mes), 0) + compartidas.get(mes, 0),
+        )
+
+
+class _Entrada:
+    __slots__ = ("version", "body", "etag")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    """
+    LRU de cuerpos JSON ya serializados, limitado por cantidad de entradas y por bytes.
+    Las entradas guardan la version con la que se calcularon; si ya no coincide se
+    descartan al leerlas.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, clave, version):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada.version == version:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return entrada
+            if entrada is not None:
+                self._quitar(clave)
+                self.stale += 1
+            self.misses += 1
+            return None
+
+    def put(self, clave, version, body: bytes):
+        """Guarda el cuerpo y devuelve la entrada (con su ETag) aunque no entre en el cache."""
+        entrada = _Entrada(version, body)
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return entrada
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = entrada
+            self._bytes += len(body)
+            while len(self._entradas) > self.max_entries or self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+                self.evictions += 1
+        return entrada
+
+    def _quitar(self, clave):
+        self._bytes -= len(self._entradas.pop(clave).body)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def stats(self):
+        consultas = self.hits + self.misses
+        return {
+            "entries": len(self._entradas),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "not_modified": self.not_modified,
+            "hit_ratio": round(self.hits / consultas, 4) if consultas else None,
+        }
+
+
+versiones = Versiones()
+response_cache = ResponseCache()
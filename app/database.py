@@ -1,200 +1,462 @@
+import csv
+import hashlib
+import json
+import logging
+import os
 import sqlite3
+import sys
+import time
 from pathlib import Path
-from datetime import datetime
-import requests
+from datetime import datetime, timedelta
+from app.cache import CARDS, EXPENSES, INCOMES, mes_de, versiones
+from app.db_pool import pool
+from app.metrics import db_latency, db_queries
+from app.money import cents_formatter, parse_cents, to_cents
+from app.rates import CachedRate, provider_from_env
 
-# Paths para cada base de datos
-REGISTROS_DB = Path(__file__).resolve().parent.parent / "data" / "registros.db"
-TARJETAS_DB = Path(__file__).resolve().parent.parent / "data" / "tarjetas.db"
+log = logging.getLogger(__name__)
+
+# Paths para cada base de datos (DATA_DIR permite apuntar todos los workers a otro directorio)
+DATA_DIR = Path(os.getenv("DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+REGISTROS_DB = DATA_DIR / "registros.db"
+TARJETAS_DB = DATA_DIR / "tarjetas.db"
+
+# Versiones del cache compartidas entre workers (tabla cache_versions, ver create_worker_tables)
+versiones.usar_base(lambda: REGISTROS_DB)
 
 # Asegurar que la carpeta data/ exista
 REGISTROS_DB.parent.mkdir(exist_ok=True, parents=True)
 
-def conectar(db_path: Path):
-    return sqlite3.connect(db_path)
+_TABLAS_TARJETAS = {"cards_resume_header", "card_resume_holder", "card_holder_expenses"}
+
+def _db_de_tabla(tabla):
+    # Se resuelve en cada llamada: los benchmarks y tests reasignan REGISTROS_DB / TARJETAS_DB
+    return TARJETAS_DB if tabla in _TABLAS_TARJETAS else REGISTROS_DB
+
+class _ConexionMedida:
+    # Cuenta las sentencias de un bloque sin trace callback de SQLite, que se invoca por
+    # cada fila de un executemany y duplica el costo de las cargas masivas
+    __slots__ = ("_conn", "consultas")
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.consultas = 0
+
+    def execute(self, *args):
+        self.consultas += 1
+        return self._conn.execute(*args)
+
+    def executemany(self, *args):
+        self.consultas += 1
+        return self._conn.executemany(*args)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+class _Medicion:
+    # Tiempo del bloque (incluye la espera del escritor) y sentencias, por funcion llamadora
+    __slots__ = ("_ctx", "_funcion", "_modo", "_inicio", "_conexion")
+
+    def __init__(self, ctx, funcion, modo):
+        self._ctx = ctx
+        self._funcion = funcion
+        self._modo = modo
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        self._conexion = _ConexionMedida(self._ctx.__enter__())
+        return self._conexion
+
+    def __exit__(self, *exc):
+        try:
+            return self._ctx.__exit__(*exc)
+        finally:
+            db_latency.observe(time.perf_counter() - self._inicio, function=self._funcion, mode=self._modo)
+            db_queries.inc(self._conexion.consultas, function=self._funcion, mode=self._modo)
+
+
+def conectar(db_path: Path, escritura: bool = False):
+    # Lecturas: conexion reutilizada por hilo. Escrituras: escritor unico serializado
+    # que confirma al salir del bloque (o hace rollback si hay excepcion).
+    funcion = sys._getframe(1).f_code.co_name
+    if escritura:
+        return _Medicion(pool.escritura(db_path), funcion, "write")
+    return _Medicion(pool.lectura(db_path), funcion, "read")
+
+def rango_mes(anio, mes):
+    # Limites [inicio, fin) del mes en ISO, comparables contra las columnas de fecha
+    # guardadas con isoformat() para que los filtros puedan usar los indices.
+    anio, mes = int(anio), int(mes)
+    try:
+        inicio = datetime(anio, mes, 1)
+        fin = datetime(anio + mes // 12, mes % 12 + 1, 1)
+    except ValueError:
+        # Mes o anio fuera de rango (/expenses/2024/13, /expenses/0/1, /expenses/9999/12):
+        # rango vacio, la respuesta sale vacia como con el filtro por strftime de antes
+        # en lugar de un 500
+        return "", ""
+    return inicio.strftime("%Y-%m-%d"), fin.strftime("%Y-%m-%d")
+
+
+def _agregar_columna(conn, tabla, columna, tipo):
+    # Migracion para bases creadas antes de que existiera la columna
+    columnas = {row[1] for row in conn.execute(f"PRAGMA table_info({tabla})")}
+    if columna not in columnas:
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
 
 
 # ------------------- REGISTROS GENERALES -------------------
 
 def crear_tabla_registros():
-    with conectar(REGISTROS_DB) as conn:
+    with conectar(REGISTROS_DB, escritura=True) as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS registros (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 uuid TEXT UNIQUE,
                 marca_temporal TEXT,
                 descripcion TEXT,
-                importe REAL,
-                tipo TEXT
+                importe_cents INTEGER,
+                tipo TEXT,
+                content_hash TEXT
             )
         """)
+        _agregar_columna(conn, "registros", "content_hash", "TEXT")
+        _agregar_columna(conn, "registros", "importe_cents", "INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_registros_marca_temporal ON registros(marca_temporal)")
         conn.commit()
 
 def create_income_table():
-    with conectar(REGISTROS_DB) as conn:
+    with conectar(REGISTROS_DB, escritura=True) as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS income (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 uuid TEXT UNIQUE,
                 marca_temporal TEXT,
                 descripcion TEXT,
-                importe REAL,
-                moneda TEXT
+                importe_cents INTEGER,
+                moneda TEXT,
+                content_hash TEXT
             )
         """)
+        _agregar_columna(conn, "income", "content_hash", "TEXT")
+        _agregar_columna(conn, "income", "importe_cents", "INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_income_marca_temporal ON income(marca_temporal)")
         conn.commit()
 
 def insertar_registro(uuid, marca_temporal, descripcion, importe, tipo):
-    with conectar(REGISTROS_DB) as conn:
+    with conectar(REGISTROS_DB, escritura=True) as conn:
         try:
             conn.execute("""
-                INSERT INTO registros (uuid, marca_temporal, descripcion, importe, tipo)
+                INSERT INTO registros (uuid, marca_temporal, descripcion, importe_cents, tipo)
                 VALUES (?, ?, ?, ?, ?)
-            """, (uuid, marca_temporal, descripcion, importe, tipo))
+            """, (uuid, marca_temporal, descripcion, to_cents(importe), tipo))
+            _indexar_busqueda(conn, "registros")
             conn.commit()
-            return True
         except sqlite3.IntegrityError:
             return False
+    versiones.bump(EXPENSES, [mes_de(marca_temporal)])
+    return True
 
-def obtener_registros(anio, mes):
+def obtener_registros(anio, mes, raw=False):
+    fmt = cents_formatter(raw)
     with conectar(REGISTROS_DB) as conn:
         cursor = conn.execute("""
-            SELECT uuid, marca_temporal, descripcion, importe, tipo
+            SELECT uuid, marca_temporal, descripcion, importe_cents, tipo
             FROM registros
-            WHERE strftime('%Y', marca_temporal) = ? AND strftime('%m', marca_temporal) = ?
-        """, (str(anio), f"{int(mes):02}"))
+            WHERE marca_temporal >= ? AND marca_temporal < ?
+        """, rango_mes(anio, mes))
 
         registros = []
-        total_importe = 0.0
-        totales_por_tipo = {}  # Diccionario para acumular totales por categoría
-
         for row in cursor.fetchall():
             uuid, marca_temporal, descripcion, importe, tipo = row
-            total_importe += importe
-            
-            # Acumular el importe por tipo/categoría
-            if tipo in totales_por_tipo:
-                totales_por_tipo[tipo] += importe
-            else:
-                totales_por_tipo[tipo] = importe
 
-            importe_str = f"{importe:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
             registros.append({
                 "uuid": uuid,
                 "datetime": marca_temporal,
                 "description": descripcion,
-                "amount": importe_str,
+                "amount": fmt(importe),
                 "type": tipo
             })
 
-        total_str = f"{total_importe:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
-        
-        # Formatear los totales por tipo con el formato de moneda
-        totales_por_tipo_formateados = {
-            tipo: f"{importe:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
-            for tipo, importe in totales_por_tipo.items()
-        }
+        return {**_totales_registros(conn, anio, mes, fmt), "expenses": registros}
 
-        return {
-            "total": total_str,
-            "total_by_expense_type": totales_por_tipo_formateados,
-            "expenses": registros
-        }
+def _totales_registros(conn, anio, mes, fmt):
+    # Totales desde la tabla agregada, sin recorrer las filas del mes
+    totales_por_tipo = conn.execute("""
+        SELECT tipo, total_cents FROM monthly_expense_totals
+        WHERE year = ? AND month = ?
+        ORDER BY tipo
+    """, (int(anio), int(mes))).fetchall()
 
-def get_incomes(anio, mes):
- 
- dolar_blue_buy = get_dolar_blue_buy()
-  
- with conectar(REGISTROS_DB) as conn:
-        cursor = conn.execute("""
-            SELECT uuid, marca_temporal, descripcion, importe, moneda
-            FROM income
-            WHERE strftime('%Y', marca_temporal) = ? AND strftime('%m', marca_temporal) = ?
-        """, (str(anio), f"{int(mes):02}"))
+    total_importe = sum(total for _, total in totales_por_tipo)
 
-        registros = []
-        total_ars = 0.0
-        total_usd = 0.0
+    # Formatear los totales por tipo con el formato de moneda
+    totales_por_tipo_formateados = {
+        tipo: fmt(importe)
+        for tipo, importe in totales_por_tipo
+    }
 
-        for row in cursor.fetchall():
-            uuid, marca_temporal, descripcion, importe, moneda = row     
-            
-            amount_ars = 0.0
-            amount_usd = 0.0
-
-            if moneda == "USD":
-                amount_ars = importe * dolar_blue_buy
-                amount_usd = importe
-            else:
-                amount_ars = importe
-                amount_usd = importe / dolar_blue_buy
+    return {
+        "total": fmt(total_importe),
+        "total_by_expense_type": totales_por_tipo_formateados
+    }
 
-            amount_ars_str = f"{amount_ars:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
-            amount_usd_str = f"{amount_usd:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
+def _income_cursor(conn, desde, hasta):
+    # Cotizacion vigente a la fecha de cada ingreso (as-of sobre la PK de fx_rates)
+    return conn.execute("""
+        SELECT i.uuid, i.marca_temporal, i.descripcion, i.importe_cents, i.moneda,
+               (SELECT f.value FROM fx_rates f
+                WHERE f.source = ? AND f.date <= i.marca_temporal
+                ORDER BY f.date DESC LIMIT 1) AS cotizacion
+        FROM income i
+        WHERE i.marca_temporal >= ? AND i.marca_temporal < ?
+    """, (FX_SOURCE_BLUE, desde, hasta))
+
+def _convertir_income(importe_cents, moneda, cotizacion):
+    # Centavos en ARS y USD; la conversion se redondea al centavo
+    if moneda == "USD":
+        return round(importe_cents * cotizacion), importe_cents
+    return importe_cents, round(importe_cents / cotizacion)
+
+def get_incomes(anio, mes, raw=False):
+    fmt = cents_formatter(raw)
 
-            registros.append({
+    with conectar(REGISTROS_DB) as conn:
+        rows = _income_cursor(conn, *rango_mes(anio, mes)).fetchall()
+
+    registros = []
+    total_ars = 0
+    total_usd = 0
+    dolar_blue_buy = None
+
+    for row in rows:
+        uuid, marca_temporal, descripcion, importe, moneda, cotizacion = row
+
+        if cotizacion is None:
+            # Sin historico para esa fecha: se usa la cotizacion actual
+            if dolar_blue_buy is None:
+                dolar_blue_buy = get_dolar_blue_buy()
+            cotizacion = dolar_blue_buy
+
+        amount_ars, amount_usd = _convertir_income(importe, moneda, cotizacion)
+
+        registros.append({
+            "uuid": uuid,
+            "datetime": marca_temporal,
+            "description": descripcion,
+            "amount_pesos": fmt(amount_ars),
+            "amount_usd": fmt(amount_usd)
+         })
+
+        total_ars += amount_ars
+        total_usd += amount_usd
+
+    return {
+        "total_ars": fmt(total_ars),
+        "total_usd": fmt(total_usd),
+        "incomes": registros
+    }
+
+# ------------------- STREAMING -------------------
+
+# Versiones iterables de las consultas de arriba para respuestas en streaming: usan una
+# conexion propia (el generador puede avanzar desde distintos hilos) y acumulan los
+# totales en `totales` a medida que se recorren las filas.
+
+def iter_registros(desde, hasta, totales, raw=False):
+    fmt = cents_formatter(raw)
+    totales.setdefault("total", 0)
+    por_tipo = totales.setdefault("total_by_expense_type", {})
+    with pool.dedicada(REGISTROS_DB) as conn:
+        cursor = conn.execute("""
+            SELECT uuid, marca_temporal, descripcion, importe_cents, tipo
+            FROM registros
+            WHERE marca_temporal >= ? AND marca_temporal < ?
+            ORDER BY marca_temporal
+        """, (desde, hasta))
+        for uuid, marca_temporal, descripcion, importe, tipo in cursor:
+            totales["total"] += importe
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + importe
+            yield {
                 "uuid": uuid,
                 "datetime": marca_temporal,
                 "description": descripcion,
-                "amount_pesos": amount_ars_str,
-                "amount_usd": amount_usd_str
-             })
-            
-            total_ars += amount_ars
-            total_usd += amount_usd
-        
-        total_ars_str = f"{total_ars:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
-        total_usd_str = f"{total_usd:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
+                "amount": fmt(importe),
+                "type": tipo
+            }
 
-        return {
-            "total_ars": total_ars_str,
-            "total_usd": total_usd_str,
-            "incomes": registros
-        }
+def iter_incomes(desde, hasta, totales, raw=False):
+    fmt = cents_formatter(raw)
+    totales.setdefault("total_ars", 0)
+    totales.setdefault("total_usd", 0)
+    dolar_blue_buy = None
+    with pool.dedicada(REGISTROS_DB) as conn:
+        for uuid, marca_temporal, descripcion, importe, moneda, cotizacion in _income_cursor(conn, desde, hasta):
+            if cotizacion is None:
+                if dolar_blue_buy is None:
+                    dolar_blue_buy = get_dolar_blue_buy()
+                cotizacion = dolar_blue_buy
+            amount_ars, amount_usd = _convertir_income(importe, moneda, cotizacion)
+            totales["total_ars"] += amount_ars
+            totales["total_usd"] += amount_usd
+            yield {
+                "uuid": uuid,
+                "datetime": marca_temporal,
+                "description": descripcion,
+                "amount_pesos": fmt(amount_ars),
+                "amount_usd": fmt(amount_usd)
+            }
+
+def iter_resumen(anio, mes, card_type, holder, totales, raw=False):
+    """
+    Recorre el resumen del mes como (card, holders) donde holders genera
+    (holder_info, expenses) y expenses genera las lineas de ese titular.
+    Las tres consultas vienen ordenadas por document_number/holder, asi que se
+    combinan en una sola pasada sin cargar las lineas en memoria.
+    """
+    fmt = cents_formatter(raw)
+    with pool.dedicada(TARJETAS_DB) as conn:
+        headers, holders, expenses = _resumen_cursors(conn, anio, mes, card_type, holder)
+        headers = sorted(headers.fetchall())
+        holders = holders.fetchall()
+        expenses = iter(expenses)
+        pendiente = [next(expenses, None)]
+        fechas_fmt = {}
+
+        def lineas(doc_number, h_name):
+            while pendiente[0] is not None and pendiente[0][:2] <= (doc_number, h_name):
+                e_doc, e_holder, e_date, e_desc, e_amount = pendiente[0]
+                pendiente[0] = next(expenses, None)
+                if (e_doc, e_holder) == (doc_number, h_name):
+                    yield _card_expense(e_date, e_desc, e_amount, fechas_fmt, fmt)
+
+        def titulares(doc_number):
+            for h_doc, h_name, h_ars, h_usd in holders:
+                if h_doc != doc_number:
+                    continue
+                holder_info = {
+                    "holder": h_name,
+                    "total_ars": fmt(h_ars),
+                    "total_usd": fmt(h_usd)
+                }
+                yield holder_info, lineas(doc_number, h_name)
+
+        if headers:
+            totales["total_ars_cards"] = sum(h[2] for h in headers)
+            totales["total_usd_cards"] = sum(h[3] for h in headers)
+
+        for doc_number, c_type, c_ars, c_usd in headers:
+            card = {
+                "card_type": c_type,
+                "total_ars_card": "#Vacio por el momento",
+                "total_usd_card": "#vacio por el momento"
+            }
+            yield card, titulares(doc_number)
 
 # ------------------- RESUMEN TARJETAS -------------------
 
 def crear_tablas_resumen_tarjeta():
-    with conectar(TARJETAS_DB) as conn:
+    with conectar(TARJETAS_DB, escritura=True) as conn:
         # Tabla principal del resumen
         conn.execute("""
             CREATE TABLE IF NOT EXISTS cards_resume_header (
                 document_number TEXT PRIMARY KEY,
                 card_type TEXT,
                 resume_date TEXT,
-                total_ars REAL,
-                total_usd REAL
+                total_ars_cents INTEGER,
+                total_usd_cents INTEGER
             )
         """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_cards_resume_header_resume_date
+            ON cards_resume_header(resume_date, card_type)
+        """)
 
         # Resumen por titular
         conn.execute("""
             CREATE TABLE IF NOT EXISTS card_resume_holder (
                 document_number TEXT,
                 holder TEXT,
-                total_ars REAL,
-                total_usd REAL,
+                total_ars_cents INTEGER,
+                total_usd_cents INTEGER,
                 PRIMARY KEY (document_number, holder),
                 FOREIGN KEY (document_number) REFERENCES cards_resume_header(document_number)
             )
         """)
 
-        # Detalles por titular
+        # Detalles por titular. id fija el rowid: el indice FTS apunta a las filas por rowid
+        # y sin una INTEGER PRIMARY KEY un VACUUM puede renumerarlas (ver add_card_expense_ids)
         conn.execute("""
             CREATE TABLE IF NOT EXISTS card_holder_expenses (
+                id INTEGER PRIMARY KEY,
                 document_number TEXT,
                 holder TEXT,
                 position INTEGER,
                 date TEXT,
                 description TEXT,
-                amount REAL,
-                PRIMARY KEY (document_number, holder, position),
+                amount_cents INTEGER,
+                UNIQUE (document_number, holder, position),
                 FOREIGN KEY (document_number, holder) REFERENCES card_resume_holder(document_number, holder)
             )
         """)
+
+        # Indice de PDFs ya importados por /syncResumes
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS resume_files (
+                card_type TEXT,
+                path TEXT,
+                size INTEGER,
+                mtime REAL,
+                content_hash TEXT,
+                document_number TEXT,
+                imported_at TEXT,
+                PRIMARY KEY (card_type, path)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_resume_files_content_hash ON resume_files(content_hash)")
+
+        # Bases creadas cuando los importes eran REAL (ver migrate_money_to_cents)
+        _agregar_columna(conn, "cards_resume_header", "total_ars_cents", "INTEGER")
+        _agregar_columna(conn, "cards_resume_header", "total_usd_cents", "INTEGER")
+        _agregar_columna(conn, "card_resume_holder", "total_ars_cents", "INTEGER")
+        _agregar_columna(conn, "card_resume_holder", "total_usd_cents", "INTEGER")
+        _agregar_columna(conn, "card_holder_expenses", "amount_cents", "INTEGER")
         conn.commit()
 
 
+def add_card_expense_ids():
+    """
+    Reconstruye card_holder_expenses de bases anteriores con `id INTEGER PRIMARY KEY`.
+    El id se copia del rowid actual, asi el indice FTS sigue apuntando a las mismas filas.
+    """
+    with conectar(TARJETAS_DB, escritura=True) as conn:
+        columnas = conn.execute("PRAGMA table_info(card_holder_expenses)").fetchall()
+        if any(columna[1] == "id" for columna in columnas):
+            return
+        nombres = ", ".join(columna[1] for columna in columnas)
+        definiciones = ", ".join(f"{columna[1]} {columna[2]}" for columna in columnas)
+        # Resto de una corrida cortada antes del commit
+        conn.execute("DROP TABLE IF EXISTS card_holder_expenses_nueva")
+        conn.execute(f"""
+            CREATE TABLE card_holder_expenses_nueva (
+                id INTEGER PRIMARY KEY,
+                {definiciones},
+                UNIQUE (document_number, holder, position),
+                FOREIGN KEY (document_number, holder) REFERENCES card_resume_holder(document_number, holder)
+            )
+        """)
+        conn.execute(f"""
+            INSERT INTO card_holder_expenses_nueva (id, {nombres})
+            SELECT rowid, {nombres} FROM card_holder_expenses
+        """)
+        conn.execute("DROP TABLE card_holder_expenses")
+        conn.execute("ALTER TABLE card_holder_expenses_nueva RENAME TO card_holder_expenses")
+        conn.commit()
+    # Los triggers de los agregados mensuales y del indice FTS se fueron con la tabla vieja
+    create_monthly_totals_tables()
+    create_search_tables()
+
 def existe_documento(document_number):
     with conectar(TARJETAS_DB) as conn:
         cursor = conn.execute(
@@ -203,49 +465,210 @@ def existe_documento(document_number):
         return cursor.fetchone()[0] > 0
 
 
-def insertar_resumen_tarjeta(document_number, resume_date, payload_dict, card_type):
+def get_resume_file(card_type, path):
     with conectar(TARJETAS_DB) as conn:
-        card_type = card_type
-        total_ars = 0
-        total_usd = 0
-
-        for holder, data in payload_dict.items():
-            if (holder != "Total"):
-                continue
-            total_ars = float(data["pesos"].replace(".", "").replace(",", "."))
-            total_usd = float(data["dolares"].replace(",", "."))
-
-        for holder, data in payload_dict.items():
-
-            if holder == "Total":
-                continue
-
-            # Insertar header solo una vez (lo repetimos por cada holder, pero la PK lo previene)
-            conn.execute("""
-                INSERT OR IGNORE INTO cards_resume_header (document_number, card_type, resume_date, total_ars, total_usd)
-                VALUES (?, ?, ?, ?, ?)
-            """, (document_number, card_type, resume_date.isoformat(), total_ars, total_usd))
+        row = conn.execute("""
+            SELECT size, mtime, content_hash, document_number
+            FROM resume_files WHERE card_type = ? AND path = ?
+        """, (card_type, str(path))).fetchone()
+    if row is None:
+        return None
+    return {"size": row[0], "mtime": row[1], "content_hash": row[2], "document_number": row[3]}
+
+def get_resume_file_by_hash(content_hash):
+    with conectar(TARJETAS_DB) as conn:
+        row = conn.execute(
+            "SELECT document_number FROM resume_files WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+    return row[0] if row else None
+
+def save_resume_file(card_type, path, size, mtime, content_hash, document_number):
+    save_resume_files([(card_type, path, size, mtime, content_hash, document_number)])
+
+def save_resume_files(archivos):
+    """archivos: (card_type, path, size, mtime, content_hash, document_number) por PDF."""
+    imported_at = datetime.now().isoformat()
+    with conectar(TARJETAS_DB, escritura=True) as conn:
+        conn.executemany("""
+            INSERT INTO resume_files (card_type, path, size, mtime, content_hash, document_number, imported_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(card_type, path) DO UPDATE SET
+                size = excluded.size,
+                mtime = excluded.mtime,
+                content_hash = excluded.content_hash,
+                document_number = COALESCE(excluded.document_number, resume_files.document_number),
+                imported_at = excluded.imported_at
+        """, [
+            (card_type, str(path), size, mtime, content_hash, document_number, imported_at)
+            for card_type, path, size, mtime, content_hash, document_number in archivos
+        ])
+        conn.commit()
 
-            # Insertar holder resumen
-            conn.execute("""
-                INSERT INTO card_resume_holder (document_number, holder, total_ars, total_usd)
-                VALUES (?, ?, ?, ?)
-            """, (document_number, holder, total_ars, total_usd))
+def _filas_resumen(document_number, resume_date, payload_dict, card_type):
+    """
+    Convierte el payload del parser en filas para executemany: (header, holders, expenses).
+    Los totales de cada titular son los suyos (si el parser los informa) o la suma de sus
+    lineas; el total de la tarjeta sale de la clave "Total".
+    """
+    total_ars = 0
+    total_usd = 0
+    total = payload_dict.get("Total")
+    if total is not None:
+        total_ars = parse_cents(total["pesos"])
+        total_usd = parse_cents(total["dolares"])
+
+    holders = []
+    expenses = []
+    for holder, data in payload_dict.items():
+        if holder == "Total":
+            continue
+
+        holder_ars = 0
+        holder_usd = 0
+        for idx, gasto in enumerate(data["Detail"]):
+            descripcion = gasto["descripcion"]
+            importe = parse_cents(gasto["importe"])
+            # Mismo criterio que la lectura: las lineas en dolares llevan "USD" en la descripcion
+            if "USD" in descripcion:
+                holder_usd += importe
+            else:
+                holder_ars += importe
+            expenses.append((document_number, holder, idx, gasto["fechaTimestamp"], descripcion, importe))
+
+        if "pesos" in data:
+            holder_ars = parse_cents(data["pesos"])
+        if "dolares" in data:
+            holder_usd = parse_cents(data["dolares"])
+        holders.append((document_number, holder, holder_ars, holder_usd))
+
+    header = (document_number, card_type, resume_date.isoformat(), total_ars, total_usd)
+    return header, holders, expenses
+
+def insertar_resumenes_tarjeta(resumenes, errores=None):
+    """
+    Inserta varios resumes en una sola transaccion.
+    resumenes: (document_number, resume_date, payload_dict, card_type) por resumen.
+    Los document_number que ya estaban en la base (o repetidos en el lote) se saltean;
+    devuelve el set de los que se insertaron.
+    Con `errores` (dict) un payload mal formado no corta el lote: queda ahi como
+    document_number -> motivo y se insertan los demas. Sin el, la excepcion se propaga.
+    """
+    # Todo el parseo se hace antes de tomar el escritor
+    filas = {}
+    for document_number, resume_date, payload_dict, card_type in resumenes:
+        if document_number in filas or (errores is not None and document_number in errores):
+            continue
+        try:
+            filas[document_number] = _filas_resumen(document_number, resume_date, payload_dict, card_type)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            if errores is None:
+                raise
+            errores[document_number] = f"{type(e).__name__}: {e}"
+
+    # Un resumen sin titulares no tiene nada que mostrar: no se guarda ni el header
+    candidatos = [f for f in filas.values() if f[1]]
+
+    with conectar(TARJETAS_DB, escritura=True) as conn:
+        # El INSERT decide cuales son nuevos: con varios workers, dos cargas del mismo
+        # resumen no pueden pasar las dos un chequeo previo de existencia
+        insertados = {row[0] for row in conn.execute("""
+            INSERT INTO cards_resume_header (document_number, card_type, resume_date, total_ars_cents, total_usd_cents)
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                   json_extract(value, '$[3]'), json_extract(value, '$[4]')
+            FROM json_each(?) WHERE true
+            ON CONFLICT(document_number) DO NOTHING
+            RETURNING document_number
+        """, (json.dumps([header for header, _, _ in candidatos]),)).fetchall()}
+        nuevos = [f for f in candidatos if f[0][0] in insertados]
 
-            # Insertar gastos del holder
-            for idx, gasto in enumerate(data["Detail"]):
-                fecha = gasto["fechaTimestamp"]
-                descripcion = gasto["descripcion"]
-                importe = float(gasto["importe"].replace(".", "").replace(",", "."))
+        conn.executemany("""
+            INSERT INTO card_resume_holder (document_number, holder, total_ars_cents, total_usd_cents)
+            VALUES (?, ?, ?, ?)
+        """, [fila for _, holders, _ in nuevos for fila in holders])
+        conn.executemany("""
+            INSERT INTO card_holder_expenses (document_number, holder, position, date, description, amount_cents)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [fila for _, _, expenses in nuevos for fila in expenses])
+        _indexar_busqueda(conn, "card_holder_expenses")
+        conn.commit()
 
-                conn.execute("""
-                    INSERT INTO card_holder_expenses (document_number, holder, position, date, description, amount)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (document_number, holder, idx, fecha, descripcion, importe))
+    versiones.bump(CARDS, {mes_de(header[2]) for header, _, _ in nuevos})
+    return {header[0] for header, _, _ in nuevos}
 
-        conn.commit()
+def insertar_resumen_tarjeta(document_number, resume_date, payload_dict, card_type):
+    return document_number in insertar_resumenes_tarjeta([(document_number, resume_date, payload_dict, card_type)])
+
+def _filtros_resumen(anio, mes, card_type=None, holder=None):
+    # Filtro comun a las consultas del resumen: mes del resumen y tipo de tarjeta (headers)
+    # y titular (holders y lineas)
+    header_filter = "c.resume_date >= ? AND c.resume_date < ?"
+    header_params = list(rango_mes(anio, mes))
+    if card_type:
+        header_filter += " AND c.card_type = ?"
+        header_params.append(card_type)
+
+    holder_filter = ""
+    holder_params = []
+    if holder:
+        holder_filter = " AND h.holder = ?"
+        holder_params.append(holder)
+    return header_filter, header_params, holder_filter, holder_params
+
+def _resumen_cursors(conn, anio, mes, card_type=None, holder=None):
+    filtros = _filtros_resumen(anio, mes, card_type, holder)
+    header_filter, header_params, holder_filter, holder_params = filtros
+    headers, holders = _resumen_totales(conn, filtros)
+
+    # El IN recorre la PK (document_number, holder, position) en orden, sin ordenar en memoria
+    expenses = conn.execute(f"""
+        SELECT h.document_number, h.holder, h.date, h.description, h.amount_cents
+        FROM card_holder_expenses h
+        WHERE h.document_number IN (SELECT c.document_number FROM cards_resume_header c WHERE {header_filter}){holder_filter}
+        ORDER BY h.document_number, h.holder, h.position
+    """, header_params + holder_params)
+
+    return headers, holders, expenses
+
+def _resumen_totales(conn, filtros):
+    # Headers y titulares del resumen, con sus totales
+    header_filter, header_params, holder_filter, holder_params = filtros
+    headers = conn.execute(f"""
+        SELECT c.document_number, c.card_type, c.total_ars_cents, c.total_usd_cents
+        FROM cards_resume_header c
+        WHERE {header_filter}
+    """, header_params)
+
+    holders = conn.execute(f"""
+        SELECT h.document_number, h.holder, h.total_ars_cents, h.total_usd_cents
+        FROM card_resume_holder h
+        WHERE h.document_number IN (SELECT c.document_number FROM cards_resume_header c WHERE {header_filter}){holder_filter}
+        ORDER BY h.document_number, h.holder
+    """, header_params + holder_params)
+
+    return headers, holders
+
+def _card_expense(e_date, e_desc, e_amount, fechas_fmt, fmt):
+    # Un resumen repite pocas fechas distintas: se formatea cada una una sola vez
+    e_date_fmt = fechas_fmt.get(e_date)
+    if e_date_fmt is None:
+        e_date_fmt = fechas_fmt[e_date] = datetime.fromisoformat(e_date).strftime("%d-%b-%y")
+    e_amount_str = fmt(e_amount)
+    if "USD" not in e_desc:
+        return {
+            "date": e_date_fmt,
+            "descriptions": e_desc,
+            "amount_pesos": e_amount_str,
+            "amount_usd":""
+        }
+    return {
+        "date": e_date_fmt,
+        "descriptions": e_desc,
+        "amount_pesos": "",
+        "amount_usd": e_amount_str,
+    }
 
-def obtener_resumen(anio, mes, card_type=None, holder=None):
+def obtener_resumen(anio, mes, card_type=None, holder=None, raw=False):
+    fmt = cents_formatter(raw)
 
     total_ars_cards = 0
     total_usd_cards = 0
@@ -257,76 +680,45 @@ def obtener_resumen(anio, mes, card_type=None, holder=None):
     }
 
     with conectar(TARJETAS_DB) as conn:
+        headers, holders, expenses = _resumen_cursors(conn, anio, mes, card_type, holder)
+        headers = headers.fetchall()
+        holders = holders.fetchall()
+        expenses = expenses.fetchall()
+
+    cards = {}
+    for doc_number, c_type, c_ars, c_usd in headers:
+        card = {
+            "card_type": c_type,
+            "holders": [],
+            "total_ars_card": "#Vacio por el momento",
+            "total_usd_card": "#vacio por el momento"
+        }
+        cards[doc_number] = card
+        resumen["cards"].append(card)
+        total_ars_cards += c_ars
+        total_usd_cards += c_usd
+
+    holders_info = {}
+    for doc_number, h_name, h_ars, h_usd in holders:
+        holder_info = {
+            "holder": h_name,
+            "total_ars": fmt(h_ars),
+            "total_usd": fmt(h_usd),
+            "expenses": []
+        }
+        holders_info[(doc_number, h_name)] = holder_info
+        cards[doc_number]["holders"].append(holder_info)
 
-        query = """
-                 SELECT * FROM cards_resume_header
-                 WHERE strftime('%Y', resume_date) = ? AND strftime('%m', resume_date) = ?
-                 """
-        params = [str(anio), f"{int(mes):02}"]
-
-        if card_type:
-            query += " AND card_type = ?"
-            params.append(card_type)
-
-        for row in conn.execute(query, params).fetchall():
-            card = {
-                "card_type": row[1],
-                "holders": [],
-                "total_ars_card": "#Vacio por el momento",
-                "total_usd_card": "#vacio por el momento"
-            }
-
-            doc_number = row[0]
-            total_ars_cards += row[3]
-            total_usd_cards += row[4]
-
-            # Holders para esta tarjeta
-            holder_query = "SELECT holder, total_ars, total_usd FROM card_resume_holder WHERE document_number = ?"
-            holder_params = [doc_number]
-            if holder:
-                holder_query += " AND holder = ?"
-                holder_params.append(holder)
-
-            for h_row in conn.execute(holder_query, holder_params).fetchall():
-                h_name, h_ars, h_usd = h_row
-                holder_info = {
-                    "holder": h_name,
-                    "total_ars": f"{h_ars:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
-                    "total_usd": f"{h_usd:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
-                    "expenses": []
-                }
+    fechas_fmt = {}
+    for doc_number, h_name, e_date, e_desc, e_amount in expenses:
+        holder_info = holders_info.get((doc_number, h_name))
+        if holder_info is None:
+            continue
+        holder_info["expenses"].append(_card_expense(e_date, e_desc, e_amount, fechas_fmt, fmt))
 
-                # Gastos
-                expense_query = """
-                    SELECT date, description, amount
-                    FROM card_holder_expenses
-                    WHERE document_number = ? AND holder = ?
-                """
-                for e_row in conn.execute(expense_query, (doc_number, h_name)).fetchall():
-                    e_date, e_desc, e_amount = e_row
-                    e_date_fmt = datetime.fromisoformat(e_date).strftime("%d-%b-%y")
-                    if "USD" not in e_desc:
-                        expense = {
-                            "date": e_date_fmt,
-                            "descriptions": e_desc,
-                            "amount_pesos": f"{e_amount:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
-                            "amount_usd":""
-                        }
-                    else:
-                        expense = {
-                            "date": e_date_fmt,
-                            "descriptions": e_desc,
-                            "amount_pesos": "",
-                            "amount_usd": f"{e_amount:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
-                        }
-
-                    holder_info["expenses"].append(expense)
-
-                card["holders"].append(holder_info)
-
-            resumen["cards"].append(card)
-            resumen["total_ars_cards"] = f"{total_ars_cards:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
-            resumen["total_usd_cards"] = f"{total_usd_cards:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
+    if headers:
+        resumen["total_ars_cards"] = fmt(total_ars_cards)
+        resumen["total_usd_cards"] = fmt(total_usd_cards)
 
     return resumen
 
@@ -334,12 +726,11 @@ def obtener_resumen(anio, mes, card_type=None, holder=None):
 def obtener_tarjetas_disponibles(anio, mes):
     resultado = []
     with conectar(TARJETAS_DB) as conn:
-        filtro_fecha = datetime(anio, mes, 1).strftime('%Y-%m-01')
         cursor = conn.execute("""
-            SELECT crh.card_type, crh.document_number, crh.resume_date, crh.total_ars, crh.total_usd, crh.card_type
+            SELECT crh.card_type, crh.document_number
             FROM cards_resume_header crh
-            WHERE resume_date = ?
-        """, (filtro_fecha,))
+            WHERE resume_date >= ? AND resume_date < ?
+        """, rango_mes(anio, mes))
 
         tarjetas = {}
         for row in cursor.fetchall():
@@ -374,7 +765,8 @@ def get_current_month_expense_uuids():
         cursor = conn.execute("""
         SELECT uuid
         FROM registros
-         WHERE strftime('%Y', marca_temporal) = ? AND strftime('%m', marca_temporal) = ? """,(str(now.year), f"{int(now.month):02}"))
+        WHERE marca_temporal >= ? AND marca_temporal < ?
+        """, rango_mes(now.year, now.month))
         return set(row[0] for row in cursor.fetchall())
 
 def get_current_month_income_uuids():
@@ -383,7 +775,8 @@ def get_current_month_income_uuids():
         cursor = conn.execute("""
         SELECT uuid
         FROM income
-         WHERE strftime('%Y', marca_temporal) = ? AND strftime('%m', marca_temporal) = ? """,(str(now.year), f"{int(now.month):02}"))
+        WHERE marca_temporal >= ? AND marca_temporal < ?
+        """, rango_mes(now.year, now.month))
         return set(row[0] for row in cursor.fetchall())
 
 def get_sqlite_income_uuids():
@@ -391,86 +784,1293 @@ def get_sqlite_income_uuids():
         cursor = conn.execute("SELECT uuid FROM income")
         return set(row[0] for row in cursor.fetchall())
 
+def _content_hash(*valores):
+    return hashlib.sha1("\x1f".join(str(v) for v in valores).encode("utf-8")).hexdigest()
+
+def _parse_expense_row(row):
+    uuid = row["UUID"]
+    marca_temporal = datetime.strptime(row["Marca temporal"], "%d/%m/%Y %H:%M:%S").isoformat()
+    descripcion = row["Descripción"]
+    # Formato de la planilla: $123,456.78
+    importe = parse_cents(row["Importe"], decimal=".")
+    tipo = row["Tipo de gatos"]
+    return (uuid, marca_temporal, descripcion, importe, tipo)
+
+def _parse_income_row(row):
+    uuid = row["UUID"]
+    marca_temporal = datetime.strptime(row["Marca temporal"], "%d/%m/%Y %H:%M:%S").isoformat()
+    descripcion = row["Descripcion"]
+    # Formato de la planilla: $123,456.78
+    importe = parse_cents(row["Importe"], decimal=".")
+    moneda = row["Moneda"]
+    return (uuid, marca_temporal, descripcion, importe, moneda)
+
+def _apply_sync(tabla, dominio, columnas, parse_func, filas, uuids_to_delete):
+    """
+    Aplica un sync en una sola transaccion: UPSERT por uuid de las filas de la hoja
+    (las que no cambiaron se saltean comparando content_hash) y borrado de los uuids
+    que ya no estan, via tabla temporal.
+    """
+    start_time = time.time()
+
+    # Si la hoja trae el mismo UUID dos veces gana la ultima fila
+    datos = {}
+    en_centavos = {i for i, c in enumerate(columnas) if c.endswith("_cents")}
+    for row in filas:
+        try:
+            valores = parse_func(row)
+        except Exception as e:
+            log.warning("fila invalida en el sync", extra={"table": tabla, "uuid": row.get("UUID"), "error": str(e)})
+            continue
+        # El hash usa el importe en unidades, asi siguen valiendo los hashes guardados antes de pasar a centavos
+        hashables = [v / 100 if i in en_centavos else v for i, v in enumerate(valores[1:], 1)]
+        datos[valores[0]] = valores + (_content_hash(*hashables),)
+
+    cols = ", ".join(columnas)
+    cols_nuevas = ", ".join(f"n.{c}" for c in columnas)
+    actualizaciones = ", ".join(f"{c} = excluded.{c}" for c in columnas[1:])
+    marcas = ", ".join("?" * (len(columnas) + 1))
+
+    # Tablas temporales propias de cada tabla: el escritor es compartido por registros e income
+    rows_tmp = f"sync_rows_{tabla}"
+    deletes_tmp = f"sync_deletes_{tabla}"
+
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {rows_tmp} AS SELECT {cols}, content_hash FROM {tabla} WHERE 0")
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {deletes_tmp} (uuid TEXT PRIMARY KEY)")
+        conn.execute(f"DELETE FROM {rows_tmp}")
+        conn.execute(f"DELETE FROM {deletes_tmp}")
+
+        conn.executemany(f"INSERT INTO {rows_tmp} ({cols}, content_hash) VALUES ({marcas})", datos.values())
+        conn.executemany(f"INSERT OR IGNORE INTO {deletes_tmp} (uuid) VALUES (?)", [(u,) for u in uuids_to_delete])
+
+        inserted, updated, unchanged = conn.execute(f"""
+            SELECT
+                SUM(t.uuid IS NULL),
+                SUM(t.uuid IS NOT NULL AND t.content_hash IS NOT n.content_hash),
+                SUM(t.uuid IS NOT NULL AND t.content_hash IS n.content_hash)
+            FROM {rows_tmp} n
+            LEFT JOIN {tabla} t ON t.uuid = n.uuid
+        """).fetchone()
+
+        # Meses que cambian (fecha nueva y anterior de cada fila modificada, y de las borradas)
+        # para invalidar solo esas respuestas cacheadas
+        meses = {row[0] for row in conn.execute(f"""
+            SELECT substr(n.marca_temporal, 1, 7) FROM {rows_tmp} n
+            LEFT JOIN {tabla} t ON t.uuid = n.uuid
+            WHERE t.content_hash IS NOT n.content_hash
+            UNION
+            SELECT substr(t.marca_temporal, 1, 7) FROM {rows_tmp} n
+            JOIN {tabla} t ON t.uuid = n.uuid
+            WHERE t.content_hash IS NOT n.content_hash
+            UNION
+            SELECT substr(marca_temporal, 1, 7) FROM {tabla}
+            WHERE uuid IN (SELECT uuid FROM {deletes_tmp})
+        """)}
+
+        insert_start = time.perf_counter()
+        conn.execute(f"""
+            INSERT INTO {tabla} ({cols}, content_hash)
+            SELECT {cols_nuevas}, n.content_hash FROM {rows_tmp} n WHERE true
+            ON CONFLICT(uuid) DO UPDATE SET {actualizaciones}, content_hash = excluded.content_hash
+            WHERE {tabla}.content_hash IS NOT excluded.content_hash
+        """)
+        delete_start = time.perf_counter()
+        deleted = conn.execute(
+            f"DELETE FROM {tabla} WHERE uuid IN (SELECT uuid FROM {deletes_tmp})"
+        ).rowcount
+        delete_end = time.perf_counter()
+
+        conn.execute(f"DELETE FROM {rows_tmp}")
+        conn.execute(f"DELETE FROM {deletes_tmp}")
+        _indexar_busqueda(conn, tabla)
+        conn.commit()
+
+    versiones.bump(dominio, meses)
+    return {
+        "inserted": inserted or 0,
+        "updated": updated or 0,
+        "unchanged": unchanged or 0,
+        "deleted": deleted,
+        "apply_sec": round(time.time() - start_time, 3),
+        # Desglose dentro de apply: upsert de las filas nuevas/cambiadas y borrado de las que ya no estan
+        "insert_sec": round(delete_start - insert_start, 3),
+        "delete_sec": round(delete_end - delete_start, 3)
+    }
+
+EXPENSE_COLUMNS = ["uuid", "marca_temporal", "descripcion", "importe_cents", "tipo"]
+INCOME_COLUMNS = ["uuid", "marca_temporal", "descripcion", "importe_cents", "moneda"]
+
+def apply_expenses_sync(filas: list[dict], uuids_to_delete: set):
+    return _apply_sync("registros", EXPENSES, EXPENSE_COLUMNS, _parse_expense_row, filas, uuids_to_delete)
+
+def apply_incomes_sync(filas: list[dict], uuids_to_delete: set):
+    return _apply_sync("income", INCOMES, INCOME_COLUMNS, _parse_income_row, filas, uuids_to_delete)
+
 def delete_expenses(uuids: set):
     if not uuids:
         return
-    with conectar(REGISTROS_DB) as conn:
-        conn.executemany(
-            "DELETE FROM registros WHERE uuid = ?",
-            [(uuid,) for uuid in uuids]
-        )
-        conn.commit()
+    apply_expenses_sync([], uuids)
 
 def insert_expenses(filas: list[dict]):
     if not filas:
         return
-    datos = []
-    for row in filas:
-        try:
-            uuid = row["UUID"]
-            marca_temporal = datetime.strptime(row["Marca temporal"], "%d/%m/%Y %H:%M:%S").isoformat()
-            descripcion = row["Descripción"]
-            # ✅ Manejo correcto del formato $123,456.78
-            importe_str = row["Importe"].replace("$", "").replace(",", "")
-            importe = float(importe_str)
-            tipo = row["Tipo de gatos"]
-            datos.append((uuid, marca_temporal, descripcion, importe, tipo))
-        except Exception as e:
-            print(f"❌ Error procesando fila con UUID {row.get('UUID')}: {e}")
-
-    with conectar(REGISTROS_DB) as conn:
-        conn.executemany("""
-            INSERT INTO registros (uuid, marca_temporal, descripcion, importe, tipo)
-            VALUES (?, ?, ?, ?, ?)
-        """, datos)
-        conn.commit()
+    apply_expenses_sync(filas, set())
 
 def delete_incomes(uuids: set):
     if not uuids:
         return
-    with conectar(REGISTROS_DB) as conn:
-        conn.executemany(
-            "DELETE FROM income WHERE uuid = ?",
-            [(uuid,) for uuid in uuids]
-        )
-        conn.commit()
+    apply_incomes_sync([], uuids)
 
 def insert_incomes(filas: list[dict]):
     if not filas:
         return
-    datos = []
-    for row in filas:
-        try:
-            uuid = row["UUID"]
-            marca_temporal = datetime.strptime(row["Marca temporal"], "%d/%m/%Y %H:%M:%S").isoformat()
-            descripcion = row["Descripcion"]
-            # ✅ Manejo correcto del formato $123,456.78
-            importe_str = row["Importe"].replace("$", "").replace(",", "")
-            importe = float(importe_str)
-            moneda = row["Moneda"]
-            datos.append((uuid, marca_temporal, descripcion, importe, moneda))
-        except Exception as e:
-            print(f"❌ Error procesando fila con UUID {row.get('UUID')}: {e}")
+    apply_incomes_sync(filas, set())
+
+# ------------------- ESTADO DE SYNC -------------------
+
+def create_sync_state_table():
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                sync_key TEXT PRIMARY KEY,
+                row_count INTEGER,
+                last_row_hash TEXT,
+                last_timestamp TEXT,
+                header TEXT,
+                sheet_modified TEXT,
+                last_full_sync TEXT,
+                updated_at TEXT
+            )
+        """)
+        conn.commit()
+
+def get_sync_state(sync_key):
+    with conectar(REGISTROS_DB) as conn:
+        row = conn.execute("""
+            SELECT row_count, last_row_hash, last_timestamp, header, sheet_modified, last_full_sync
+            FROM sync_state WHERE sync_key = ?
+        """, (sync_key,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "row_count": row[0],
+        "last_row_hash": row[1],
+        "last_timestamp": row[2],
+        "header": row[3],
+        "sheet_modified": row[4],
+        "last_full_sync": row[5]
+    }
+
+def save_sync_state(sync_key, row_count, last_row_hash, last_timestamp, header, sheet_modified, full):
+    ahora = datetime.now().isoformat()
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            INSERT INTO sync_state (sync_key, row_count, last_row_hash, last_timestamp, header,
+                                    sheet_modified, last_full_sync, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sync_key) DO UPDATE SET
+                row_count = excluded.row_count,
+                last_row_hash = excluded.last_row_hash,
+                last_timestamp = excluded.last_timestamp,
+                header = excluded.header,
+                sheet_modified = excluded.sheet_modified,
+                last_full_sync = COALESCE(excluded.last_full_sync, sync_state.last_full_sync),
+                updated_at = excluded.updated_at
+        """, (sync_key, row_count, last_row_hash, last_timestamp, header, sheet_modified,
+              ahora if full else None, ahora))
+        conn.commit()
+
+# ------------------- JOBS -------------------
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_INTERRUPTED = "interrupted"
+
+def create_jobs_table():
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT,
+                status TEXT,
+                trigger TEXT,
+                params TEXT,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                duration_sec REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)")
+        conn.commit()
+
+def create_job(job_id, kind, params, trigger, owner=None, dedupe=False):
+    """
+    Crea el job encolado; owner es el worker que lo va a correr (ver LEASES). Con
+    dedupe=True no lo crea si ya hay uno con el mismo tipo y parametros encolado o
+    corriendo en un worker vivo: el chequeo va en el mismo INSERT, asi dos procesos no
+    pueden crear los dos. Devuelve True si lo creo.
+    """
+    params = json.dumps(params, sort_keys=True)
+    condicion, extra = "", ()
+    if dedupe:
+        condicion = f"""WHERE NOT EXISTS (
+            SELECT 1 FROM jobs WHERE status IN (?, ?) AND kind = ? AND params = ? AND {_WORKER_VIVO}
+        )"""
+        extra = (JOB_QUEUED, JOB_RUNNING, kind, params, time.time())
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        creado = conn.execute(f"""
+            INSERT INTO jobs (id, kind, status, trigger, params, progress, created_at, owner)
+            SELECT ?, ?, ?, ?, ?, '{{}}', ?, ? {condicion}
+        """, (job_id, kind, JOB_QUEUED, trigger, params, datetime.now().isoformat(), owner) + extra).rowcount
+        conn.commit()
+    return creado == 1
+
+def start_job(job_id):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                     (JOB_RUNNING, datetime.now().isoformat(), job_id))
+        conn.commit()
+
+def update_job_progress(job_id, progress):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("UPDATE jobs SET progress = ? WHERE id = ?",
+                     (json.dumps(progress, ensure_ascii=False, default=str), job_id))
+        conn.commit()
+
+def finish_job(job_id, status, result=None, error=None, duration_sec=None):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, duration_sec = ?
+            WHERE id = ?
+        """, (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+              error, datetime.now().isoformat(), duration_sec, job_id))
+        conn.commit()
+
+def interrupt_unfinished_jobs():
+    # Jobs que quedaron a medias por un reinicio: su worker ya no tiene lease vivo y no hay
+    # hilo que los vaya a terminar. Los de otros workers que siguen vivos no se tocan.
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        cursor = conn.execute(f"""
+            UPDATE jobs SET status = ?, error = 'Interrumpido por reinicio', finished_at = ?
+            WHERE status IN (?, ?) AND NOT {_WORKER_VIVO}
+        """, (JOB_INTERRUPTED, datetime.now().isoformat(), JOB_QUEUED, JOB_RUNNING, time.time()))
+        conn.commit()
+        return cursor.rowcount
+
+def find_active_job(kind, params):
+    """Job encolado o corriendo con el mismo tipo y parametros en un worker vivo (cualquier proceso)."""
+    with conectar(REGISTROS_DB) as conn:
+        row = conn.execute(f"""
+            SELECT id FROM jobs
+            WHERE status IN (?, ?) AND kind = ? AND params = ? AND {_WORKER_VIVO}
+            ORDER BY created_at LIMIT 1
+        """, (JOB_QUEUED, JOB_RUNNING, kind, json.dumps(params, sort_keys=True), time.time())).fetchone()
+    return row[0] if row else None
+
+def _job_dict(row):
+    job_id, kind, status, trigger, params, progress, result, error, created_at, started_at, finished_at, duration = row
+    return {
+        "id": job_id,
+        "kind": kind,
+        "status": status,
+        "trigger": trigger,
+        "params": json.loads(params) if params else {},
+        "progress": json.loads(progress) if progress else {},
+        "result": json.loads(result) if result else None,
+        "error": error,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "duration_sec": duration
+    }
+
+_JOB_COLUMNS = "id, kind, status, trigger, params, progress, result, error, created_at, started_at, finished_at, duration_sec"
+
+def get_job(job_id):
+    with conectar(REGISTROS_DB) as conn:
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+def list_jobs(kind=None, limit=20):
+    filtro, params = ("WHERE kind = ?", [kind]) if kind else ("", [])
+    with conectar(REGISTROS_DB) as conn:
+        rows = conn.execute(f"""
+            SELECT {_JOB_COLUMNS} FROM jobs {filtro}
+            ORDER BY created_at DESC LIMIT ?
+        """, params + [limit]).fetchall()
+    return [_job_dict(row) for row in rows]
+
+# ------------------- LEASES (MULTI-WORKER) -------------------
+
+# Exclusion entre procesos (uvicorn --workers N) sobre la base compartida: un lease es una
+# fila con duenio y vencimiento. El duenio lo renueva mientras trabaja (JobManager lo hace
+# con un latido); si el proceso muere, vence solo y otro worker lo puede tomar.
+# Cada worker vivo tiene el lease "worker:<id>"; los jobs guardan ese id en jobs.owner.
+
+# Condicion SQL sobre jobs: su worker sigue vivo (parametro: ahora)
+_WORKER_VIVO = """EXISTS (
+    SELECT 1 FROM leases l WHERE l.name = 'worker:' || jobs.owner AND l.expires_at >= ?
+)"""
+
+def create_cache_versions_table():
+    # Versiones del cache de respuestas compartidas entre workers (ver app.cache). Va antes
+    # que las migraciones que escriben datos: cada una incrementa versiones
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                domain TEXT NOT NULL,
+                month TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (domain, month)
+            )
+        """)
+        conn.commit()
+
+def create_worker_tables():
+    create_cache_versions_table()
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        _agregar_columna(conn, "jobs", "owner", "TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        conn.commit()
+
+def acquire_lease(name, owner, ttl_sec):
+    """Toma el lease si esta libre o vencido (o lo renueva si ya es de `owner`). True si quedo suyo."""
+    ahora = time.time()
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        filas = conn.execute("""
+            INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+            RETURNING owner
+        """, (name, owner, ahora + ttl_sec, ahora)).fetchall()
+        conn.commit()
+    return bool(filas)
+
+def renew_leases(owner, ttl_sec):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        renovados = conn.execute(
+            "UPDATE leases SET expires_at = ? WHERE owner = ?", (time.time() + ttl_sec, owner)
+        ).rowcount
+        conn.commit()
+    return renovados
+
+def release_lease(name, owner):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+        conn.commit()
+
+def release_leases(owner):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("DELETE FROM leases WHERE owner = ?", (owner,))
+        conn.commit()
+
+def list_leases():
+    with conectar(REGISTROS_DB) as conn:
+        rows = conn.execute("SELECT name, owner, expires_at FROM leases ORDER BY name").fetchall()
+    ahora = time.time()
+    return [{"name": n, "owner": o, "expires_in_sec": round(e - ahora, 1)} for n, o, e in rows]
+
+# ------------------- COTIZACION DOLAR -------------------
+
+FX_SOURCE_BLUE = "blue"
+
+def create_rate_cache_table():
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_cache (
+                name TEXT PRIMARY KEY,
+                value REAL,
+                fetched_at TEXT
+            )
+        """)
+        conn.commit()
 
+def create_fx_rates_table():
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        # La PK (source, date) resuelve la busqueda "ultima cotizacion <= fecha"
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fx_rates (
+                source TEXT,
+                date TEXT,
+                value REAL,
+                PRIMARY KEY (source, date)
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+
+def get_saved_rate(name):
     with conectar(REGISTROS_DB) as conn:
+        return conn.execute(
+            "SELECT value, fetched_at FROM rate_cache WHERE name = ?", (name,)
+        ).fetchone()
+
+def save_rate(name, value, fetched_at):
+    with conectar(REGISTROS_DB, escritura=True) as conn:
+        # Refresco por TTL con el mismo valor: solo se renueva fetched_at
+        cambio = not conn.execute(
+            "UPDATE rate_cache SET fetched_at = ? WHERE name = ? AND value = ?", (fetched_at, name, value)
+        ).rowcount
+        if cambio:
+            conn.execute("""
+                INSERT INTO rate_cache (name, value, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value, fetched_at = excluded.fetched_at
+            """, (name, value, fetched_at))
+        # La cotizacion del dia tambien queda en el historico
+        cambio |= conn.execute("""
+            INSERT INTO fx_rates (source, date, value) VALUES (?, ?, ?)
+            ON CONFLICT(source, date) DO UPDATE SET value = excluded.value
+            WHERE fx_rates.value IS NOT excluded.value
+        """, (FX_SOURCE_BLUE, fetched_at[:10], value)).rowcount > 0
+        conn.commit()
+    # Los ingresos se convierten con la cotizacion a su fecha o, sin historico, con la actual;
+    # si el valor no cambio las respuestas cacheadas siguen siendo validas
+    if cambio:
+        versiones.bump(INCOMES)
+
+def insert_fx_rates(rates, source=FX_SOURCE_BLUE):
+    """
+    Carga masiva de cotizaciones historicas: iterable de (fecha ISO, valor).
+    """
+    datos = [(source, str(fecha)[:10], float(valor)) for fecha, valor in rates]
+    if not datos:
+        return 0
+    with conectar(REGISTROS_DB, escritura=True) as conn:
         conn.executemany("""
-            INSERT INTO income (uuid, marca_temporal, descripcion, importe, moneda)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO fx_rates (source, date, value) VALUES (?, ?, ?)
+            ON CONFLICT(source, date) DO UPDATE SET value = excluded.value
         """, datos)
         conn.commit()
+    versiones.bump(INCOMES)
+    return len(datos)
+
+def load_fx_rates_file(path, source=FX_SOURCE_BLUE):
+    # CSV con columnas date,value (fecha en formato YYYY-MM-DD)
+    with open(path, newline="", encoding="utf-8") as f:
+        return insert_fx_rates(((row["date"], row["value"]) for row in csv.DictReader(f)), source)
+
+def get_fx_rate(fecha, source=FX_SOURCE_BLUE):
+    with conectar(REGISTROS_DB) as conn:
+        row = conn.execute("""
+            SELECT value FROM fx_rates
+            WHERE source = ? AND date <= ?
+            ORDER BY date DESC LIMIT 1
+        """, (source, str(fecha))).fetchone()
+        return row[0] if row else None
+
+# Cache en memoria + ultimo valor bueno en SQLite; el proveedor se puede
+# reemplazar (por ejemplo por StaticRateProvider) asignando dolar_blue.provider
+dolar_blue = CachedRate("dolar_blue_buy", provider_from_env(), get_saved_rate, save_rate)
 
 def get_dolar_blue_buy():
- response = requests.get("https://api.bluelytics.com.ar/v2/latest")
- dolar_data = response.json()
- dolar_blue_data = dolar_data.get('blue')
- dolar_blue_buy = dolar_blue_data.get('value_buy')
- return dolar_blue_buy
+    return dolar_blue.get()
 
 def get_balance():
      with conectar(REGISTROS_DB) as conn:
-        expenses = conn.execute(""" SELECT SUM(importe) FROM registros""").fetchone()[0] or 0
+        expenses = conn.execute(""" SELECT SUM(total_cents) FROM monthly_expense_totals""").fetchone()[0] or 0
         
-        income   = conn.execute(""" SELECT SUM(importe) FROM income""").fetchone()[0] or 0
-        balance = income - expenses
-        return float(round(balance, 2))
-    
\ No newline at end of file
+        income   = conn.execute(""" SELECT SUM(total_cents) FROM monthly_income_totals""").fetchone()[0] or 0
+        # SUM sobre enteros: exacto, sin redondeos
+        return (income - expenses) / 100
+
+# ------------------- PAGINACION -------------------
+
+# Paginas de los endpoints mensuales por keyset: cada pagina arranca despues de la clave de
+# la ultima fila de la anterior ((marca_temporal, id) en gastos e ingresos; la PK
+# (document_number, holder, position) en las lineas de resumen), asi el costo depende del
+# tamanio de la pagina y no del mes. Los totales salen de consultas agregadas.
+PAGE_MAX_LIMIT = 1000
+
+# Campos que se pueden pedir con fields= en cada fuente
+EXPENSE_FIELDS = ("uuid", "datetime", "description", "amount", "type")
+INCOME_FIELDS = ("uuid", "datetime", "description", "amount_pesos", "amount_usd")
+CARD_EXPENSE_FIELDS = ("date", "descriptions", "amount_pesos", "amount_usd")
+
+def _proyectar(item, campos):
+    return item if campos is None else {c: item[c] for c in campos}
+
+def _limite(limit):
+    # LIMIT -1 en SQLite es sin limite
+    return -1 if limit is None else max(1, min(int(limit), PAGE_MAX_LIMIT)) + 1
+
+def _cortar_pagina(filas, limit, clave):
+    """Se pide una fila de mas: si vino, hay otra pagina y la clave es la de la ultima que queda."""
+    if limit is None or len(filas) <= limit:
+        return filas, None
+    filas = filas[:limit]
+    return filas, list(clave(filas[-1]))
+
+def pagina_registros(anio, mes, limit=None, despues=None, campos=None, raw=False):
+    """
+    Gastos del mes ordenados por (marca_temporal, id), de a `limit` filas desde la clave
+    `despues`, con solo los `campos` pedidos. Devuelve (respuesta, clave siguiente o None).
+    """
+    fmt = cents_formatter(raw)
+    filtro, params = "", []
+    if despues is not None:
+        filtro = "AND (marca_temporal, id) > (?, ?)"
+        params = list(despues)
+    with conectar(REGISTROS_DB) as conn:
+        filas = conn.execute(f"""
+            SELECT id, uuid, marca_temporal, descripcion, importe_cents, tipo
+            FROM registros
+            WHERE marca_temporal >= ? AND marca_temporal < ? {filtro}
+            ORDER BY marca_temporal, id
+            LIMIT ?
+        """, [*rango_mes(anio, mes), *params, _limite(limit)]).fetchall()
+        totales = _totales_registros(conn, anio, mes, fmt)
+
+    filas, siguiente = _cortar_pagina(filas, limit, lambda f: (f[2], f[0]))
+    registros = [
+        _proyectar({
+            "uuid": uuid,
+            "datetime": marca_temporal,
+            "description": descripcion,
+            "amount": fmt(importe),
+            "type": tipo
+        }, campos)
+        for _, uuid, marca_temporal, descripcion, importe, tipo in filas
+    ]
+    return {**totales, "expenses": registros}, siguiente
+
+def _redondeo_sql(expr):
+    """
+    round() de Python (mitad al par) en SQL sobre el mismo double, para que los totales
+    agregados coincidan al centavo con la suma de las filas convertidas en Python.
+    """
+    n = f"CAST({expr} AS INTEGER)"
+    f = f"({expr} - {n})"
+    return f"""(CASE
+        WHEN {f} > 0.5 THEN {n} + 1
+        WHEN {f} < -0.5 THEN {n} - 1
+        WHEN {f} = 0.5 THEN {n} + ({n} % 2)
+        WHEN {f} = -0.5 THEN {n} - abs({n} % 2)
+        ELSE {n} END)"""
+
+def _totales_incomes(conn, desde, hasta, fmt):
+    """
+    Totales en ARS y USD de los ingresos del rango con la conversion de _convertir_income
+    hecha en SQL, sin traer las filas. Los ingresos sin cotizacion historica usan la actual,
+    que solo se pide si hace falta.
+    """
+    def totales(cotizacion_actual):
+        return conn.execute(f"""
+            WITH filas AS (
+                SELECT i.importe_cents AS importe, i.moneda,
+                       COALESCE((SELECT f.value FROM fx_rates f
+                                 WHERE f.source = ? AND f.date <= i.marca_temporal
+                                 ORDER BY f.date DESC LIMIT 1), ?) AS cotizacion
+                FROM income i
+                WHERE i.marca_temporal >= ? AND i.marca_temporal < ?
+            ), convertidas AS (
+                SELECT moneda, importe,
+                       CASE WHEN moneda = 'USD' THEN importe * cotizacion ELSE importe / cotizacion END AS valor
+                FROM filas WHERE cotizacion IS NOT NULL
+            )
+            SELECT
+                COALESCE(SUM(CASE WHEN moneda = 'USD' THEN {_redondeo_sql("valor")} ELSE importe END), 0),
+                COALESCE(SUM(CASE WHEN moneda = 'USD' THEN importe ELSE {_redondeo_sql("valor")} END), 0),
+                (SELECT COUNT(*) FROM filas WHERE cotizacion IS NULL)
+            FROM convertidas
+        """, (FX_SOURCE_BLUE, cotizacion_actual, desde, hasta)).fetchone()
+
+    total_ars, total_usd, sin_cotizacion = totales(None)
+    if sin_cotizacion:
+        total_ars, total_usd, _ = totales(get_dolar_blue_buy())
+    return {"total_ars": fmt(total_ars), "total_usd": fmt(total_usd)}
+
+def pagina_incomes(anio, mes, limit=None, despues=None, campos=None, raw=False):
+    """Ingresos del mes por (marca_temporal, id), como pagina_registros."""
+    fmt = cents_formatter(raw)
+    desde, hasta = rango_mes(anio, mes)
+    filtro, params = "", []
+    if despues is not None:
+        filtro = "AND (i.marca_temporal, i.id) > (?, ?)"
+        params = list(despues)
+    with conectar(REGISTROS_DB) as conn:
+        filas = conn.execute(f"""
+            SELECT i.id, i.uuid, i.marca_temporal, i.descripcion, i.importe_cents, i.moneda,
+                   (SELECT f.value FROM fx_rates f
+                    WHERE f.source = ? AND f.date <= i.marca_temporal
+                    ORDER BY f.date DESC LIMIT 1) AS cotizacion
+            FROM income i
+            WHERE i.marca_temporal >= ? AND i.marca_temporal < ? {filtro}
+            ORDER BY i.marca_temporal, i.id
+            LIMIT ?
+        """, [FX_SOURCE_BLUE, desde, hasta, *params, _limite(limit)]).fetchall()
+        totales = _totales_incomes(conn, desde, hasta, fmt)
+
+    filas, siguiente = _cortar_pagina(filas, limit, lambda f: (f[2], f[0]))
+    registros = []
+    dolar_blue_buy = None
+    for _, uuid, marca_temporal, descripcion, importe, moneda, cotizacion in filas:
+        if cotizacion is None:
+            if dolar_blue_buy is None:
+                dolar_blue_buy = get_dolar_blue_buy()
+            cotizacion = dolar_blue_buy
+        amount_ars, amount_usd = _convertir_income(importe, moneda, cotizacion)
+        registros.append(_proyectar({
+            "uuid": uuid,
+            "datetime": marca_temporal,
+            "description": descripcion,
+            "amount_pesos": fmt(amount_ars),
+            "amount_usd": fmt(amount_usd)
+        }, campos))
+    return {**totales, "incomes": registros}, siguiente
+
+def pagina_resumen(anio, mes, card_type=None, holder=None, limit=None, despues=None, campos=None, raw=False):
+    """
+    Resumen del mes con la misma forma que obtener_resumen, pero con solo `limit` lineas
+    (en orden de la PK, desde la clave `despues`) repartidas en sus titulares. Tarjetas,
+    titulares y totales vienen completos en cada pagina: son pocas filas por mes.
+    """
+    fmt = cents_formatter(raw)
+    filtros = _filtros_resumen(anio, mes, card_type, holder)
+    header_filter, header_params, holder_filter, holder_params = filtros
+    filtro, params = "", []
+    if despues is not None:
+        filtro = " AND (h.document_number, h.holder, h.position) > (?, ?, ?)"
+        params = list(despues)
+
+    with conectar(TARJETAS_DB) as conn:
+        headers, holders = _resumen_totales(conn, filtros)
+        headers = headers.fetchall()
+        holders = holders.fetchall()
+        expenses = conn.execute(f"""
+            SELECT h.document_number, h.holder, h.position, h.date, h.description, h.amount_cents
+            FROM card_holder_expenses h
+            WHERE h.document_number IN (SELECT c.document_number FROM cards_resume_header c WHERE {header_filter}){holder_filter}{filtro}
+            ORDER BY h.document_number, h.holder, h.position
+            LIMIT ?
+        """, header_params + holder_params + params + [_limite(limit)]).fetchall()
+
+    expenses, siguiente = _cortar_pagina(expenses, limit, lambda e: e[:3])
+
+    resumen = {"cards": [], "total_ars_cards": 0, "total_usd_cards": 0}
+    cards = {}
+    for doc_number, c_type, c_ars, c_usd in headers:
+        cards[doc_number] = {
+            "card_type": c_type,
+            "holders": [],
+            "total_ars_card": "#Vacio por el momento",
+            "total_usd_card": "#vacio por el momento"
+        }
+        resumen["cards"].append(cards[doc_number])
+    if headers:
+        resumen["total_ars_cards"] = fmt(sum(h[2] for h in headers))
+        resumen["total_usd_cards"] = fmt(sum(h[3] for h in headers))
+
+    holders_info = {}
+    for doc_number, h_name, h_ars, h_usd in holders:
+        holders_info[(doc_number, h_name)] = holder_info = {
+            "holder": h_name,
+            "total_ars": fmt(h_ars),
+            "total_usd": fmt(h_usd),
+            "expenses": []
+        }
+        cards[doc_number]["holders"].append(holder_info)
+
+    fechas_fmt = {}
+    for doc_number, h_name, _, e_date, e_desc, e_amount in expenses:
+        holder_info = holders_info.get((doc_number, h_name))
+        if holder_info is not None:
+            holder_info["expenses"].append(_proyectar(_card_expense(e_date, e_desc, e_amount, fechas_fmt, fmt), campos))
+    return resumen, siguiente
+
+# ------------------- BUSQUEDA (FTS5) -------------------
+
+# Indices de texto completo sobre las descripciones: tablas FTS5 de contenido externo (no
+# duplican el texto). Los triggers no escriben el indice directamente (FTS5 vuelca un segmento
+# por cada fila modificada dentro de un trigger, ~6x el costo del insert) sino que encolan el
+# cambio en {fts}_cola; cada camino de escritura la vuelca con _indexar_busqueda antes del
+# commit, en una sola sentencia. buscar() vacia lo que haya quedado encolado.
+# {source: (tabla, tabla fts, columna de texto)}
+SEARCH_SOURCES = {
+    "expenses": ("registros", "registros_fts", "descripcion"),
+    "incomes": ("income", "income_fts", "descripcion"),
+    "cards": ("card_holder_expenses", "card_holder_expenses_fts", "description"),
+}
+SEARCH_MAX_LIMIT = 500
+_FTS_DE_TABLA = {tabla: (fts, columna) for tabla, fts, columna in SEARCH_SOURCES.values()}
+
+def create_search_tables():
+    for tabla, fts, columna in SEARCH_SOURCES.values():
+        with conectar(_db_de_tabla(tabla), escritura=True) as conn:
+            existia = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).fetchone()
+            # remove_diacritics: "cafe" encuentra "Café". Sin indices de prefijo (prefix=): encarecen la
+            # escritura y las busquedas por prefijo ya son rapidas recorriendo el rango de terminos
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    {columna}, content='{tabla}', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            # op: 'i' agrega (fila, texto) al indice, 'd' lo saca; se aplican en orden de id
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {fts}_cola (
+                    id INTEGER PRIMARY KEY,
+                    op TEXT NOT NULL,
+                    fila INTEGER NOT NULL,
+                    texto TEXT
+                )
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {tabla} BEGIN
+                    INSERT INTO {fts}_cola (op, fila, texto) VALUES ('i', NEW.rowid, NEW.{columna});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {tabla} BEGIN
+                    INSERT INTO {fts}_cola (op, fila, texto) VALUES ('d', OLD.rowid, OLD.{columna});
+                END
+            """)
+            # Solo cuando cambia el texto: los syncs que corrigen importes no tocan el indice
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {columna} ON {tabla}
+                WHEN OLD.{columna} IS NOT NEW.{columna} BEGIN
+                    INSERT INTO {fts}_cola (op, fila, texto) VALUES ('d', OLD.rowid, OLD.{columna});
+                    INSERT INTO {fts}_cola (op, fila, texto) VALUES ('i', NEW.rowid, NEW.{columna});
+                END
+            """)
+            if not existia:
+                # Bases con datos anteriores al indice
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+                conn.execute(f"DELETE FROM {fts}_cola")
+            else:
+                _indexar_busqueda(conn, tabla)
+            conn.commit()
+
+def _indexar_busqueda(conn, tabla):
+    """Vuelca al indice FTS los cambios encolados de `tabla`, dentro de la transaccion de `conn`."""
+    fts, columna = _FTS_DE_TABLA[tabla]
+    # Las bases creadas sin create_search_tables (scripts, benchmarks viejos) no tienen indice
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{fts}_cola",)).fetchone():
+        return
+    # 'delete' en la columna oculta saca la fila del indice; NULL es un insert comun
+    conn.execute(f"""
+        INSERT INTO {fts} ({fts}, rowid, {columna})
+        SELECT CASE WHEN op = 'd' THEN 'delete' END, fila, texto FROM {fts}_cola ORDER BY id
+    """)
+    conn.execute(f"DELETE FROM {fts}_cola")
+
+def indexar_busqueda(source):
+    tabla = SEARCH_SOURCES[source][0]
+    with conectar(_db_de_tabla(tabla), escritura=True) as conn:
+        _indexar_busqueda(conn, tabla)
+        conn.commit()
+
+def _fts_query(texto, prefijo=True):
+    """
+    Texto libre -> consulta FTS5: cada palabra entre comillas (los operadores y simbolos
+    del usuario no se interpretan) y, con `prefijo`, como prefijo ("super" -> "super"*).
+    Todas las palabras tienen que aparecer.
+    """
+    palabras = [p.replace('"', "") for p in texto.split()]
+    palabras = [p for p in palabras if p]
+    if not palabras:
+        raise ValueError("La busqueda no tiene palabras")
+    sufijo = "*" if prefijo else ""
+    return " ".join(f'"{p}"{sufijo}' for p in palabras)
+
+# Columnas y filtros de cada fuente para buscar(): (FROM con el join a la tabla base,
+# columna de fecha, columnas devueltas, filtro por tarjeta)
+_SEARCH_QUERIES = {
+    "expenses": (
+        "registros_fts JOIN registros t ON t.rowid = registros_fts.rowid",
+        "t.marca_temporal",
+        "t.uuid, t.marca_temporal, t.descripcion, t.importe_cents, t.tipo",
+        None,
+    ),
+    "incomes": (
+        "income_fts JOIN income t ON t.rowid = income_fts.rowid",
+        "t.marca_temporal",
+        "t.uuid, t.marca_temporal, t.descripcion, t.importe_cents, t.moneda",
+        None,
+    ),
+    "cards": (
+        "card_holder_expenses_fts JOIN card_holder_expenses t ON t.rowid = card_holder_expenses_fts.rowid"
+        " JOIN cards_resume_header c ON c.document_number = t.document_number",
+        "t.date",
+        "t.document_number, c.card_type, c.resume_date, t.holder, t.date, t.description, t.amount_cents",
+        "c.card_type",
+    ),
+}
+
+def _resultado_busqueda(source, fila, fmt):
+    if source == "expenses":
+        uuid, marca_temporal, descripcion, importe, tipo = fila
+        return {"uuid": uuid, "datetime": marca_temporal, "description": descripcion, "amount": fmt(importe), "type": tipo}
+    if source == "incomes":
+        uuid, marca_temporal, descripcion, importe, moneda = fila
+        return {"uuid": uuid, "datetime": marca_temporal, "description": descripcion, "amount": fmt(importe), "currency": moneda}
+    document_number, card_type, resume_date, holder, fecha, descripcion, importe = fila
+    usd = "USD" in descripcion
+    return {
+        "document_number": document_number,
+        "card_type": card_type,
+        "resume_date": resume_date,
+        "holder": holder,
+        "date": fecha,
+        "description": descripcion,
+        "amount_pesos": "" if usd else fmt(importe),
+        "amount_usd": fmt(importe) if usd else "",
+    }
+
+def buscar(source, texto, desde=None, hasta=None, card_type=None, holder=None,
+           order="rank", limit=50, despues=None, prefijo=True, raw=False):
+    """
+    Busqueda de texto completo en las descripciones de una fuente.
+
+    order="rank" ordena por relevancia (bm25) y order="date" por fecha, mas reciente primero.
+    La paginacion es por keyset: `despues` es la clave (orden, rowid) del ultimo resultado
+    de la pagina anterior, asi cada pagina cuesta lo mismo sin importar la profundidad.
+    Devuelve (resultados, clave del ultimo resultado o None si no hay mas).
+    """
+    tabla, fts, _ = SEARCH_SOURCES[source]
+    origen, fecha, columnas, columna_tarjeta = _SEARCH_QUERIES[source]
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+
+    filtros = [f"{fts} MATCH ?"]
+    params = [_fts_query(texto, prefijo)]
+    if desde:
+        filtros.append(f"{fecha} >= ?")
+        params.append(desde)
+    if hasta:
+        filtros.append(f"{fecha} < ?")
+        params.append(hasta)
+    if card_type or holder:
+        if columna_tarjeta is None:
+            raise ValueError(f"Los filtros de tarjeta y titular no aplican a {source}")
+        if card_type:
+            filtros.append(f"{columna_tarjeta} = ?")
+            params.append(card_type)
+        if holder:
+            filtros.append("t.holder = ?")
+            params.append(holder)
+
+    if order == "rank":
+        clave = f"bm25({fts})"
+        if despues is not None:
+            filtros.append(f"({clave}, t.rowid) > (?, ?)")
+            params.extend(despues)
+        orden = f"{clave}, t.rowid"
+    elif order == "date":
+        clave = fecha
+        if despues is not None:
+            filtros.append(f"({fecha}, t.rowid) < (?, ?)")
+            params.extend(despues)
+        orden = f"{fecha} DESC, t.rowid DESC"
+    else:
+        raise ValueError("order debe ser 'rank' o 'date'")
+
+    fmt = cents_formatter(raw)
+    with conectar(_db_de_tabla(tabla)) as conn:
+        pendiente = conn.execute(f"SELECT EXISTS (SELECT 1 FROM {fts}_cola)").fetchone()[0]
+    if pendiente:
+        # Algun camino de escritura no volco la cola: se indexa antes de leer
+        indexar_busqueda(source)
+
+    with conectar(_db_de_tabla(tabla)) as conn:
+        # Se pide una fila de mas para saber si hay otra pagina
+        filas = conn.execute(f"""
+            SELECT {clave}, t.rowid, {columnas}
+            FROM {origen}
+            WHERE {" AND ".join(filtros)}
+            ORDER BY {orden}
+            LIMIT ?
+        """, params + [limit + 1]).fetchall()
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = list(filas[-1][:2])
+    return [_resultado_busqueda(source, fila[2:], fmt) for fila in filas], siguiente
+
+# ------------------- SERIES MENSUALES -------------------
+
+# Fuentes de /analytics/series: (tabla de la base, FROM, columna fecha, {agrupacion: columna},
+# {total: expresion en centavos}). Todas se resuelven con el mismo GROUP BY por mes sobre
+# el rango de fechas indexado.
+_USD_EN_DESCRIPCION = "instr(h.description, 'USD') > 0"
+ANALYTICS_SOURCES = {
+    "expenses": (
+        "registros", "registros r", "r.marca_temporal",
+        {"type": "r.tipo"},
+        {"total": "r.importe_cents"},
+    ),
+    # Totales informados en cada resumen (los mismos que suma /getResumeExpenses), por mes del resumen
+    "cards": (
+        "cards_resume_header", "cards_resume_header c", "c.resume_date",
+        {"card": "c.card_type"},
+        {"total_ars": "c.total_ars_cents", "total_usd": "c.total_usd_cents"},
+    ),
+    "card_holders": (
+        "card_resume_holder",
+        "cards_resume_header c JOIN card_resume_holder h ON h.document_number = c.document_number",
+        "c.resume_date",
+        {"card": "c.card_type", "holder": "h.holder"},
+        {"total_ars": "h.total_ars_cents", "total_usd": "h.total_usd_cents"},
+    ),
+    # Suma de las lineas de cada resumen; las lineas en dolares llevan "USD" en la descripcion
+    "card_expenses": (
+        "card_holder_expenses",
+        "cards_resume_header c JOIN card_holder_expenses h ON h.document_number = c.document_number",
+        "c.resume_date",
+        {"card": "c.card_type", "holder": "h.holder"},
+        {"total_ars": f"CASE WHEN {_USD_EN_DESCRIPCION} THEN 0 ELSE h.amount_cents END",
+         "total_usd": f"CASE WHEN {_USD_EN_DESCRIPCION} THEN h.amount_cents ELSE 0 END"},
+    ),
+    # Los ingresos se convierten fila por fila con la cotizacion a su fecha (ver _income_cursor)
+    "incomes": (
+        "income", "income i", "i.marca_temporal",
+        {"currency": "i.moneda"},
+        None,
+    ),
+}
+
+# Fuentes con agregado mensual (ver MONTHLY_TOTALS): los meses completos del rango salen de
+# ahi y solo los meses parciales de los extremos se suman desde las filas.
+# {source: (tabla agregada, {agrupacion: columna}, {total: columna})}
+ANALYTICS_MONTHLY = {
+    "expenses": ("monthly_expense_totals", {"type": "tipo"}, {"total": "total_cents"}),
+    "cards": ("monthly_card_totals", {"card": "card_type"}, {"total_ars": "total_ars_cents", "total_usd": "total_usd_cents"}),
+}
+
+def _meses_del_rango(desde, hasta):
+    # 'YYYY-MM' de cada mes que toca el rango [desde, hasta)
+    anio, mes = int(desde[:4]), int(desde[5:7])
+    ultimo = (datetime.fromisoformat(hasta) - timedelta(days=1)).strftime("%Y-%m")
+    meses = []
+    while True:
+        actual = f"{anio:04d}-{mes:02d}"
+        if actual > ultimo:
+            return meses
+        meses.append(actual)
+        anio, mes = anio + mes // 12, mes % 12 + 1
+
+def serie_mensual(source, desde, hasta, agrupar=(), raw=False):
+    """
+    Totales por mes (y opcionalmente por agrupaciones de la fuente) en el rango [desde, hasta)
+    con una sola consulta. Los importes se suman en centavos y se formatean al final.
+    """
+    if source == "cards" and "holder" in agrupar:
+        source = "card_holders"
+    tabla, origen, fecha, grupos, totales = ANALYTICS_SOURCES[source]
+    desconocidas = [g for g in agrupar if g not in grupos]
+    if desconocidas:
+        raise ValueError(f"Agrupaciones no disponibles para {source}: {desconocidas}. Disponibles: {list(grupos)}")
+
+    claves = [f"substr({fecha}, 1, 7)", *(grupos[g] for g in agrupar)]
+    fmt = cents_formatter(raw)
+
+    with conectar(_db_de_tabla(tabla)) as conn:
+        if totales is None:
+            filas = _serie_incomes(conn, claves, desde, hasta)
+            nombres = ["total_ars", "total_usd"]
+        else:
+            nombres = list(totales)
+            agregado = ANALYTICS_MONTHLY.get(source)
+            # Primer dia del primer mes completo y del mes en que cae `hasta`
+            completo_desde = desde[:8] + "01" if desde[8:10] == "01" else rango_mes(desde[:4], desde[5:7])[1]
+            completo_hasta = hasta[:8] + "01"
+            if agregado and all(g in agregado[1] for g in agrupar) and completo_desde < completo_hasta:
+                filas = (_serie_filas(conn, origen, fecha, claves, totales, desde, completo_desde)
+                         + _serie_agregada(conn, agregado, agrupar, completo_desde, completo_hasta)
+                         + _serie_filas(conn, origen, fecha, claves, totales, completo_hasta, hasta))
+            else:
+                filas = _serie_filas(conn, origen, fecha, claves, totales, desde, hasta)
+
+    n = len(claves)
+    acumulado = dict.fromkeys(nombres, 0)
+    series = []
+    for fila in filas:
+        punto = {"month": fila[0]}
+        punto.update(zip(agrupar, fila[1:n]))
+        for nombre, valor in zip(nombres, fila[n:-1]):
+            valor = valor or 0
+            acumulado[nombre] += valor
+            punto[nombre] = fmt(valor)
+        punto["count"] = fila[-1]
+        series.append(punto)
+
+    return {
+        "source": source if source != "card_holders" else "cards",
+        "group_by": list(agrupar),
+        "months": _meses_del_rango(desde, hasta),
+        "series": series,
+        "totals": {nombre: fmt(valor) for nombre, valor in acumulado.items()},
+    }
+
+def _serie_filas(conn, origen, fecha, claves, totales, desde, hasta):
+    if desde >= hasta:
+        return []
+    sumas = ", ".join(f"SUM({expresion})" for expresion in totales.values())
+    posiciones = ", ".join(str(i) for i in range(1, len(claves) + 1))
+    return conn.execute(f"""
+        SELECT {", ".join(claves)}, {sumas}, COUNT(*)
+        FROM {origen}
+        WHERE {fecha} >= ? AND {fecha} < ?
+        GROUP BY {posiciones}
+        ORDER BY {posiciones}
+    """, (desde, hasta)).fetchall()
+
+def _serie_agregada(conn, agregado, agrupar, desde, hasta):
+    # Meses completos [desde, hasta) desde la tabla agregada; mismas columnas que _serie_filas
+    destino, grupos, totales = agregado
+    claves = ["printf('%04d-%02d', year, month)", *(grupos[g] for g in agrupar)]
+    sumas = ", ".join(f"SUM({columna})" for columna in totales.values())
+    posiciones = ", ".join(str(i) for i in range(1, len(claves) + 1))
+    return conn.execute(f"""
+        SELECT {", ".join(claves)}, {sumas}, SUM(count)
+        FROM {destino}
+        WHERE year * 100 + month >= ? AND year * 100 + month < ?
+        GROUP BY {posiciones}
+        HAVING SUM(count) > 0
+        ORDER BY {posiciones}
+    """, (int(desde[:4] + desde[5:7]), int(hasta[:4] + hasta[5:7]))).fetchall()
+
+def _serie_incomes(conn, claves, desde, hasta):
+    # Misma conversion que get_incomes (cotizacion a la fecha, o la actual si no hay historico)
+    # acumulada por clave en centavos; las filas no se formatean
+    cursor = conn.execute(f"""
+        SELECT {", ".join(claves)}, i.importe_cents, i.moneda,
+               (SELECT f.value FROM fx_rates f
+                WHERE f.source = ? AND f.date <= i.marca_temporal
+                ORDER BY f.date DESC LIMIT 1)
+        FROM income i
+        WHERE i.marca_temporal >= ? AND i.marca_temporal < ?
+    """, (FX_SOURCE_BLUE, desde, hasta))
+
+    n = len(claves)
+    grupos = {}
+    dolar_blue_buy = None
+    for fila in cursor:
+        importe, moneda, cotizacion = fila[n:]
+        if cotizacion is None:
+            if dolar_blue_buy is None:
+                dolar_blue_buy = get_dolar_blue_buy()
+            cotizacion = dolar_blue_buy
+        ars, usd = _convertir_income(importe, moneda, cotizacion)
+        acumulado = grupos.get(fila[:n])
+        if acumulado is None:
+            grupos[fila[:n]] = [ars, usd, 1]
+        else:
+            acumulado[0] += ars
+            acumulado[1] += usd
+            acumulado[2] += 1
+    return [clave + tuple(valores) for clave, valores in sorted(grupos.items(), key=lambda g: [str(v) for v in g[0]])]
+
+# ------------------- TOTALES MENSUALES -------------------
+
+# Agregados por mes mantenidos por triggers, asi cualquier camino de escritura (sync,
+# inserts sueltos, borrados) los deja al dia.
+# (tabla origen, tabla agregada, columna fecha, columna agrupacion, {columna total: columna sumada})
+MONTHLY_TOTALS = [
+    ("registros", "monthly_expense_totals", "marca_temporal", "tipo", {"total_cents": "importe_cents"}),
+    ("income", "monthly_income_totals", "marca_temporal", "moneda", {"total_cents": "importe_cents"}),
+    ("cards_resume_header", "monthly_card_totals", "resume_date", "card_type",
+     {"total_ars_cents": "total_ars_cents", "total_usd_cents": "total_usd_cents"}),
+]
+
+def _monthly_key(fecha, grupo, row=None):
+    prefijo = f"{row}." if row else ""
+    return (f"CAST(substr({prefijo}{fecha}, 1, 4) AS INTEGER)",
+            f"CAST(substr({prefijo}{fecha}, 6, 2) AS INTEGER)",
+            f"COALESCE({prefijo}{grupo}, '')")
+
+def _monthly_trigger_upsert(destino, fecha, grupo, totales, row, signo):
+    anio, mes, clave = _monthly_key(fecha, grupo, row)
+    nuevos = ", ".join(f"{signo}COALESCE({row}.{col}, 0)" for col in totales.values())
+    acumulados = ", ".join(f"{t} = {t} + excluded.{t}" for t in totales)
+    return f"""
+        INSERT INTO {destino} (year, month, {grupo}, {", ".join(totales)}, count)
+        VALUES ({anio}, {mes}, {clave}, {nuevos}, {signo}1)
+        ON CONFLICT(year, month, {grupo}) DO UPDATE SET {acumulados}, count = count + excluded.count;
+    """
+
+def _monthly_totals_query(origen, fecha, grupo, totales):
+    anio, mes, clave = _monthly_key(fecha, grupo)
+    sumas = ", ".join(f"SUM(COALESCE({col}, 0))" for col in totales.values())
+    return f"""
+        SELECT {anio}, {mes}, {clave}, {sumas}, COUNT(*)
+        FROM {origen}
+        GROUP BY 1, 2, 3
+    """
+
+def _rebuild_monthly_totals(conn, origen, destino, fecha, grupo, totales):
+    conn.execute(f"DELETE FROM {destino}")
+    conn.execute(f"""
+        INSERT INTO {destino} (year, month, {grupo}, {", ".join(totales)}, count)
+        {_monthly_totals_query(origen, fecha, grupo, totales)}
+    """)
+
+def _drop_legacy_monthly_totals(conn, destino, totales):
+    # Agregados creados cuando los importes eran REAL: se descartan y se reconstruyen en centavos
+    columnas = {row[1] for row in conn.execute(f"PRAGMA table_info({destino})")}
+    if columnas and next(iter(totales)) not in columnas:
+        for evento in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{destino}_{evento}")
+        conn.execute(f"DROP TABLE {destino}")
+
+def create_monthly_totals_tables():
+    for origen, destino, fecha, grupo, totales in MONTHLY_TOTALS:
+        anio, mes, clave = _monthly_key(fecha, grupo, "OLD")
+        limpiar = f"DELETE FROM {destino} WHERE year = {anio} AND month = {mes} AND {grupo} = {clave} AND count <= 0;"
+        sumar = _monthly_trigger_upsert(destino, fecha, grupo, totales, "NEW", "")
+        restar = _monthly_trigger_upsert(destino, fecha, grupo, totales, "OLD", "-")
+
+        with conectar(_db_de_tabla(origen), escritura=True) as conn:
+            _drop_legacy_monthly_totals(conn, destino, totales)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {destino} (
+                    year INTEGER,
+                    month INTEGER,
+                    {grupo} TEXT,
+                    {", ".join(f"{t} INTEGER" for t in totales)},
+                    count INTEGER,
+                    PRIMARY KEY (year, month, {grupo})
+                )
+            """)
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{destino}_insert AFTER INSERT ON {origen} BEGIN {sumar} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{destino}_delete AFTER DELETE ON {origen} BEGIN {restar} {limpiar} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{destino}_update AFTER UPDATE ON {origen} BEGIN {restar} {limpiar} {sumar} END")
+
+            # Bases que ya tenian datos antes de existir los agregados
+            vacia = conn.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {destino})").fetchone()[0]
+            con_datos = conn.execute(f"SELECT EXISTS (SELECT 1 FROM {origen})").fetchone()[0]
+            if vacia and con_datos:
+                _rebuild_monthly_totals(conn, origen, destino, fecha, grupo, totales)
+            conn.commit()
+
+def check_monthly_totals(repair=False, tolerance=0):
+    """
+    Recalcula los agregados desde los datos crudos y los compara con las tablas
+    mantenidas por los triggers. Con repair=True reconstruye las que no coinciden.
+    Los totales son centavos enteros, asi que por defecto se exige igualdad exacta.
+    """
+    resultado = {}
+    for origen, destino, fecha, grupo, totales in MONTHLY_TOTALS:
+        with conectar(_db_de_tabla(origen), escritura=repair) as conn:
+            columnas = ", ".join(["year", "month", grupo, *totales, "count"])
+            esperado = {tuple(row[:3]): row[3:] for row in conn.execute(_monthly_totals_query(origen, fecha, grupo, totales))}
+            guardado = {tuple(row[:3]): row[3:] for row in conn.execute(f"SELECT {columnas} FROM {destino}")}
+
+            diferencias = []
+            for clave in sorted(esperado.keys() | guardado.keys(), key=str):
+                a, b = esperado.get(clave), guardado.get(clave)
+                if a is None or b is None or a[-1] != b[-1] or any(abs(x - y) > tolerance for x, y in zip(a[:-1], b[:-1])):
+                    diferencias.append({"key": list(clave), "expected": a and list(a), "stored": b and list(b)})
+
+            if repair and diferencias:
+                _rebuild_monthly_totals(conn, origen, destino, fecha, grupo, totales)
+                conn.commit()
+        if repair and diferencias:
+            versiones.bump(_DOMINIO_DE_TABLA[origen])
+
+        resultado[destino] = {
+            "months": len(esperado),
+            "mismatches": diferencias,
+            "repaired": bool(repair and diferencias)
+        }
+    return resultado
+
+# Dominio de cache (ver app.cache) que depende de cada tabla con importes
+_DOMINIO_DE_TABLA = {
+    "registros": EXPENSES,
+    "income": INCOMES,
+    "cards_resume_header": CARDS,
+    "card_resume_holder": CARDS,
+    "card_holder_expenses": CARDS,
+}
+
+# ------------------- MIGRACION A CENTAVOS -------------------
+
+# Columnas de importes: {tabla: {columna REAL anterior: columna en centavos}}
+MONEY_COLUMNS = {
+    "registros": {"importe": "importe_cents"},
+    "income": {"importe": "importe_cents"},
+    "cards_resume_header": {"total_ars": "total_ars_cents", "total_usd": "total_usd_cents"},
+    "card_resume_holder": {"total_ars": "total_ars_cents", "total_usd": "total_usd_cents"},
+    "card_holder_expenses": {"amount": "amount_cents"},
+}
+
+MIGRATION_BATCH_SIZE = 5000
+
+def _columnas_reales(conn, tabla):
+    # Columnas REAL de la version anterior que siguen en la tabla -> su columna en centavos
+    existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({tabla})")}
+    return {real: cents for real, cents in MONEY_COLUMNS[tabla].items() if real in existentes}
+
+def _sin_centavos(anteriores):
+    return " OR ".join(f"({cents} IS NULL AND {real} IS NOT NULL)" for real, cents in anteriores.items())
+
+def money_to_cents_pending():
+    """
+    True si hay filas con importe REAL y sin centavos: las que escribio la version anterior
+    despues de migrar. Las bases creadas sin columnas REAL no recorren ninguna tabla.
+    """
+    for tabla in MONEY_COLUMNS:
+        with conectar(_db_de_tabla(tabla)) as conn:
+            anteriores = _columnas_reales(conn, tabla)
+            if anteriores and conn.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {tabla} WHERE {_sin_centavos(anteriores)})"
+            ).fetchone()[0]:
+                return True
+    return False
+
+def migrate_money_to_cents(batch_size=MIGRATION_BATCH_SIZE, pause_sec=0.0, progress=None):
+    """
+    Completa las columnas *_cents a partir de las columnas REAL anteriores.
+
+    Recorre cada tabla por rangos de rowid de `batch_size` filas, cada rango en su propia
+    transaccion corta: entre lote y lote el escritor queda libre para otros procesos y los
+    lectores (WAL) nunca se bloquean. Es idempotente: solo toca filas sin centavos, asi que
+    puede cortarse y volver a correrse. Las filas que la version anterior siga escribiendo
+    despues llegan sin centavos: se completan corriendo `python -m app.migrate_cents` o, con
+    MIGRATE_CENTS_ON_START=1, en cada arranque (ver app.migrations). Las columnas REAL
+    quedan como estaban; ningun camino de lectura o escritura las usa.
+    """
+    migradas = {}
+    for tabla in MONEY_COLUMNS:
+        db = _db_de_tabla(tabla)
+        with conectar(db) as conn:
+            anteriores = _columnas_reales(conn, tabla)
+            ultimo = conn.execute(f"SELECT MAX(rowid) FROM {tabla}").fetchone()[0] or 0
+        migradas[tabla] = 0
+        if not anteriores:
+            continue
+
+        asignaciones = ", ".join(
+            f"{cents} = CAST(round({real} * 100) AS INTEGER)" for real, cents in anteriores.items()
+        )
+        pendientes = _sin_centavos(anteriores)
+        desde = 0
+        while desde < ultimo:
+            with conectar(db, escritura=True) as conn:
+                migradas[tabla] += conn.execute(f"""
+                    UPDATE {tabla} SET {asignaciones}
+                    WHERE rowid > ? AND rowid <= ? AND ({pendientes})
+                """, (desde, desde + batch_size)).rowcount
+            desde += batch_size
+            if progress:
+                progress(tabla, min(desde, ultimo), ultimo)
+            if pause_sec:
+                time.sleep(pause_sec)
+        if migradas[tabla]:
+            versiones.bump(_DOMINIO_DE_TABLA[tabla])
+    return migradas
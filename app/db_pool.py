@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Ajustes de SQLite, configurables por variables de entorno
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "32768"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Con varios workers (procesos) el escritor de uno espera a que confirme el de otro
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "1") == "1"
+
+
+def _abrir(db_path: Path, escritor: bool = False) -> sqlite3.Connection:
+    # El escritor abre sus transacciones con BEGIN IMMEDIATE: toma el lock de escritura al
+    # empezar y espera el busy timeout si otro proceso lo tiene. Con BEGIN diferido una
+    # transaccion que ya leyo falla con SQLITE_BUSY sin esperar cuando otro proceso escribio.
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+        isolation_level="IMMEDIATE" if escritor else "",
+    )
+    conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    # cache_size negativo = tamaño en KiB en lugar de páginas
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA foreign_keys={'ON' if FOREIGN_KEYS else 'OFF'}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Conexiones de lectura por hilo y un único escritor serializado por base de datos.
+    En modo WAL los lectores no se bloquean mientras el escritor confirma. Entre
+    procesos (varios workers) los escritores se serializan con el lock de SQLite.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writers = {}
+        self._readers = []
+
+    def _reader(self, db_path: Path) -> sqlite3.Connection:
+        conexiones = getattr(self._local, "conexiones", None)
+        if conexiones is None:
+            conexiones = self._local.conexiones = {}
+        key = str(db_path)
+        conn = conexiones.get(key)
+        if conn is None:
+            conn = conexiones[key] = _abrir(db_path)
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def _writer(self, db_path: Path):
+        key = str(db_path)
+        with self._lock:
+            writer = self._writers.get(key)
+            if writer is None:
+                writer = self._writers[key] = (_abrir(db_path, escritor=True), threading.Lock())
+        return writer
+
+    @contextmanager
+    def lectura(self, db_path: Path):
+        conn = self._reader(db_path)
+        try:
+            yield conn
+        finally:
+            # No dejar transacciones abiertas que congelen el snapshot del hilo
+            if conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def escritura(self, db_path: Path):
+        conn, lock = self._writer(db_path)
+        with lock:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def dedicada(self, db_path: Path):
+        # Conexion de lectura propia para cursores que viven mas que una llamada
+        # (respuestas en streaming); se cierra al terminar
+        conn = _abrir(db_path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def cerrar(self):
+        with self._lock:
+            for conn, _ in self._writers.values():
+                conn.close()
+            for conn in self._readers:
+                conn.close()
+            self._writers.clear()
+            self._readers.clear()
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
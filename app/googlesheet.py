@@ -1,46 +1,179 @@
 import os
-import gspread
+import hashlib
 import json
-#from  dotenv import load_dotenv.
-from oauth2client.service_account import ServiceAccountCredentials
+import logging
+import threading
+from app.metrics import medir_externo
 SHEET_NAME = "Gastos"
 SHEET_CURRENT_MONTH_EXPENSES = 5
 SHEET_HISTORIC_EXPENSES = 1
 SHEET_CURRENT_MONTH_INCOME = 6
 SHEET_HISTORIC_INCOME = 3
 
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive'] #Add Endpoint to make it work
+
+# "google" usa la API real; "local" lee las hojas de un JSON (SHEETS_LOCAL_FILE) para pruebas offline
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")
+
+log = logging.getLogger(__name__)
+
+
+class SheetClientManager:
+    """
+    Cliente de gspread de larga duracion: las credenciales se arman en memoria una sola vez
+    (google-auth renueva el token solo cuando vence) y se cachean el spreadsheet y sus
+    worksheets para no repetir la busqueda en Drive ni la metadata en cada sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._spreadsheet = None
+        self._spreadsheet_client = None
+        self._worksheets = None
+
+    def _build_client(self):
+        if SHEETS_BACKEND == "local":
+            from app.googlesheet_stub import LocalSheetClient
+            return LocalSheetClient.from_file(os.getenv("SHEETS_LOCAL_FILE"))
+        # gspread (y google-auth) tardan ~150 ms en importarse: solo se cargan si hay un sync
+        import gspread
+
+        json_creds = json.loads(os.getenv('GOOGLE_SHEETS_CREDS_JSON'))
+        with medir_externo("gspread", "auth"):
+            return gspread.service_account_from_dict(json_creds, scopes=SCOPE)
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = self._build_client()
+            return self._client
+
+    def use_client(self, client):
+        # Permite inyectar un cliente propio (por ejemplo el stub local en tests)
+        with self._lock:
+            self._client = client
+            self._spreadsheet = None
+            self._worksheets = None
+
+    def spreadsheet(self, client=None):
+        client = client or self.client()
+        with self._lock:
+            if self._spreadsheet is None or self._spreadsheet_client is not client:
+                with medir_externo("gspread", "open"):
+                    self._spreadsheet = client.open(SHEET_NAME)
+                self._spreadsheet_client = client
+                self._worksheets = None
+            return self._spreadsheet
+
+    def worksheet(self, index, client=None):
+        spreadsheet = self.spreadsheet(client)
+        with self._lock:
+            if self._worksheets is None:
+                with medir_externo("gspread", "worksheets"):
+                    self._worksheets = spreadsheet.worksheets()
+            return self._worksheets[index]
+
+    def reset(self):
+        # Se descarta lo cacheado si la estructura del spreadsheet cambio o hubo un error
+        with self._lock:
+            self._spreadsheet = None
+            self._worksheets = None
+
+
+sheets = SheetClientManager()
+
+
 def auth_in_gdrive():
 
     """
-    This function logs into DRIVE API in order to interact, in this case, with our DATABASE
+    This function logs into DRIVE API in order to interact, in this case, with our DATABASE.
+    The client is built once per process and reused by every sync.
     """
-    json_creds = json.loads(os.getenv('GOOGLE_SHEETS_CREDS_JSON'))
-    with open('gcreds.json', 'w') as fp:
-         json.dump(json_creds, fp)
+    return sheets.client()
+
+def _to_records(header, rows):
+    from gspread.utils import numericise_all
+
+    # Mismo formato que get_all_records: filas completadas al ancho del encabezado y valores numericos convertidos
+    ancho = len(header)
+    return [
+        dict(zip(header, numericise_all((row + [""] * ancho)[:ancho])))
+        for row in rows
+    ]
+
+def _records(values):
+    if not values:
+        return []
+    return _to_records(values[0], values[1:])
 
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive'] #Add Endpoint to make it work
-    creds = ServiceAccountCredentials.from_json_keyfile_name('gcreds.json', scope)
-    client = gspread.authorize(creds)
+def _get_records(client, index):
+    try:
+        worksheet = sheets.worksheet(index, client)
+        with medir_externo("gspread", "get_all_records"):
+            return worksheet.get_all_records()
+    except Exception:
+        sheets.reset()
+        raise
 
-    return client
+def get_records_batch(client, indexes):
+    """
+    Lee varias worksheets en una sola llamada values:batchGet.
+    Devuelve una lista de registros por cada indice, en el mismo orden.
+    """
+    try:
+        spreadsheet = sheets.spreadsheet(client)
+        titles = [sheets.worksheet(index, client).title for index in indexes]
+        with medir_externo("gspread", "values_batch_get"):
+            response = spreadsheet.values_batch_get([f"'{title}'" for title in titles])
+    except Exception:
+        sheets.reset()
+        raise
+    return [_records(value_range.get("values", [])) for value_range in response["valueRanges"]]
 
 def get_current_month_expenses(client):
-    sheet = client.open(SHEET_NAME).get_worksheet(SHEET_CURRENT_MONTH_EXPENSES)
-    sheet_data = sheet.get_all_records()
-    return sheet_data
+    return _get_records(client, SHEET_CURRENT_MONTH_EXPENSES)
 
 def get_historic_expenses(client):
-    sheet = client.open(SHEET_NAME).get_worksheet(SHEET_HISTORIC_EXPENSES)
-    sheet_data = sheet.get_all_records()
-    return sheet_data
+    return _get_records(client, SHEET_HISTORIC_EXPENSES)
 
 def get_current_month_income(client):
-    sheet = client.open(SHEET_NAME).get_worksheet(SHEET_CURRENT_MONTH_INCOME)
-    sheet_data = sheet.get_all_records()
-    print(sheet_data)
-    return sheet_data
+    return _get_records(client, SHEET_CURRENT_MONTH_INCOME)
 
 def get_historic_income(client):
-    sheet = client.open(SHEET_NAME).get_worksheet(SHEET_HISTORIC_INCOME)
-    sheet_data = sheet.get_all_records()
-    return sheet_data
\ No newline at end of file
+    return _get_records(client, SHEET_HISTORIC_INCOME)
+
+# ------------------- Sync incremental -------------------
+
+def get_worksheet(client, index):
+    return sheets.worksheet(index, client)
+
+def get_last_update_time(client):
+    """
+    Fecha de ultima modificacion del spreadsheet (Drive). Sirve como token de cambios:
+    si no cambio desde el ultimo sync no hace falta leer ninguna fila.
+    """
+    try:
+        spreadsheet = sheets.spreadsheet(client)
+        with medir_externo("gspread", "last_update_time"):
+            return spreadsheet.get_lastUpdateTime()
+    except Exception as e:
+        log.warning("no se pudo obtener lastUpdateTime", extra={"error": str(e)})
+        return None
+
+def get_records_from(sheet, header, first_row):
+    """
+    Filas desde `first_row` (numeracion de la hoja, 1 = encabezado) hasta el final,
+    con el mismo formato que get_all_records.
+    """
+    from gspread.utils import rowcol_to_a1
+
+    # Rango abierto por abajo (A{n}:E) para no depender del row_count cacheado de la worksheet
+    ultima_columna = rowcol_to_a1(1, len(header))[:-1]
+    with medir_externo("gspread", "get_values"):
+        valores = sheet.get_values(f"A{first_row}:{ultima_columna}")
+    return _to_records(header, valores)
+
+def row_hash(record: dict):
+    contenido = json.dumps([str(v) for v in record.values()], ensure_ascii=False)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+from gspread.utils import a1_range_to_grid_range
+
+
+class LocalWorksheet:
+    def __init__(self, title, values):
+        self.title = title
+        self.values = values
+
+    @property
+    def row_count(self):
+        return len(self.values)
+
+    def get_values(self, range_name=None):
+        if not range_name:
+            return [list(row) for row in self.values]
+        grid = a1_range_to_grid_range(range_name.split("!")[-1])
+        inicio = grid.get("startRowIndex", 0)
+        fin = grid.get("endRowIndex", len(self.values))
+        col_fin = grid.get("endColumnIndex")
+        return [list(row[:col_fin]) for row in self.values[inicio:fin]]
+
+    def get_all_records(self):
+        from app.googlesheet import _records
+        return _records(self.get_values())
+
+
+class LocalSpreadsheet:
+    def __init__(self, worksheets, last_update=None):
+        self._worksheets = worksheets
+        self.last_update = last_update or datetime.now().isoformat()
+
+    def worksheets(self):
+        return self._worksheets
+
+    def get_worksheet(self, index):
+        return self._worksheets[index]
+
+    def get_lastUpdateTime(self):
+        return self.last_update
+
+    def values_batch_get(self, ranges):
+        por_titulo = {ws.title: ws for ws in self._worksheets}
+        return {
+            "valueRanges": [
+                {"range": r, "values": por_titulo[r.strip("'")].get_values()}
+                for r in ranges
+            ]
+        }
+
+    def touch(self):
+        self.last_update = datetime.now().isoformat()
+
+
+class LocalSheetClient:
+    """
+    Reemplazo offline del cliente de gspread con el subconjunto de la API que usa
+    app.googlesheet. Las hojas se indexan igual que en el spreadsheet real.
+    """
+
+    def __init__(self, worksheets: dict[int, list[list]], last_update=None):
+        cantidad = max(worksheets) + 1 if worksheets else 0
+        self.spreadsheet = LocalSpreadsheet(
+            [LocalWorksheet(f"Hoja {i}", worksheets.get(i, [])) for i in range(cantidad)],
+            last_update,
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        # JSON: {"last_update": "...", "worksheets": {"1": [[encabezado], [fila], ...], ...}}
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        worksheets = {int(index): values for index, values in data["worksheets"].items()}
+        return cls(worksheets, data.get("last_update"))
+
+    def open(self, title):
+        return self.spreadsheet
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import job_latency
+from app.repository import repo
+from app.database import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    acquire_lease,
+    create_job,
+    find_active_job,
+    finish_job,
+    get_job,
+    interrupt_unfinished_jobs,
+    release_lease,
+    release_leases,
+    renew_leases,
+    start_job,
+    update_job_progress,
+)
+
+# Hilos para correr syncs en segundo plano y cada cuanto se encola el sync del mes actual
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_CURRENT_MONTH_INTERVAL_MIN = float(os.getenv("JOBS_CURRENT_MONTH_INTERVAL_MIN", "15"))
+# Vencimiento de los leases de este worker si deja de renovarlos (se renuevan cada ttl/3)
+JOBS_LEASE_TTL_SEC = float(os.getenv("JOBS_LEASE_TTL_SEC", "30"))
+# Cada cuanto se consulta un lease ocupado o un job que corre en otro worker
+JOBS_POLL_SEC = float(os.getenv("JOBS_POLL_SEC", "0.5"))
+
+# Identifica a este proceso en los leases y en jobs.owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+log = logging.getLogger(__name__)
+
+_actual = threading.local()
+
+
+def reportar_progreso(**campos):
+    """
+    Actualiza el progreso del job que corre en este hilo (fase, filas, archivos...).
+    Fuera de un job no hace nada, asi las funciones de sync se pueden llamar directo.
+    """
+    job = getattr(_actual, "job", None)
+    if job is not None:
+        job.progreso(**campos)
+
+
+class _JobEnCurso:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._progreso = {}
+        self._inicio_fase = time.perf_counter()
+
+    def progreso(self, **campos):
+        # Cada cambio de fase registra cuanto duro la anterior
+        fase = campos.get("phase")
+        if fase and fase != self._progreso.get("phase"):
+            ahora = time.perf_counter()
+            anterior = self._progreso.get("phase")
+            if anterior:
+                self._progreso.setdefault("phase_sec", {})[anterior] = round(ahora - self._inicio_fase, 3)
+            self._inicio_fase = ahora
+        self._progreso.update(campos)
+        try:
+            update_job_progress(self.job_id, self._progreso)
+        except Exception as e:
+            log.warning("no se pudo guardar el progreso del job", extra={"job_id": self.job_id, "error": str(e)})
+
+
+class JobManager:
+    """
+    Cola de syncs en segundo plano con historial en SQLite.
+
+    Cada tipo de job declara los locks que toma; dos jobs que comparten un lock nunca
+    corren a la vez (single-flight por tipo de sync). Si ya hay un job del mismo tipo y
+    con los mismos parametros encolado o corriendo, se devuelve ese en vez de crear otro.
+
+    Con varios workers (procesos) los locks y la deduplicacion tambien valen entre ellos:
+    cada lock es ademas un lease en la base, los jobs llevan el WORKER_ID que los corre y
+    un hilo de latido renueva los leases del worker mientras vive.
+    """
+
+    def __init__(self, workers: int = JOBS_WORKERS):
+        self.workers = workers
+        self._tipos = {}
+        self._locks = {}
+        self._en_curso = {}
+        self._futuros = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._parar = threading.Event()
+        self._scheduler = None
+        self._latido = None
+
+    def registrar(self, kind, func, locks=None, params=()):
+        """`func(**params)` corre en un hilo del pool; puede ser una corrutina."""
+        self._tipos[kind] = (func, tuple(sorted(locks or (kind,))), tuple(params))
+        for nombre in self._tipos[kind][1]:
+            self._locks.setdefault(nombre, threading.Lock())
+
+    def tipos(self):
+        return {kind: list(params) for kind, (_, _, params) in self._tipos.items()}
+
+    def enqueue(self, kind, params=None, trigger="api"):
+        """Devuelve (job, deduplicado)."""
+        if kind not in self._tipos:
+            raise KeyError(kind)
+        permitidos = self._tipos[kind][2]
+        params = {k: v for k, v in (params or {}).items() if k in permitidos}
+        clave = (kind, json.dumps(params, sort_keys=True))
+
+        with self._lock:
+            job_id = self._en_curso.get(clave)
+            if job_id is not None:
+                return get_job(job_id), True
+
+            self._iniciar_latido()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="jobs")
+            job_id = uuid.uuid4().hex
+            # El mismo job encolado por otro worker: se devuelve ese. Si termino entre el
+            # INSERT y la busqueda, se vuelve a intentar.
+            while not create_job(job_id, kind, params, trigger, owner=WORKER_ID, dedupe=True):
+                otro = find_active_job(kind, params)
+                if otro is not None:
+                    return get_job(otro), True
+            self._en_curso[clave] = job_id
+            self._futuros[job_id] = self._executor.submit(self._correr, job_id, clave, params)
+        return get_job(job_id), False
+
+    def esperar(self, job_id, timeout=None):
+        futuro = self._futuros.get(job_id)
+        if futuro is not None:
+            futuro.result(timeout)
+            return get_job(job_id)
+        # Job de otro worker: se consulta la base hasta que termine
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = get_job(job_id)
+            if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                return job
+            if limite is not None and time.monotonic() >= limite:
+                raise TimeoutError(job_id)
+            time.sleep(JOBS_POLL_SEC)
+
+    async def esperar_async(self, job_id):
+        # Las consultas a jobs van por el executor de lectura: nada de SQLite en el event loop
+        futuro = self._futuros.get(job_id)
+        if futuro is not None:
+            await asyncio.wrap_future(futuro)
+            return await repo.leer(get_job, job_id)
+        while True:
+            job = await repo.leer(get_job, job_id)
+            if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                return job
+            await asyncio.sleep(JOBS_POLL_SEC)
+
+    def run(self, kind, params=None, trigger="api"):
+        """Encola y espera: para los endpoints que devuelven el resultado del sync."""
+        job, _ = self.enqueue(kind, params, trigger)
+        return self.esperar(job["id"])
+
+    def _correr(self, job_id, clave, params):
+        kind = clave[0]
+        func, locks, _ = self._tipos[kind]
+        adquiridos = []
+        leases = []
+        try:
+            # Orden fijo de adquisicion para que dos jobs con locks cruzados no se traben.
+            # Primero el lock del proceso y despues el lease: entre workers espera un solo hilo.
+            for nombre in locks:
+                self._locks[nombre].acquire()
+                adquiridos.append(self._locks[nombre])
+                while not acquire_lease(f"lock:{nombre}", WORKER_ID, JOBS_LEASE_TTL_SEC):
+                    time.sleep(JOBS_POLL_SEC)
+                leases.append(f"lock:{nombre}")
+
+            start_job(job_id)
+            _actual.job = _JobEnCurso(job_id)
+            inicio = time.perf_counter()
+            try:
+                resultado = func(**params)
+                if asyncio.iscoroutine(resultado):
+                    resultado = asyncio.run(resultado)
+            except Exception as e:
+                log.exception("job fallido", extra={"job_id": job_id, "kind": kind})
+                duracion = round(time.perf_counter() - inicio, 3)
+                finish_job(job_id, JOB_FAILED, error=str(e), duration_sec=duracion)
+                job_latency.observe(duracion, kind=kind, status=JOB_FAILED)
+                return
+
+            # Los syncs devuelven {"error": ...} en lugar de lanzar la excepcion
+            error = resultado.get("error") if isinstance(resultado, dict) else None
+            estado = JOB_FAILED if error else JOB_SUCCEEDED
+            duracion = round(time.perf_counter() - inicio, 3)
+            finish_job(job_id, estado, resultado, error, duracion)
+            job_latency.observe(duracion, kind=kind, status=estado)
+            log.info("job terminado", extra={"job_id": job_id, "kind": kind, "status": estado, "duration_sec": duracion})
+        finally:
+            _actual.job = None
+            for nombre in reversed(leases):
+                try:
+                    release_lease(nombre, WORKER_ID)
+                except Exception as e:
+                    # Si no se pudo liberar, vence solo en JOBS_LEASE_TTL_SEC
+                    log.warning("no se pudo liberar el lease", extra={"lease": nombre, "error": str(e)})
+            for lock in reversed(adquiridos):
+                lock.release()
+            with self._lock:
+                self._en_curso.pop(clave, None)
+                self._futuros.pop(job_id, None)
+
+    # ------------------- Latido -------------------
+
+    def _iniciar_latido(self):
+        # Lease "worker:<id>" mientras el proceso viva: sin el, sus jobs se consideran
+        # huerfanos y otro worker los marca como interrumpidos
+        if self._latido is not None and self._latido.is_alive():
+            return
+        acquire_lease(f"worker:{WORKER_ID}", WORKER_ID, JOBS_LEASE_TTL_SEC)
+        self._latido = threading.Thread(target=self._latir, name="jobs-heartbeat", daemon=True)
+        self._latido.start()
+
+    def _latir(self):
+        while not self._parar.wait(JOBS_LEASE_TTL_SEC / 3):
+            try:
+                # Si el proceso estuvo trabado mas que el ttl y otro tomo sus leases, solo
+                # recupera el de worker; los locks los vuelve a pedir el proximo job
+                if not acquire_lease(f"worker:{WORKER_ID}", WORKER_ID, JOBS_LEASE_TTL_SEC):
+                    log.warning("lease de worker perdido", extra={"worker": WORKER_ID})
+                renew_leases(WORKER_ID, JOBS_LEASE_TTL_SEC)
+                self._interrumpir_huerfanos()
+            except Exception as e:
+                log.warning("no se pudieron renovar los leases", extra={"worker": WORKER_ID, "error": str(e)})
+
+    def _interrumpir_huerfanos(self):
+        interrumpidos = interrupt_unfinished_jobs()
+        if interrumpidos:
+            log.warning("jobs interrumpidos por el reinicio", extra={"count": interrumpidos})
+
+    # ------------------- Scheduler -------------------
+
+    def iniciar(self, periodicos=()):
+        """
+        Marca como interrumpidos los jobs que quedaron abiertos en un worker que ya no
+        esta (reinicio o proceso caido) y arranca el latido y el scheduler.
+        periodicos: (kind, intervalo en segundos) a encolar.
+        """
+        self._parar.clear()
+        with self._lock:
+            self._iniciar_latido()
+        self._interrumpir_huerfanos()
+
+        periodicos = [(kind, intervalo) for kind, intervalo in periodicos if intervalo > 0]
+        if not periodicos or self._scheduler is not None:
+            return
+        self._scheduler = threading.Thread(target=self._programar, args=(periodicos,), name="jobs-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def _programar(self, periodicos):
+        proximos = {kind: time.monotonic() + intervalo for kind, intervalo in periodicos}
+        while not self._parar.is_set():
+            ahora = time.monotonic()
+            for kind, intervalo in periodicos:
+                if ahora >= proximos[kind]:
+                    proximos[kind] = ahora + intervalo
+                    try:
+                        # Con varios workers encola solo el que tiene el lease del periodico
+                        # (lo renueva el latido; si ese worker cae, lo toma otro)
+                        if acquire_lease(f"schedule:{kind}", WORKER_ID, JOBS_LEASE_TTL_SEC):
+                            self.enqueue(kind, trigger="scheduler")
+                    except Exception as e:
+                        log.warning("no se pudo encolar el job programado", extra={"kind": kind, "error": str(e)})
+            self._parar.wait(max(0.0, min(proximos.values()) - time.monotonic()))
+
+    def detener(self, wait=True):
+        self._parar.set()
+        for hilo in (self._scheduler, self._latido):
+            if hilo is not None:
+                hilo.join()
+        self._scheduler = self._latido = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        try:
+            # Locks, periodicos y worker quedan libres para los demas sin esperar el ttl
+            release_leases(WORKER_ID)
+        except Exception as e:
+            log.warning("no se pudieron liberar los leases", extra={"worker": WORKER_ID, "error": str(e)})
+
+
+jobs = JobManager()
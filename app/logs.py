@@ -0,0 +1,61 @@
+"""
+Logging estructurado: una linea JSON por evento con los campos pasados en `extra`.
+
+    log = logging.getLogger(__name__)
+    log.info("sync completo", extra={"sync": "Monthly expenses", "inserted": 3})
+
+LOG_FORMAT=text deja el formato legible de siempre (con los campos como key=value).
+"""
+import logging
+import os
+
+import orjson
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Atributos propios de LogRecord: todo lo demas vino por `extra`
+_ESTANDAR = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+def _campos(record):
+    return {k: v for k, v in record.__dict__.items() if k not in _ESTANDAR}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        evento = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_campos(record),
+        }
+        if record.exc_info:
+            evento["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(evento, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = _campos(record)
+        if campos:
+            texto += " | " + " ".join(f"{k}={v}" for k, v in campos.items())
+        return texto
+
+
+def configurar_logging(nivel: str = LOG_LEVEL, formato: str = LOG_FORMAT):
+    """Configura el logger "app" (y sus hijos); uvicorn mantiene su propia configuracion."""
+    logger = logging.getLogger("app")
+    if getattr(logger, "_configurado", False):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(TextFormatter() if formato == "text" else JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(nivel)
+    logger.propagate = False
+    logger._configurado = True
@@ -1,52 +1,95 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from app.models import RegistroEntrada
+from app.streaming import stream_expenses, stream_incomes, stream_resumen
+from app.repository import repo
+from app.cache import CARDS, EXPENSES, INCOMES, response_cache, versiones
+from app import metrics
+from app.logs import configurar_logging
+from app.jobs import jobs, reportar_progreso, JOBS_CURRENT_MONTH_INTERVAL_MIN, WORKER_ID
+from app.migrations import aplicar_migraciones
 from app.database import (
-    crear_tabla_registros,
-    crear_tablas_resumen_tarjeta,
     insertar_registro,
-    obtener_registros,
-    insertar_resumen_tarjeta,
-    existe_documento,
     get_sqlite_expense_uuids,
     get_sqlite_income_uuids,
-    delete_expenses,
-    insert_expenses,
-    delete_incomes,
-    insert_incomes,
-    create_income_table,
-    get_incomes,
-    obtener_tarjetas_disponibles,
-    get_balance,
+    apply_expenses_sync,
+    apply_incomes_sync,
     get_current_month_expense_uuids,
-    get_current_month_income_uuids
+    get_current_month_income_uuids,
+    insert_fx_rates,
+    load_fx_rates_file,
+    dolar_blue,
+    get_sync_state,
+    save_sync_state,
+    get_resume_file,
+    get_resume_file_by_hash,
+    SEARCH_SOURCES,
+    SEARCH_MAX_LIMIT,
+    PAGE_MAX_LIMIT,
+    EXPENSE_FIELDS,
+    INCOME_FIELDS,
+    CARD_EXPENSE_FIELDS,
+    check_monthly_totals,
+    get_job,
+    list_jobs,
+    list_leases,
+    rango_mes
 )
 from app.googlesheet import(
     auth_in_gdrive,
     get_current_month_expenses,
     get_historic_expenses,
     get_current_month_income,
-    get_historic_income
+    get_historic_income,
+    get_worksheet,
+    get_last_update_time,
+    get_records_from,
+    get_records_batch,
+    row_hash,
+    SHEET_HISTORIC_EXPENSES,
+    SHEET_HISTORIC_INCOME,
+    SHEET_CURRENT_MONTH_EXPENSES,
+    SHEET_CURRENT_MONTH_INCOME
 )
-from datetime import datetime
+from datetime import date, datetime
+import base64
 import hashlib
 import os
 import json
-import traceback
 import time
-from typing import Callable
-import httpx
+from datetime import timedelta
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Callable
+import orjson
+import asyncio
+import logging
 import re
 from pathlib import Path
 
+if TYPE_CHECKING:
+    import httpx
+
+configurar_logging()
+log = logging.getLogger(__name__)
+
 # DEBUG remoto si está activo
 if os.getenv("DEBUG_MODE") == "1":
     import debugpy
     debugpy.listen(("0.0.0.0", 5678))
-    print("🛠 Esperando conexión de debugger...")
+    log.info("esperando conexion de debugger", extra={"port": 5678})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada de esto corre al importar: las migraciones se aplican una vez por base (bajo un
+    # lock entre workers) y los demas arranques solo leen schema_version
+    aplicar_migraciones()
+    jobs.iniciar(periodicos=[("current_month", JOBS_CURRENT_MONTH_INTERVAL_MIN * 60)])
+    yield
+    jobs.detener(wait=False)
+    repo.cerrar()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -55,11 +98,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Crear las tablas al iniciar la app
-crear_tabla_registros()
-create_income_table()
-crear_tablas_resumen_tarjeta()
+app.add_middleware(metrics.MetricsMiddleware)
 
 # ------------------- Card Resume load -------------------
 
@@ -77,24 +116,176 @@ async def cargar_resumen_tarjeta(request: Request):
     ahora = datetime.now()
     resume_date = datetime(ahora.year, ahora.month, 1, 0, 0, 0)
 
-    if existe_documento(document_number):
+    # El INSERT decide si es nuevo (ON CONFLICT): chequear antes con existe_documento deja
+    # que dos workers carguen el mismo resumen a la vez. Si no se inserto puede ser un
+    # resumen sin titulares, que nunca se guarda.
+    insertado = await repo.insertar_resumen_tarjeta(document_number, resume_date, payload_dict, card_type)
+    if not insertado and await repo.existe_documento(document_number):
         raise HTTPException(status_code=409, detail="Resumen ya existe")
 
-    insertar_resumen_tarjeta(document_number, resume_date, payload_dict, card_type)
-
     return {"status": "Resumen de tarjeta cargado correctamente"}
 
-@app.get("/syncResumes")
-async def sync_resumes():
+# Pipeline de /syncResumes: cantidad de PDFs en paralelo, reintentos y timeout por archivo
+PARSE_PDF_CONCURRENCY = int(os.getenv("PARSE_PDF_CONCURRENCY", "4"))
+PARSE_PDF_RETRIES = int(os.getenv("PARSE_PDF_RETRIES", "3"))
+PARSE_PDF_BACKOFF_SEC = float(os.getenv("PARSE_PDF_BACKOFF_SEC", "1"))
+PARSE_PDF_TIMEOUT_SEC = float(os.getenv("PARSE_PDF_TIMEOUT_SEC", "120"))
+# Resumes parseados que se acumulan antes de insertarlos en una transaccion. Se insertan
+# mientras se sigue parseando: si el sync se corta, lo ya guardado no se vuelve a parsear.
+# 0 = todo el sync en un commit al final (solo para backfills grandes)
+RESUMES_INSERT_BATCH = int(os.getenv("RESUMES_INSERT_BATCH", "20"))
+
+async def parse_pdf(client: "httpx.AsyncClient", endpoint: str, nombre: str, contenido: bytes):
+    import httpx
+
+    for intento in range(PARSE_PDF_RETRIES + 1):
+        try:
+            files = {"file": (nombre, contenido, "application/pdf")}
+            with metrics.medir_externo("pdf_parser", "parse"):
+                response = await asyncio.wait_for(client.post(endpoint, files=files), PARSE_PDF_TIMEOUT_SEC)
+                response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            # Un 4xx no se reintenta: ese PDF no se va a poder parsear
+            if e.response.status_code < 500 or intento == PARSE_PDF_RETRIES:
+                raise
+        except (httpx.TransportError, asyncio.TimeoutError):
+            if intento == PARSE_PDF_RETRIES:
+                raise
+        await asyncio.sleep(PARSE_PDF_BACKOFF_SEC * 2 ** intento)
+
+def preparar_resumen(payload_dict, anio, mes, card_type):
+    # (document_number, resume_date, payload, card_type) como lo recibe insertar_resumenes_tarjeta
+    payload_bytes = json.dumps(payload_dict, ensure_ascii=False).encode("utf-8")
+    document_number = hashlib.sha256(payload_bytes).hexdigest()
+    return document_number, datetime(anio, mes, 1, 0, 0, 0), payload_dict, card_type
+
+def leer_pdf_si_cambio(pdf_file: Path, card_type: str, force: bool, rehash: bool):
+    """
+    Consulta el indice resume_files antes de cualquier llamada al parser; solo lee.
+    Devuelve None si el archivo ya fue importado y el indice esta al dia,
+    (None, content_hash, stat, document_number) si el contenido ya se importo pero hay que
+    actualizar el indice, o (contenido, content_hash, stat, None) si hay que parsearlo.
+    """
+    stat = pdf_file.stat()
+    indexado = None if force else get_resume_file(card_type, pdf_file)
+
+    # Mismo tamaño y mtime: ni siquiera se lee el archivo
+    if indexado and not rehash and indexado["size"] == stat.st_size and indexado["mtime"] == stat.st_mtime:
+        return None
+
+    contenido = pdf_file.read_bytes()
+    content_hash = hashlib.sha256(contenido).hexdigest()
+
+    if not force:
+        document_number = indexado["document_number"] if indexado and indexado["content_hash"] == content_hash \
+            else get_resume_file_by_hash(content_hash)
+        if document_number:
+            # Contenido ya importado (archivo tocado, copiado o renombrado): solo se actualiza el indice
+            return None, content_hash, stat, document_number
+
+    return contenido, content_hash, stat, None
+
+async def procesar_resumenes(force: bool = False, rehash: bool = False):
+    # httpx se importa recien aca: las lecturas no lo necesitan
+    import httpx
+
     PARSE_PDF_ENDPOINT = os.getenv("PARSE_PDF_ENDPOINT")
     RESUMENES_DIR = Path(os.getenv("RESUMES_LOCAL_LOCATION", str(Path.home() / "resumenes")))
 
     tarjetas = ["visa", "mastercard"]
-    resultados = []
     exitosos = []
     fallidos = []
-
-    async with httpx.AsyncClient() as client:
+    omitidos = []
+    pendientes = []
+    semaforo = asyncio.Semaphore(PARSE_PDF_CONCURRENCY)
+
+    def avance():
+        reportar_progreso(files_ok=len(exitosos), files_failed=len(fallidos), files_skipped=len(omitidos),
+                          files_pending_insert=len(pendientes))
+
+    async def guardar_pendientes():
+        # Se toma el lote antes del primer await para que otra tarea no lo guarde dos veces
+        lote = pendientes[:]
+        pendientes.clear()
+        if not lote:
+            return
+        # Un payload mal formado queda en `invalidos` y solo falla su archivo
+        invalidos = {}
+        try:
+            insertados = await repo.insertar_resumenes_tarjeta([resumen for resumen, _ in lote], invalidos)
+            await repo.save_resume_files([
+                (resumen[3], pdf_file, stat.st_size, stat.st_mtime, content_hash, resumen[0])
+                for resumen, (pdf_file, content_hash, stat) in lote
+                if resumen[0] not in invalidos
+            ])
+        except Exception as e:
+            for resumen, (pdf_file, _, _) in lote:
+                fallidos.append({"archivo": pdf_file.name, "motivo": f"Error al guardar: {str(e)}", "card_type": resumen[3]})
+            return
+
+        for resumen, (pdf_file, _, _) in lote:
+            document_number, card_type = resumen[0], resumen[3]
+            if document_number in invalidos:
+                fallidos.append({"archivo": pdf_file.name, "motivo": f"Resumen invalido: {invalidos[document_number]}",
+                                 "card_type": card_type})
+            elif document_number in insertados:
+                # Si dos PDFs del lote traen el mismo resumen, solo el primero cuenta como insertado
+                insertados.discard(document_number)
+                exitosos.append({"archivo": pdf_file.name, "card_type": card_type})
+            else:
+                fallidos.append({"archivo": pdf_file.name, "motivo": "Resumen ya existe", "card_type": card_type})
+
+    async def procesar(client, pdf_file, tarjeta, mes, anio):
+        try:
+            await procesar_archivo(client, pdf_file, tarjeta, mes, anio)
+        except Exception as e:
+            # Un archivo con un error inesperado no corta el gather ni deja a los demas a medias
+            log.exception("error procesando resumen", extra={"file": pdf_file.name, "card_type": tarjeta})
+            fallidos.append({"archivo": pdf_file.name, "motivo": f"Error inesperado: {e}", "card_type": tarjeta})
+        finally:
+            avance()
+
+    async def procesar_archivo(client, pdf_file, tarjeta, mes, anio):
+        async with semaforo:
+            try:
+                leido = await repo.leer(leer_pdf_si_cambio, pdf_file, tarjeta, force, rehash)
+            except OSError as e:
+                fallidos.append({"archivo": pdf_file.name, "motivo": f"Error al leer: {e}", "card_type": tarjeta})
+                return
+            if leido is None:
+                omitidos.append({"archivo": pdf_file.name, "card_type": tarjeta})
+                return
+            contenido, content_hash, stat, document_number = leido
+            if document_number:
+                # La escritura del indice va por el executor de escritura, no por el de lectura
+                await repo.save_resume_files([(tarjeta, pdf_file, stat.st_size, stat.st_mtime, content_hash, document_number)])
+                omitidos.append({"archivo": pdf_file.name, "card_type": tarjeta})
+                return
+
+            try:
+                parsed_data = await parse_pdf(client, PARSE_PDF_ENDPOINT, pdf_file.name, contenido)
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                motivo = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
+                fallidos.append({"archivo": pdf_file.name, "motivo": f"POST fallido: {motivo}", "card_type": tarjeta})
+                return
+            except ValueError as e:
+                # 200 con un cuerpo que no es JSON
+                fallidos.append({"archivo": pdf_file.name, "motivo": f"Respuesta invalida del parser: {e}", "card_type": tarjeta})
+                return
+
+        if not parsed_data:
+            fallidos.append({"archivo": pdf_file.name, "motivo": "PDF sin datos útiles", "card_type": tarjeta})
+            return
+
+        # Los resumes se insertan por lotes (executemany en una transaccion) a medida que se completan
+        pendientes.append((preparar_resumen(parsed_data, anio, mes, tarjeta), (pdf_file, content_hash, stat)))
+        if RESUMES_INSERT_BATCH and len(pendientes) >= RESUMES_INSERT_BATCH:
+            await guardar_pendientes()
+
+    limites = httpx.Limits(max_connections=PARSE_PDF_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=PARSE_PDF_TIMEOUT_SEC, limits=limites) as client:
+        tareas = []
         for tarjeta in tarjetas:
             carpeta = RESUMENES_DIR / tarjeta
             if not carpeta.exists():
@@ -107,64 +298,142 @@ async def sync_resumes():
                     continue
 
                 mes, anio = int(match.group(1)), int(match.group(2))
-                resultado = {
-                    "month": mes,
-                    "year": anio,
-                    "card_type": tarjeta,
-                    "archivo": pdf_file.name
-                }
-
-                try:
-                    with open(pdf_file, "rb") as f:
-                        files = {"file": (pdf_file.name, f, "application/pdf")}
-                        response = await client.post(PARSE_PDF_ENDPOINT, files=files)
-                        response.raise_for_status()
-                        parsed_data = response.json()
-                        resultado["resume_data"] = parsed_data
-                except httpx.HTTPError as e:
-                    fallidos.append({"archivo": pdf_file.name, "motivo": f"POST fallido: {str(e)}", "card_type": tarjeta})
-                    continue
-
-                resultados.append(resultado)
-
-    # Segunda etapa: insertar en BD los que tienen resume_data
-    for r in resultados:
-        if "resume_data" not in r:
-            fallidos.append({"archivo": r["archivo"], "motivo": "PDF sin datos útiles", "card_type": r["card_type"]})
-            continue
-
-        try:
-            payload_dict = r["resume_data"]
-            
-            payload_bytes = json.dumps(payload_dict, ensure_ascii=False).encode("utf-8")
-            document_number = hashlib.sha256(payload_bytes).hexdigest()
-            resume_date = datetime(r["year"], r["month"], 1, 0, 0, 0)
-
-            if existe_documento(document_number):
-                fallidos.append({"archivo": r["archivo"], "motivo": "Resumen ya existe", "card_type": r["card_type"]})
-                continue
+                tareas.append(procesar(client, pdf_file, tarjeta, mes, anio))
 
-            insertar_resumen_tarjeta(document_number, resume_date, payload_dict, r["card_type"])
-            exitosos.append({"archivo": r["archivo"], "card_type": r["card_type"]})
-        except Exception as e:
-            fallidos.append({"archivo": r["archivo"], "motivo": f"Error al guardar: {str(e)}", "card_type": r["card_type"]}) 
+        reportar_progreso(phase="parse", files_total=len(tareas))
+        await asyncio.gather(*tareas)
+        reportar_progreso(phase="insert")
+        await guardar_pendientes()
+        reportar_progreso(phase="done")
+        avance()
 
-    return JSONResponse({
+    return {
         "procesados_ok": exitosos,
-        "procesados_fallidos": fallidos
-    })
+        "procesados_fallidos": fallidos,
+        "omitidos_por_indice": len(omitidos)
+    }
+
+@app.get("/syncResumes")
+async def sync_resumes(force: bool = False, rehash: bool = False):
+    # Corre como job: un /syncResumes en curso se comparte en lugar de procesar los PDFs dos veces
+    # enqueue escribe en SQLite (jobs y leases, con busy timeout): fuera del event loop
+    job, _ = await repo.escribir(jobs.enqueue, "resumes", {"force": force, "rehash": rehash})
+    job = await jobs.esperar_async(job["id"])
+    return JSONResponse(resultado_job(job), status_code=500 if job["result"] is None else 200)
+
+# ++++ Cache de respuestas ++++
+
+def _etag_coincide(if_none_match, etag):
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (e.strip().removeprefix("W/") for e in if_none_match.split(","))
+
+async def respuesta_cacheada(request: Request, dominio, anio, mes, calcular):
+    """
+    Respuesta de un mes servida desde el cache mientras no cambie la version del mes (ver
+    app.cache). Con If-None-Match igual al ETag actual devuelve 304 sin cuerpo.
+    """
+    clave = (request.url.path, request.url.query)
+    # La version se lee antes de consultar la base: si una escritura confirma en el medio,
+    # la entrada queda con la version anterior y no se vuelve a servir. Lee cache_versions,
+    # asi que va por el executor de lectura como las demas consultas
+    version = await repo.leer(versiones.version, dominio, anio, mes)
+    entrada = response_cache.get(clave, version)
+    if entrada is None:
+        entrada = response_cache.put(clave, version, orjson.dumps(await calcular()))
+
+    headers = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+    if _etag_coincide(request.headers.get("if-none-match"), entrada.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(entrada.body, media_type="application/json", headers=headers)
+
+@app.get("/cacheStats")
+def cache_stats():
+    return response_cache.stats()
+
+# ++++ Metricas ++++
+
+def _metricas_cache():
+    stats = response_cache.stats()
+    return {(("event", evento),): stats[evento] for evento in ("hits", "misses", "stale", "evictions", "not_modified")}
+
+metrics.registrar_callback("response_cache_events_total", "counter", "Eventos del cache de respuestas", _metricas_cache)
+metrics.registrar_callback("response_cache_bytes", "gauge", "Bytes de respuestas cacheadas", lambda: response_cache.stats()["bytes"])
+metrics.registrar_callback("response_cache_entries", "gauge", "Respuestas cacheadas", lambda: response_cache.stats()["entries"])
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ++++ Paginacion ++++
+
+def codificar_cursor(valores) -> str:
+    # Cursor opaco para paginacion por keyset: la clave del ultimo elemento de la pagina
+    return base64.urlsafe_b64encode(orjson.dumps(valores)).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str):
+    try:
+        return orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor invalido")
+
+def parametros_pagina(tipo, limit, cursor, fields, permitidos, largo_clave, stream):
+    """
+    Valida limit/cursor/fields de los endpoints mensuales. Devuelve (paginado, clave, campos);
+    sin ninguno de los tres la respuesta es la de siempre.
+    """
+    paginado = limit is not None or cursor is not None or fields is not None
+    if paginado and stream:
+        raise HTTPException(status_code=400, detail="stream no admite limit, cursor ni fields")
+    despues = None
+    if cursor:
+        contenido = decodificar_cursor(cursor)
+        if not isinstance(contenido, list) or len(contenido) != largo_clave + 1 or contenido[0] != tipo:
+            raise HTTPException(status_code=400, detail="cursor invalido para este endpoint")
+        despues = contenido[1:]
+    campos = None
+    if fields is not None:
+        campos = [c.strip() for c in fields.split(",") if c.strip()]
+        invalidos = [c for c in campos if c not in permitidos]
+        if invalidos or not campos:
+            raise HTTPException(status_code=400, detail=f"fields debe ser una lista de {list(permitidos)}")
+    return paginado, despues, campos
+
+def siguiente_cursor(tipo, siguiente):
+    return codificar_cursor([tipo, *siguiente]) if siguiente else None
 
 @app.get("/getResumeExpenses/{anio}/{mes}")
 @app.get("/getResumeExpenses/{anio}/{mes}/{card_type}")
 @app.get("/getResumeExpenses/{anio}/{mes}/{card_type}/{holder}")
-def get_resume_expenses(anio: int, mes: int, card_type: str = None, holder: str = None):
-    from app.database import obtener_resumen
-    resumen = obtener_resumen(anio, mes, card_type, holder)
-    return resumen
+async def get_resume_expenses(
+    request: Request,
+    anio: int,
+    mes: int,
+    card_type: str = None,
+    holder: str = None,
+    stream: bool = False,
+    raw: bool = False,
+    limit: int = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: str = None,
+    fields: str = None
+):
+    # raw=true devuelve los importes como centavos enteros en lugar de texto es-AR.
+    # limit/cursor paginan las lineas (next_cursor en la respuesta); fields elige sus campos.
+    paginado, despues, campos = parametros_pagina("cards", limit, cursor, fields, CARD_EXPENSE_FIELDS, 3, stream)
+    if stream:
+        return StreamingResponse(repo.iterar(stream_resumen(anio, mes, card_type, holder, raw)), media_type="application/json")
+    if paginado:
+        async def calcular():
+            pagina, siguiente = await repo.pagina_resumen(anio, mes, card_type, holder, limit, despues, campos, raw)
+            return {**pagina, "next_cursor": siguiente_cursor("cards", siguiente)}
+        return await respuesta_cacheada(request, CARDS, anio, mes, calcular)
+    return await respuesta_cacheada(request, CARDS, anio, mes,
+                                    lambda: repo.obtener_resumen(anio, mes, card_type, holder, raw))
 
 @app.get("/getAvailableResumes/{anio}/{mes}")
-def get_available_resumes(anio: int, mes: int):
-    return obtener_tarjetas_disponibles(anio, mes)
+async def get_available_resumes(request: Request, anio: int, mes: int):
+    return await respuesta_cacheada(request, CARDS, anio, mes, lambda: repo.obtener_tarjetas_disponibles(anio, mes))
 
 # -------------------------------------------------------------------------
 # ------------------- Expenses & Income -----------------------------------
@@ -172,84 +441,431 @@ def get_available_resumes(anio: int, mes: int):
 
 # ++++ Fetch data ++++
 
+def rango_fechas(desde: date, hasta: date):
+    # `to` es inclusivo: se consulta el rango [from, to + 1 dia)
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'from' debe ser anterior o igual a 'to'")
+    return desde.isoformat(), (hasta + timedelta(days=1)).isoformat()
+
 @app.get("/expenses/{anio}/{mes}")
-def get_expenses(anio: int, mes: int):
-    registros = obtener_registros(anio, mes)
-    return {"expenses": registros}
+async def get_expenses(
+    request: Request,
+    anio: int,
+    mes: int,
+    stream: bool = False,
+    raw: bool = False,
+    limit: int = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: str = None,
+    fields: str = None
+):
+    paginado, despues, campos = parametros_pagina("expenses", limit, cursor, fields, EXPENSE_FIELDS, 2, stream)
+    if stream:
+        return StreamingResponse(repo.iterar(stream_expenses(*rango_mes(anio, mes), raw)), media_type="application/json")
+
+    async def calcular():
+        if paginado:
+            pagina, siguiente = await repo.pagina_registros(anio, mes, limit, despues, campos, raw)
+            return {"expenses": pagina, "next_cursor": siguiente_cursor("expenses", siguiente)}
+        return {"expenses": await repo.obtener_registros(anio, mes, raw)}
+    return await respuesta_cacheada(request, EXPENSES, anio, mes, calcular)
+
+@app.get("/expenses")
+async def get_expenses_range(desde: date = Query(alias="from"), hasta: date = Query(alias="to"), raw: bool = False):
+    return StreamingResponse(repo.iterar(stream_expenses(*rango_fechas(desde, hasta), raw)), media_type="application/json")
 
 @app.get("/incomes/{anio}/{mes}")
-def get_income(anio: int, mes: int):
-    income = get_incomes(anio, mes)
-    return {"income": income}
+async def get_income(
+    request: Request,
+    anio: int,
+    mes: int,
+    stream: bool = False,
+    raw: bool = False,
+    limit: int = Query(None, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: str = None,
+    fields: str = None
+):
+    paginado, despues, campos = parametros_pagina("incomes", limit, cursor, fields, INCOME_FIELDS, 2, stream)
+    if stream:
+        return StreamingResponse(repo.iterar(stream_incomes(*rango_mes(anio, mes), raw)), media_type="application/json")
+
+    async def calcular():
+        if paginado:
+            pagina, siguiente = await repo.pagina_incomes(anio, mes, limit, despues, campos, raw)
+            return {"income": pagina, "next_cursor": siguiente_cursor("incomes", siguiente)}
+        return {"income": await repo.get_incomes(anio, mes, raw)}
+    return await respuesta_cacheada(request, INCOMES, anio, mes, calcular)
+
+@app.get("/incomes")
+async def get_income_range(desde: date = Query(alias="from"), hasta: date = Query(alias="to"), raw: bool = False):
+    return StreamingResponse(repo.iterar(stream_incomes(*rango_fechas(desde, hasta), raw)), media_type="application/json")
 
 @app.get("/balance")
-def get_internal_balance():
-    balance = get_balance()
+async def get_internal_balance():
+    balance = await repo.get_balance()
     return {"balance": balance}
 
+# Fuentes publicas de /analytics/series ("cards" agrupado por titular usa los totales por titular)
+ANALYTICS_SOURCES = ("expenses", "incomes", "cards", "card_expenses")
+
+@app.get("/analytics/series")
+async def get_analytics_series(
+    desde: date = Query(alias="from"),
+    hasta: date = Query(alias="to"),
+    source: str = "expenses",
+    group_by: str = "",
+    raw: bool = False
+):
+    # Totales por mes en una sola consulta, en lugar de pedir /expenses o /incomes mes por mes.
+    # group_by: type (expenses), currency (incomes), card y/o holder (cards, card_expenses)
+    if source not in ANALYTICS_SOURCES:
+        raise HTTPException(status_code=400, detail=f"source debe ser uno de {list(ANALYTICS_SOURCES)}")
+    agrupar = tuple(g.strip() for g in group_by.split(",") if g.strip())
+    try:
+        return await repo.serie_mensual(source, *rango_fechas(desde, hasta), agrupar, raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ++++ Busqueda ++++
+
+@app.get("/search")
+async def search(
+    q: str,
+    source: str = "expenses",
+    desde: date = Query(None, alias="from"),
+    hasta: date = Query(None, alias="to"),
+    card_type: str = None,
+    holder: str = None,
+    order: str = "rank",
+    limit: int = Query(50, ge=1, le=SEARCH_MAX_LIMIT),
+    cursor: str = None,
+    prefix: bool = True,
+    raw: bool = False
+):
+    """
+    Busqueda de texto completo en las descripciones (FTS5). Cada palabra de `q` tiene que
+    aparecer; con prefix=true (por defecto) tambien como prefijo ("carref" -> "Carrefour").
+    source: expenses, incomes o cards (lineas de resumen, filtrables por card_type/holder).
+    order: rank (relevancia) o date (mas recientes primero). Para la pagina siguiente se
+    pasa el next_cursor de la respuesta.
+    """
+    if source not in SEARCH_SOURCES:
+        raise HTTPException(status_code=400, detail=f"source debe ser uno de {list(SEARCH_SOURCES)}")
+    despues = None
+    if cursor:
+        contenido = decodificar_cursor(cursor)
+        if not isinstance(contenido, list) or len(contenido) != 3 or contenido[0] != order:
+            raise HTTPException(status_code=400, detail="cursor invalido para este orden")
+        despues = contenido[1:]
+    try:
+        resultados, siguiente = await repo.buscar(
+            source, q,
+            desde=desde.isoformat() if desde else None,
+            hasta=(hasta + timedelta(days=1)).isoformat() if hasta else None,
+            card_type=card_type, holder=holder, order=order, limit=limit,
+            despues=despues, prefijo=prefix, raw=raw
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "results": resultados,
+        "next_cursor": siguiente_cursor(order, siguiente)
+    }
+
+@app.get("/checkMonthlyTotals")
+def check_totals(repair: bool = False):
+    return check_monthly_totals(repair)
+
 # ++++ Sync data ++++
 
+# Cada cuantas horas el sync incremental hace igualmente una reconciliacion completa
+SYNC_FULL_INTERVAL_HOURS = float(os.getenv("SYNC_FULL_INTERVAL_HOURS", "24"))
+
+def save_sheet_state(sync_key, sheet, row_count, sheet_modified, full):
+    ultima = sheet[-1] if sheet else None
+    save_sync_state(
+        sync_key,
+        row_count=row_count,
+        last_row_hash=row_hash(ultima) if ultima else None,
+        last_timestamp=ultima.get("Marca temporal") if ultima else None,
+        header=json.dumps(list(ultima.keys()), ensure_ascii=False) if ultima else None,
+        sheet_modified=sheet_modified,
+        full=full
+    )
+
+def registrar_fases(label, timings):
+    # Cada *_sec de los timings de un sync como observacion del histograma por fase
+    for clave, segundos in timings.items():
+        metrics.sync_phase_latency.observe(segundos, sync=label, phase=clave.removesuffix("_sec"))
+
 def sync_data(
     get_sheet_data_func: Callable,
-    insert_func: Callable,
-    delete_func: Callable,
+    apply_func: Callable,
     get_sqlite_uuids_func: Callable,
-    label: str
+    label: str,
+    sync_key: str = None
 ):
     start_time = time.time()
-    print(f"\n synching: {label}...")
+    log.info("sync iniciado", extra={"sync": label, "mode": "full"})
 
     try:
+        reportar_progreso(phase="fetch", mode="full")
         client = auth_in_gdrive()
-        print("Google drive authentication complete")
+
+        # El token se lee antes que los datos para no perder cambios hechos durante el sync
+        sheet_modified = get_last_update_time(client) if sync_key else None
 
         sheet = get_sheet_data_func(client)
-        print(f"Google Sheet rows obtained: {len(sheet)}")
+        fetch_sec = round(time.time() - start_time, 3)
 
-        sheet_uuids = set(row["UUID"] for row in sheet if row.get("UUID"))
+        reportar_progreso(phase="diff", sheet_rows=len(sheet))
+        diff_start = time.time()
+        sheet_rows = [row for row in sheet if row.get("UUID")]
+        sheet_uuids = set(row["UUID"] for row in sheet_rows)
         sqlite_uuids = get_sqlite_uuids_func()
-        print(f"UUIDs on google sheet: {len(sheet_uuids)} | UUIDs on SQLite: {len(sqlite_uuids)}")
 
-        uuids_to_insert = sheet_uuids - sqlite_uuids
         uuids_to_delete = sqlite_uuids - sheet_uuids
-        rows_to_insert = [row for row in sheet if row.get("UUID") in uuids_to_insert]
+        diff_sec = round(time.time() - diff_start, 3)
+        reportar_progreso(phase="apply", rows_to_apply=len(sheet_rows), rows_to_delete=len(uuids_to_delete))
+
+        # Todas las filas de la hoja pasan por el UPSERT: las nuevas se insertan, las editadas
+        # se actualizan y las que no cambiaron se saltean por content_hash
+        result = apply_func(sheet_rows, uuids_to_delete)
+        reportar_progreso(phase="done", inserted=result["inserted"], updated=result["updated"],
+                          unchanged=result["unchanged"], deleted=result["deleted"])
+
+        if sync_key:
+            save_sheet_state(sync_key, sheet, len(sheet), sheet_modified, full=True)
+
+        duration = round(time.time() - start_time, 2)
+        timings = {"fetch_sec": fetch_sec, "diff_sec": diff_sec, "apply_sec": result["apply_sec"],
+                   "insert_sec": result["insert_sec"], "delete_sec": result["delete_sec"]}
+        registrar_fases(label, timings)
+        log.info("sync completo", extra={
+            "sync": label, "mode": "full", "sheet_rows": len(sheet), "sheet_uuids": len(sheet_uuids),
+            "sqlite_uuids": len(sqlite_uuids), "inserted": result["inserted"], "updated": result["updated"],
+            "unchanged": result["unchanged"], "deleted": result["deleted"], "duration_sec": duration, **timings
+        })
+
+        return {
+            "state": f"{label} updated",
+            "mode": "full",
+            "added": result["inserted"],
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "unchanged": result["unchanged"],
+            "deleted": result["deleted"],
+            "timings": timings,
+            "duration_sec": duration
+        }
+
+    except Exception as e:
+        log.exception("error en el sync", extra={"sync": label, "mode": "full"})
+        return {
+            "state": f"Error syncing {label}",
+            "error": str(e)
+        }
+
+def full_sync_due(state):
+    if not state or not state["row_count"] or not state["last_full_sync"]:
+        return True
+    ultima = datetime.fromisoformat(state["last_full_sync"])
+    return datetime.now() - ultima >= timedelta(hours=SYNC_FULL_INTERVAL_HOURS)
+
+def sync_incremental(
+    worksheet_index: int,
+    get_sheet_data_func: Callable,
+    apply_func: Callable,
+    get_sqlite_uuids_func: Callable,
+    label: str,
+    full: bool = False
+):
+    """
+    Sync de hojas donde las filas se agregan al final (respuestas de formulario).
+    Guarda en sync_state la cantidad de filas y el hash de la ultima; en cada corrida
+    solo lee las filas nuevas. Si la ultima fila conocida cambio, o toca la
+    reconciliacion periodica, hace el sync completo.
+    """
+    sync_key = label
+    state = get_sync_state(sync_key)
+    if full or full_sync_due(state):
+        return sync_data(get_sheet_data_func, apply_func, get_sqlite_uuids_func, label, sync_key)
 
-        print(f"Inserting {len(rows_to_insert)} new records")
-        insert_func(rows_to_insert)
+    start_time = time.time()
+    log.info("sync iniciado", extra={"sync": label, "mode": "incremental"})
+
+    try:
+        reportar_progreso(phase="fetch", mode="incremental")
+        client = auth_in_gdrive()
 
-        print(f"Deleting {len(uuids_to_delete)} old records")
-        delete_func(uuids_to_delete)
+        sheet_modified = get_last_update_time(client)
+        if sheet_modified and sheet_modified == state["sheet_modified"]:
+            log.info("hoja sin cambios desde el ultimo sync", extra={"sync": label})
+            return {
+                "state": f"{label} unchanged",
+                "mode": "incremental",
+                "added": 0,
+                "inserted": 0,
+                "updated": 0,
+                "unchanged": 0,
+                "deleted": 0,
+                "duration_sec": round(time.time() - start_time, 2)
+            }
+
+        # La ultima fila conocida esta en la fila row_count + 1 de la hoja (1 = encabezado)
+        header = json.loads(state["header"])
+        worksheet = get_worksheet(client, worksheet_index)
+        tail = get_records_from(worksheet, header, state["row_count"] + 1)
+        fetch_sec = round(time.time() - start_time, 3)
+
+        if not tail or row_hash(tail[0]) != state["last_row_hash"]:
+            log.info("cambio la ultima fila sincronizada, se hace sync completo", extra={"sync": label})
+            return sync_data(get_sheet_data_func, apply_func, get_sqlite_uuids_func, label, sync_key)
+
+        new_rows = [row for row in tail[1:] if row.get("UUID")]
+        reportar_progreso(phase="apply", sheet_rows=len(tail), rows_to_apply=len(new_rows))
+        result = apply_func(new_rows, set())
+        reportar_progreso(phase="done", inserted=result["inserted"], updated=result["updated"],
+                          unchanged=result["unchanged"], deleted=0)
+
+        save_sheet_state(sync_key, tail, state["row_count"] + len(tail) - 1, sheet_modified, full=False)
 
         duration = round(time.time() - start_time, 2)
-        print(f"Synching complete in {duration} seconds")
+        timings = {"fetch_sec": fetch_sec, "apply_sec": result["apply_sec"], "insert_sec": result["insert_sec"]}
+        registrar_fases(label, timings)
+        log.info("sync completo", extra={
+            "sync": label, "mode": "incremental", "sheet_rows": len(tail), "inserted": result["inserted"],
+            "updated": result["updated"], "unchanged": result["unchanged"], "duration_sec": duration, **timings
+        })
 
         return {
             "state": f"{label} updated",
-            "added": len(uuids_to_insert),
-            "deleted": len(uuids_to_delete),
+            "mode": "incremental",
+            "added": result["inserted"],
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "unchanged": result["unchanged"],
+            "deleted": 0,
+            "timings": timings,
             "duration_sec": duration
         }
 
     except Exception as e:
-        print("Error while synching")
-        traceback.print_exc()
+        log.exception("error en el sync", extra={"sync": label, "mode": "incremental"})
         return {
             "state": f"Error syncing {label}",
             "error": str(e)
         }
-    
+
+def correr_sync_historic_expenses(full: bool = False):
+    return sync_incremental(SHEET_HISTORIC_EXPENSES, get_historic_expenses, apply_expenses_sync,
+                            get_sqlite_expense_uuids, "Historic expenses", full)
+
+def correr_sync_current_month_expenses():
+    return sync_data(get_current_month_expenses, apply_expenses_sync, get_current_month_expense_uuids, "Monthly expenses")
+
+def correr_sync_historic_income(full: bool = False):
+    return sync_incremental(SHEET_HISTORIC_INCOME, get_historic_income, apply_incomes_sync,
+                            get_sqlite_income_uuids, "Historic incomes", full)
+
+def correr_sync_current_month_income():
+    return sync_data(get_current_month_income, apply_incomes_sync, get_current_month_income_uuids, "Monthly incomes")
+
+def correr_sync_current_month():
+    # Gastos e ingresos del mes con una sola lectura batch del spreadsheet
+    try:
+        expenses, incomes = get_records_batch(
+            auth_in_gdrive(), [SHEET_CURRENT_MONTH_EXPENSES, SHEET_CURRENT_MONTH_INCOME]
+        )
+    except Exception as e:
+        log.exception("error leyendo el mes actual", extra={"sync": "current_month"})
+        return {"state": "Error syncing current month", "error": str(e)}
+
+    resultado = {
+        "expenses": sync_data(lambda client: expenses, apply_expenses_sync, get_current_month_expense_uuids, "Monthly expenses"),
+        "incomes": sync_data(lambda client: incomes, apply_incomes_sync, get_current_month_income_uuids, "Monthly incomes")
+    }
+    errores = [r["error"] for r in resultado.values() if "error" in r]
+    if errores:
+        resultado["error"] = "; ".join(errores)
+    return resultado
+
+def correr_sync_fx_rates():
+    # Historico de cotizaciones: desde FX_RATES_FILE (CSV date,value) o desde el proveedor
+    fx_file = os.getenv("FX_RATES_FILE")
+    try:
+        if fx_file:
+            loaded = load_fx_rates_file(fx_file)
+        else:
+            loaded = insert_fx_rates(dolar_blue.provider.fetch_history())
+    except Exception as e:
+        log.exception("error cargando cotizaciones", extra={"sync": "fx_rates"})
+        return {"state": "Error syncing fx rates", "error": str(e)}
+    return {"state": "fx rates updated", "loaded": loaded}
+
+# ------------------- Jobs -------------------
+
+# Los syncs corren como jobs en segundo plano. Cada tipo toma sus locks: el sync del mes
+# completo comparte los de gastos e ingresos del mes para no pisarse con ellos.
+jobs.registrar("historic_expenses", correr_sync_historic_expenses, params=("full",))
+jobs.registrar("current_month_expenses", correr_sync_current_month_expenses)
+jobs.registrar("historic_income", correr_sync_historic_income, params=("full",))
+jobs.registrar("current_month_income", correr_sync_current_month_income)
+jobs.registrar("current_month", correr_sync_current_month,
+               locks=("current_month_expenses", "current_month_income"))
+jobs.registrar("resumes", procesar_resumenes, params=("force", "rehash"))
+jobs.registrar("fx_rates", correr_sync_fx_rates)
+
+def resultado_job(job):
+    # Los endpoints GET de sync esperan el job y devuelven el mismo cuerpo que antes
+    if job["result"] is not None:
+        return job["result"]
+    return {"state": f"Error running {job['kind']}", "error": job["error"], "job_id": job["id"]}
+
 @app.get("/syncHistoricExpenses")
-def sync_historic_expenses():
-    return sync_data(get_historic_expenses, insert_expenses, delete_expenses, get_sqlite_expense_uuids, "Historic expenses")
+def sync_historic_expenses(full: bool = False):
+    return resultado_job(jobs.run("historic_expenses", {"full": full}))
 
 @app.get("/syncCurrentMonthExpenses")
 def sync_current_month_expenses():
-    return sync_data(get_current_month_expenses, insert_expenses, delete_expenses, get_current_month_expense_uuids, "Monthly expenses")
+    return resultado_job(jobs.run("current_month_expenses"))
 
 @app.get("/syncHistoricIncome")
-def sync_historic_income():
-    return sync_data(get_historic_income, insert_incomes, delete_incomes, get_sqlite_income_uuids, "Historic incomes")
+def sync_historic_income(full: bool = False):
+    return resultado_job(jobs.run("historic_income", {"full": full}))
 
 @app.get("/syncCurrentMonthIncome")
 def sync_current_month_income():
-    return sync_data(get_current_month_income, insert_incomes, delete_incomes, get_current_month_income_uuids, "Monthly incomes")
\ No newline at end of file
+    return resultado_job(jobs.run("current_month_income"))
+
+@app.get("/syncCurrentMonth")
+def sync_current_month():
+    return resultado_job(jobs.run("current_month"))
+
+@app.get("/syncFxRates")
+def sync_fx_rates():
+    return resultado_job(jobs.run("fx_rates"))
+
+@app.post("/jobs/{kind}", status_code=202)
+def enqueue_job(kind: str, full: bool = False, force: bool = False, rehash: bool = False):
+    # Cada tipo toma solo los parametros que usa (full para los historicos, force/rehash para resumes)
+    try:
+        job, deduplicado = jobs.enqueue(kind, {"full": full, "force": force, "rehash": rehash})
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Tipo de job desconocido. Disponibles: {sorted(jobs.tipos())}")
+    return {"job_id": job["id"], "status": job["status"], "deduplicated": deduplicado}
+
+@app.get("/jobs")
+async def get_jobs(kind: str = None, limit: int = Query(20, ge=1, le=500)):
+    return {"jobs": await repo.leer(list_jobs, kind, limit)}
+
+@app.get("/jobs/leases")
+async def get_job_leases():
+    # Locks de sync, periodicos y workers vivos (con varios workers de uvicorn)
+    return {"worker": WORKER_ID, "leases": await repo.leer(list_leases)}
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await repo.leer(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
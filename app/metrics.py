@@ -0,0 +1,181 @@
+"""
+Metricas en formato de texto de Prometheus, sin dependencias externas.
+
+Contadores e histogramas con labels guardados en memoria del proceso; /metrics los
+expone con `render()`. Los valores que ya lleva otro objeto (por ejemplo el cache de
+respuestas) se exponen con `registrar_callback` en lugar de duplicarlos.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites de los buckets en segundos: desde consultas de SQLite de 1 ms hasta syncs de minutos
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_metricas = []
+_callbacks = []
+
+
+def _labels(nombres, valores, extra=""):
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Counter:
+    def __init__(self, nombre, ayuda, labels=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _metricas.append(self)
+
+    def inc(self, valor=1, **labels):
+        clave = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **labels):
+        return self._valores.get(tuple(labels.get(n, "") for n in self.labels), 0)
+
+    def render(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        for clave, valor in sorted(self._valores.items()):
+            yield f"{self.nombre}{_labels(self.labels, clave)} {_numero(valor)}"
+
+
+class Histogram:
+    def __init__(self, nombre, ayuda, labels=(), buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # {labels: [conteo por bucket (+Inf al final), suma, cantidad]}
+        self._series = {}
+        self._lock = threading.Lock()
+        _metricas.append(self)
+
+    def observe(self, valor, **labels):
+        clave = tuple(labels.get(n, "") for n in self.labels)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def render(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self._lock:
+            series = [(clave, list(conteos), suma, cantidad) for clave, (conteos, suma, cantidad) in self._series.items()]
+        for clave, conteos, suma, cantidad in sorted(series):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = 'le="+Inf"' if limite == float("inf") else f'le="{limite!r}"'
+                yield f"{self.nombre}_bucket{_labels(self.labels, clave, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_labels(self.labels, clave)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_labels(self.labels, clave)} {cantidad}"
+
+
+def registrar_callback(nombre, tipo, ayuda, func):
+    """func() -> valor, o {tupla de (label, valor): valor} para series con labels."""
+    _callbacks.append((nombre, tipo, ayuda, func))
+
+
+def render() -> str:
+    lineas = []
+    for metrica in _metricas:
+        lineas.extend(metrica.render())
+    for nombre, tipo, ayuda, func in _callbacks:
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        valores = func()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        for labels, valor in valores.items():
+            if valor is None:
+                continue
+            nombres = [n for n, _ in labels]
+            lineas.append(f"{nombre}{_labels(nombres, [v for _, v in labels])} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
+
+
+# ------------------- Metricas de la aplicacion -------------------
+
+http_requests = Counter("http_requests_total", "Requests HTTP por ruta y status", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Latencia de requests HTTP por ruta (hasta el ultimo byte)", ("method", "route"))
+
+db_latency = Histogram("sqlite_operation_duration_seconds", "Tiempo dentro de cada bloque de conexion de app.database, por funcion", ("function", "mode"))
+db_queries = Counter("sqlite_queries_total", "Sentencias ejecutadas (execute/executemany) por funcion de app.database", ("function", "mode"))
+
+external_latency = Histogram("external_call_duration_seconds", "Latencia de llamadas a servicios externos", ("service", "operation", "outcome"))
+
+sync_phase_latency = Histogram("sync_phase_duration_seconds", "Duracion de cada fase de los syncs", ("sync", "phase"))
+job_latency = Histogram("job_duration_seconds", "Duracion de los jobs en segundo plano por tipo y resultado", ("kind", "status"))
+
+
+@contextmanager
+def medir_externo(servicio, operacion):
+    """Mide una llamada externa (gspread, bluelytics, parser de PDFs) marcando si fallo."""
+    inicio = time.perf_counter()
+    resultado = "error"
+    try:
+        yield
+        resultado = "ok"
+    finally:
+        external_latency.observe(time.perf_counter() - inicio, service=servicio, operation=operacion, outcome=resultado)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: cuenta requests y mide su latencia por plantilla de ruta
+    ("/expenses/{anio}/{mes}", no la URL concreta) hasta que sale el ultimo byte,
+    asi las respuestas en streaming cuentan completas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        status = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                status[0] = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            ruta = scope.get("route")
+            ruta = getattr(ruta, "path", None) or "sin_ruta"
+            http_latency.observe(time.perf_counter() - inicio, method=scope["method"], route=ruta)
+            http_requests.inc(method=scope["method"], route=ruta, status=status[0])
@@ -0,0 +1,50 @@
+"""
+Migra los importes REAL de ambas bases a centavos enteros, por lotes.
+
+Se puede correr con la app en linea (incluso con la version anterior): cada lote es una
+transaccion corta. Solo toca filas sin centavos: correrlo de nuevo despues de retirar la
+version anterior completa las que esa version haya escrito mientras tanto (o usar
+MIGRATE_CENTS_ON_START=1, ver app.migrations); los agregados mensuales se actualizan
+solos por los triggers.
+
+Uso: python -m app.migrate_cents [--batch-size 5000] [--pause-ms 0]
+"""
+import argparse
+import logging
+import time
+
+from app import database
+from app.logs import configurar_logging
+
+log = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=database.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=float, default=0, help="Pausa entre lotes para ceder el escritor")
+    args = parser.parse_args()
+    configurar_logging()
+
+    # Solo agrega las columnas *_cents que falten
+    database.crear_tabla_registros()
+    database.create_income_table()
+    database.crear_tablas_resumen_tarjeta()
+
+    ultimo_reporte = {}
+
+    def progreso(tabla, hechas, total):
+        ahora = time.monotonic()
+        if hechas == total or ahora - ultimo_reporte.get(tabla, 0) >= 1:
+            ultimo_reporte[tabla] = ahora
+            log.info("migrando", extra={"table": tabla, "rows_done": hechas, "rows_total": total})
+
+    t0 = time.perf_counter()
+    migradas = database.migrate_money_to_cents(args.batch_size, args.pause_ms / 1000, progreso)
+    for tabla, filas in migradas.items():
+        log.info("tabla migrada", extra={"table": tabla, "rows_migrated": filas})
+    log.info("migracion completa", extra={"duration_sec": round(time.perf_counter() - t0, 1)})
+
+
+if __name__ == "__main__":
+    main()
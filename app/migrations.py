@@ -0,0 +1,143 @@
+"""
+Migraciones de esquema versionadas.
+
+Cada migracion tiene un numero y se aplica una sola vez: las aplicadas quedan en la tabla
+schema_version de las dos bases (registros y tarjetas; una base nueva o reemplazada vuelve
+a recibirlas todas). Al arrancar, aplicar_migraciones() compara las versiones con una
+lectura y solo si falta alguna toma un lock de archivo en el directorio de datos (lo
+comparten todos los procesos), vuelve a mirar y aplica las pendientes en orden.
+
+Las primeras son las funciones create_* que antes corrian en cada import de app.main; son
+idempotentes, asi que sobre una base existente solo quedan registradas. Para agregar una
+migracion: sumarla al final de MIGRACIONES con el numero siguiente.
+
+Las filas que la version anterior siga escribiendo despues de la migracion 2 llegan sin
+centavos. Se completan con `python -m app.migrate_cents` una vez retirada esa version, o
+en cada arranque mientras convivan con MIGRATE_CENTS_ON_START=1 (recorre las tablas de
+importes, por eso no es el default).
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from app import database
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo el lock entre hilos
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Completar al arrancar los centavos que falten (solo mientras corre la version anterior)
+MIGRATE_CENTS_ON_START = os.getenv("MIGRATE_CENTS_ON_START", "0") == "1"
+
+
+def _tablas_base():
+    # Primero: las migraciones que siguen incrementan versiones del cache
+    database.create_cache_versions_table()
+    database.crear_tabla_registros()
+    database.create_income_table()
+    database.crear_tablas_resumen_tarjeta()
+    database.create_rate_cache_table()
+    database.create_fx_rates_table()
+    database.create_sync_state_table()
+    database.create_jobs_table()
+
+
+# (version, nombre, funcion)
+MIGRACIONES = [
+    (1, "tablas base", _tablas_base),
+    # Completa los importes en centavos que falten antes de (re)armar los agregados mensuales
+    (2, "importes en centavos", database.migrate_money_to_cents),
+    (3, "totales mensuales", database.create_monthly_totals_tables),
+    (4, "busqueda fts5", database.create_search_tables),
+    # Leases, versiones de cache compartidas y duenio de los jobs (uvicorn --workers N)
+    (5, "multi-worker", database.create_worker_tables),
+    # rowid fijo en las lineas de resumen para el indice FTS (VACUUM puede renumerar rowids)
+    (6, "id en card_holder_expenses", database.add_card_expense_ids),
+]
+
+_lock = threading.Lock()
+
+
+def _bases():
+    # Se resuelven en cada llamada: los benchmarks reasignan REGISTROS_DB / TARJETAS_DB
+    return database.REGISTROS_DB, database.TARJETAS_DB
+
+
+def versiones_aplicadas(db_path) -> set[int]:
+    with database.conectar(db_path) as conn:
+        try:
+            return {fila[0] for fila in conn.execute("SELECT version FROM schema_version")}
+        except sqlite3.OperationalError:
+            # Base anterior al runner (o nueva): no tiene la tabla
+            return set()
+
+
+def pendientes():
+    aplicadas = set.intersection(*(versiones_aplicadas(db) for db in _bases()))
+    return [m for m in MIGRACIONES if m[0] not in aplicadas]
+
+
+def _registrar(version, nombre, duracion):
+    for db_path in _bases():
+        with database.conectar(db_path, escritura=True) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT NOT NULL,
+                    duration_sec REAL
+                )
+            """)
+            conn.execute(
+                "INSERT OR IGNORE INTO schema_version (version, name, applied_at, duration_sec) VALUES (?, ?, ?, ?)",
+                (version, nombre, datetime.now().isoformat(timespec="seconds"), round(duracion, 3))
+            )
+            conn.commit()
+
+
+@contextmanager
+def _lock_migraciones():
+    # Lock de archivo junto a las bases: un solo proceso migra, los demas esperan y despues
+    # encuentran todo aplicado
+    with _lock, open(database.REGISTROS_DB.parent / ".migrations.lock", "a") as archivo:
+        if fcntl is not None:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def aplicar_migraciones() -> list[int]:
+    """Aplica las migraciones pendientes y devuelve sus versiones (vacio si no habia)."""
+    if not pendientes():
+        if MIGRATE_CENTS_ON_START:
+            _completar_centavos()
+        return []
+    aplicadas = []
+    with _lock_migraciones():
+        for version, nombre, funcion in pendientes():
+            inicio = time.perf_counter()
+            funcion()
+            duracion = time.perf_counter() - inicio
+            _registrar(version, nombre, duracion)
+            log.info("migracion aplicada", extra={"version": version, "migration": nombre, "duration_sec": round(duracion, 3)})
+            aplicadas.append(version)
+    return aplicadas
+
+
+def _completar_centavos():
+    # Filas escritas por la version anterior despues de la migracion 2 (sin *_cents)
+    if not database.money_to_cents_pending():
+        return
+    with _lock_migraciones():
+        migradas = database.migrate_money_to_cents()
+    log.info("centavos completados", extra={"rows_migrated": sum(migradas.values())})
@@ -0,0 +1,74 @@
+"""
+Importes en formato es-AR ("1.234.567,89") sobre centavos enteros.
+
+Los importes se manejan como enteros de centavos para no arrastrar errores de
+punto flotante al sumar; solo se convierten a texto al armar la respuesta.
+"""
+
+# ",00" ... ",99": la parte decimal sale de una tabla en vez de formatearse por valor
+_CENTAVOS = tuple(f",{c:02d}" for c in range(100))
+
+# Separador de miles que se descarta al parsear, segun el separador decimal
+_MILES = {",": ".", ".": ","}
+
+
+def to_cents(importe) -> int:
+    """Importe en unidades (float/int) -> centavos enteros, redondeando al centavo."""
+    return round(importe * 100)
+
+
+def format_cents(centavos: int) -> str:
+    """12345678 -> '123.456,78' con aritmetica entera, sin floats intermedios."""
+    signo = "-" if centavos < 0 else ""
+    enteros, resto = divmod(abs(centavos), 100)
+    return f"{signo}{enteros:,}".replace(",", ".") + _CENTAVOS[resto]
+
+
+def format_amount(importe) -> str:
+    """Igual que format_cents pero a partir de un importe en unidades."""
+    return format_cents(to_cents(importe))
+
+
+def format_column(centavos) -> list[str]:
+    """Formatea una columna completa de centavos (por ejemplo el resultado de un cursor)."""
+    fmt = format_cents
+    return [fmt(c) for c in centavos]
+
+
+def parse_cents(valor, decimal: str = ",") -> int:
+    """
+    Texto de importe -> centavos enteros.
+
+    `decimal` es el separador decimal del texto: "," para es-AR ("$ 1.234,56")
+    y "." para el formato de la planilla ("$1,234.56"). El otro separador, el
+    signo "$" y los espacios se ignoran. Los numeros que ya vienen convertidos
+    (por ejemplo de numericise en gspread) se aceptan tal cual.
+    """
+    if not isinstance(valor, str):
+        return round(valor * 100)
+    texto = valor.replace(_MILES[decimal], "")
+    if "$" in texto:
+        texto = texto.replace("$", "").replace(" ", "")
+    entero, _, fraccion = texto.strip().partition(decimal)
+    if len(fraccion) == 2:
+        # Caso habitual: "-1234" + "56" ya es el importe en centavos con su signo
+        return int(entero + fraccion)
+    if not (entero or fraccion):
+        raise ValueError(f"Importe invalido: {valor!r}")
+    centavos = int(entero + fraccion[:2].ljust(2, "0"))
+    if len(fraccion) > 2 and fraccion[2] >= "5":
+        centavos += -1 if entero.lstrip().startswith("-") else 1
+    return centavos
+
+
+def parse_column(valores, decimal: str = ",") -> list[int]:
+    """parse_cents para una columna completa."""
+    return [parse_cents(v, decimal) for v in valores]
+
+
+def cents_formatter(raw: bool = False):
+    """
+    Funcion de salida para importes en centavos: texto es-AR por defecto o,
+    con `raw`, los centavos enteros tal cual para clientes que formatean por su cuenta.
+    """
+    return int if raw else format_cents
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from app.metrics import medir_externo
+
+BLUELYTICS_URL = "https://api.bluelytics.com.ar/v2/latest"
+BLUELYTICS_HISTORY_URL = "https://api.bluelytics.com.ar/v2/evolution.json"
+
+# Configuracion de la cotizacion, por variables de entorno
+RATE_PROVIDER = os.getenv("DOLAR_RATE_PROVIDER", "bluelytics")
+RATE_STATIC_VALUE = os.getenv("DOLAR_RATE_STATIC_VALUE")
+RATE_TTL_SEC = float(os.getenv("DOLAR_RATE_TTL_SEC", "900"))
+RATE_TIMEOUT_SEC = float(os.getenv("DOLAR_RATE_TIMEOUT_SEC", "3"))
+BREAKER_FAILURES = int(os.getenv("DOLAR_RATE_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SEC = float(os.getenv("DOLAR_RATE_BREAKER_RESET_SEC", "60"))
+
+log = logging.getLogger(__name__)
+
+
+class RateUnavailableError(Exception):
+    pass
+
+
+class BluelyticsProvider:
+    def __init__(self, url: str = BLUELYTICS_URL, timeout: float = RATE_TIMEOUT_SEC):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self) -> float:
+        # requests se importa al primer pedido: no hace falta para arrancar ni para las lecturas
+        import requests
+
+        with medir_externo("bluelytics", "latest"):
+            response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+        return float(response.json()["blue"]["value_buy"])
+
+    def fetch_history(self) -> list[tuple[str, float]]:
+        import requests
+
+        with medir_externo("bluelytics", "evolution"):
+            response = requests.get(BLUELYTICS_HISTORY_URL, timeout=self.timeout * 10)
+            response.raise_for_status()
+        return [
+            (item["date"], float(item["value_buy"]))
+            for item in response.json()
+            if item.get("source") == "Blue"
+        ]
+
+
+class StaticRateProvider:
+    """
+    Proveedor local para pruebas offline o para fijar la cotizacion a mano.
+    """
+
+    def __init__(self, value: float):
+        self.value = float(value)
+
+    def fetch(self) -> float:
+        return self.value
+
+    def fetch_history(self) -> list[tuple[str, float]]:
+        return []
+
+
+class CircuitBreaker:
+    """
+    Despues de `failures` errores seguidos deja de llamar al proveedor durante
+    `reset_sec`; pasado ese tiempo permite un intento (half-open).
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_sec: float = BREAKER_RESET_SEC):
+        self.failures = failures
+        self.reset_sec = reset_sec
+        self._errores = 0
+        self._abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self._errores < self.failures or time.monotonic() >= self._abierto_hasta
+
+    def record_success(self):
+        with self._lock:
+            self._errores = 0
+            self._abierto_hasta = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self._errores += 1
+            if self._errores >= self.failures:
+                self._abierto_hasta = time.monotonic() + self.reset_sec
+
+
+class CachedRate:
+    """
+    Cotizacion con cache TTL en memoria y ultimo valor bueno persistido.
+    Si el valor vencio se devuelve igual y se refresca en segundo plano;
+    solo se bloquea la primera vez que no hay ningun valor disponible.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        provider,
+        load: Callable[[str], Optional[tuple]],
+        save: Callable[[str, float, str], None],
+        ttl: float = RATE_TTL_SEC,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.provider = provider
+        self.ttl = ttl
+        self.breaker = breaker or CircuitBreaker()
+        self._load = load
+        self._save = save
+        self._value = None
+        self._expira = 0.0
+        self._refrescando = False
+        self._lock = threading.Lock()
+
+    def _cargar_persistido(self):
+        try:
+            guardado = self._load(self.name)
+        except Exception as e:
+            log.warning("no se pudo leer la cotizacion guardada", extra={"rate": self.name, "error": str(e)})
+            return
+        if not guardado:
+            return
+        value, fetched_at = guardado
+        edad = time.time() - datetime.fromisoformat(fetched_at).timestamp()
+        self._value = value
+        self._expira = time.monotonic() + self.ttl - edad
+
+    def refresh(self) -> float:
+        if not self.breaker.allow():
+            raise RateUnavailableError(f"Circuito abierto para {self.name}")
+        try:
+            value = self.provider.fetch()
+        except Exception as e:
+            self.breaker.record_failure()
+            raise RateUnavailableError(f"No se pudo obtener {self.name}: {e}") from e
+        self.breaker.record_success()
+
+        with self._lock:
+            self._value = value
+            self._expira = time.monotonic() + self.ttl
+        try:
+            self._save(self.name, value, datetime.now().isoformat())
+        except Exception as e:
+            log.warning("no se pudo guardar la cotizacion", extra={"rate": self.name, "error": str(e)})
+        return value
+
+    def _refrescar_en_segundo_plano(self):
+        def tarea():
+            try:
+                self.refresh()
+            except RateUnavailableError as e:
+                log.warning("se sigue usando el ultimo valor conocido", extra={"rate": self.name, "error": str(e)})
+            finally:
+                with self._lock:
+                    self._refrescando = False
+
+        with self._lock:
+            if self._refrescando:
+                return
+            self._refrescando = True
+        threading.Thread(target=tarea, name=f"refresh-{self.name}", daemon=True).start()
+
+    def get(self) -> float:
+        with self._lock:
+            if self._value is None:
+                self._cargar_persistido()
+            value = self._value
+            vencido = time.monotonic() >= self._expira
+
+        if value is None:
+            return self.refresh()
+        if vencido:
+            self._refrescar_en_segundo_plano()
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._expira = 0.0
+
+
+def provider_from_env():
+    if RATE_PROVIDER == "static":
+        if RATE_STATIC_VALUE is None:
+            raise ValueError("DOLAR_RATE_STATIC_VALUE es obligatorio con DOLAR_RATE_PROVIDER=static")
+        return StaticRateProvider(float(RATE_STATIC_VALUE))
+    return BluelyticsProvider()
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app import database
+
+# Hilos dedicados a la base: cada hilo lector tiene su propia conexion (ver db_pool) y
+# las escrituras van por un pool aparte, asi un sync largo no deja sin hilos a las lecturas
+DB_READ_CONCURRENCY = int(os.getenv("DB_READ_CONCURRENCY", "8"))
+# Uno por base de datos: el escritor de cada base ya esta serializado en db_pool
+DB_WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", "2"))
+
+
+class AsyncRepository:
+    """
+    API async sobre app.database. Las funciones bloqueantes corren en executors acotados
+    (uno de lectura y otro de escritura) en lugar del threadpool por defecto de Starlette,
+    que tambien usan los endpoints de sync.
+    """
+
+    def __init__(self, read_workers: int = DB_READ_CONCURRENCY, write_workers: int = DB_WRITE_CONCURRENCY):
+        self.read_workers = read_workers
+        self.write_workers = write_workers
+        self._lectura = None
+        self._escritura = None
+
+    def _executors(self):
+        # Se crean al primer uso para no levantar hilos al importar el modulo
+        if self._lectura is None:
+            self._lectura = ThreadPoolExecutor(self.read_workers, thread_name_prefix="db-read")
+            self._escritura = ThreadPoolExecutor(self.write_workers, thread_name_prefix="db-write")
+        return self._lectura, self._escritura
+
+    async def leer(self, func, *args, **kwargs):
+        lectura, _ = self._executors()
+        return await asyncio.get_running_loop().run_in_executor(lectura, partial(func, *args, **kwargs))
+
+    async def escribir(self, func, *args, **kwargs):
+        _, escritura = self._executors()
+        return await asyncio.get_running_loop().run_in_executor(escritura, partial(func, *args, **kwargs))
+
+    async def iterar(self, iterable):
+        """Recorre un generador bloqueante (respuestas en streaming) en el executor de lectura."""
+        iterador = iter(iterable)
+        fin = object()
+        while True:
+            parte = await self.leer(next, iterador, fin)
+            if parte is fin:
+                return
+            yield parte
+
+    def cerrar(self):
+        if self._lectura is not None:
+            self._lectura.shutdown(wait=True)
+            self._escritura.shutdown(wait=True)
+            self._lectura = None
+            self._escritura = None
+
+    # ------------------- Lecturas -------------------
+
+    async def obtener_registros(self, anio, mes, raw=False):
+        return await self.leer(database.obtener_registros, anio, mes, raw)
+
+    async def get_incomes(self, anio, mes, raw=False):
+        return await self.leer(database.get_incomes, anio, mes, raw)
+
+    async def obtener_resumen(self, anio, mes, card_type=None, holder=None, raw=False):
+        return await self.leer(database.obtener_resumen, anio, mes, card_type, holder, raw)
+
+    async def pagina_registros(self, anio, mes, limit=None, despues=None, campos=None, raw=False):
+        return await self.leer(database.pagina_registros, anio, mes, limit, despues, campos, raw)
+
+    async def pagina_incomes(self, anio, mes, limit=None, despues=None, campos=None, raw=False):
+        return await self.leer(database.pagina_incomes, anio, mes, limit, despues, campos, raw)
+
+    async def pagina_resumen(self, anio, mes, card_type=None, holder=None, limit=None, despues=None, campos=None, raw=False):
+        return await self.leer(database.pagina_resumen, anio, mes, card_type, holder, limit, despues, campos, raw)
+
+    async def obtener_tarjetas_disponibles(self, anio, mes):
+        return await self.leer(database.obtener_tarjetas_disponibles, anio, mes)
+
+    async def serie_mensual(self, source, desde, hasta, agrupar=(), raw=False):
+        return await self.leer(database.serie_mensual, source, desde, hasta, agrupar, raw)
+
+    async def buscar(self, source, texto, **filtros):
+        return await self.leer(database.buscar, source, texto, **filtros)
+
+    async def get_balance(self):
+        return await self.leer(database.get_balance)
+
+    async def existe_documento(self, document_number):
+        return await self.leer(database.existe_documento, document_number)
+
+    # ------------------- Escrituras -------------------
+
+    async def insertar_resumen_tarjeta(self, document_number, resume_date, payload_dict, card_type):
+        return await self.escribir(database.insertar_resumen_tarjeta, document_number, resume_date, payload_dict, card_type)
+
+    async def insertar_resumenes_tarjeta(self, resumenes, errores=None):
+        return await self.escribir(database.insertar_resumenes_tarjeta, resumenes, errores)
+
+    async def save_resume_files(self, archivos):
+        return await self.escribir(database.save_resume_files, archivos)
+
+
+repo = AsyncRepository()
@@ -0,0 +1,108 @@
+import orjson
+
+from app.database import iter_incomes, iter_registros, iter_resumen
+from app.money import cents_formatter
+
+# Los fragmentos chicos se juntan hasta este tamaño antes de escribirse al socket
+CHUNK_SIZE = 64 * 1024
+
+
+def _dumps(value):
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _chunks(partes):
+    # La primera parte (apertura del JSON) sale enseguida para bajar el time-to-first-byte
+    buffer = bytearray(next(partes, b""))
+    yield bytes(buffer)
+    buffer.clear()
+    for parte in partes:
+        buffer += parte
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _lista(items, dumps=_dumps):
+    yield b"["
+    separador = b""
+    for item in items:
+        yield separador + dumps(item)
+        separador = b","
+    yield b"]"
+
+
+def _abrir_objeto(objeto: dict):
+    # '{"a":1,"b":2}' -> '{"a":1,"b":2,' para seguir agregando claves a continuacion
+    return _dumps(objeto)[:-1] + b","
+
+
+def stream_expenses(desde, hasta, raw=False):
+    """
+    Mismo JSON que /expenses/{anio}/{mes}, generado mientras se recorre el cursor.
+    Los totales van al final porque se acumulan durante el recorrido.
+    """
+    totales = {}
+    fmt = cents_formatter(raw)
+
+    def partes():
+        yield b'{"expenses":{"expenses":'
+        yield from _lista(iter_registros(desde, hasta, totales, raw))
+        yield b',"total":' + _dumps(fmt(totales["total"]))
+        yield b',"total_by_expense_type":' + _dumps(
+            {tipo: fmt(importe) for tipo, importe in totales["total_by_expense_type"].items()}
+        )
+        yield b"}}"
+
+    return _chunks(partes())
+
+
+def stream_incomes(desde, hasta, raw=False):
+    totales = {}
+    fmt = cents_formatter(raw)
+
+    def partes():
+        yield b'{"income":{"incomes":'
+        yield from _lista(iter_incomes(desde, hasta, totales, raw))
+        yield b',"total_ars":' + _dumps(fmt(totales["total_ars"]))
+        yield b',"total_usd":' + _dumps(fmt(totales["total_usd"]))
+        yield b"}}"
+
+    return _chunks(partes())
+
+
+def stream_resumen(anio, mes, card_type=None, holder=None, raw=False):
+    totales = {}
+    fmt = cents_formatter(raw)
+
+    def titular(holder_info, expenses):
+        yield _abrir_objeto(holder_info) + b'"expenses":'
+        yield from _lista(expenses)
+        yield b"}"
+
+    def tarjeta(card, holders):
+        yield _abrir_objeto(card) + b'"holders":['
+        separador = b""
+        for holder_info, expenses in holders:
+            yield separador
+            yield from titular(holder_info, expenses)
+            separador = b","
+        yield b"]}"
+
+    def partes():
+        yield b'{"cards":['
+        separador = b""
+        for card, holders in iter_resumen(anio, mes, card_type, holder, totales, raw):
+            yield separador
+            yield from tarjeta(card, holders)
+            separador = b","
+        yield b"]"
+        # Igual que obtener_resumen: sin tarjetas en el mes los totales quedan en 0
+        for clave in ("total_ars_cards", "total_usd_cards"):
+            valor = fmt(totales[clave]) if clave in totales else 0
+            yield f',"{clave}":'.encode() + _dumps(valor)
+        yield b"}"
+
+    return _chunks(partes())
@@ -0,0 +1,73 @@
+"""
+/analytics/series contra el loop de 12 llamadas mensuales que arma hoy un grafico anual.
+
+Uso: python -m bench.analytics_series [--rows 100000 --years 2020,2018-2022]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import database, db_pool
+from bench import generador
+
+
+def medir(func, repeticiones=10):
+    func()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--years", default="2020,2018-2022", help="Rangos de anios a graficar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.pool.cerrar()
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        generador.generar(args.rows)
+
+        from fastapi.testclient import TestClient
+        from app import main as app_main
+        from app.cache import response_cache
+        from app.rates import StaticRateProvider
+
+        database.dolar_blue.provider = StaticRateProvider(1000)
+        client = TestClient(app_main.app)
+
+        print(f"{args.rows} filas de gastos, {args.rows // 10} ingresos", file=sys.stderr)
+        for rango in args.years.split(","):
+            desde, _, hasta = rango.partition("-")
+            desde, hasta = int(desde), int(hasta or desde)
+            meses = [(anio, mes) for anio in range(desde, hasta + 1) for mes in range(1, 13)]
+            query = f"from={desde}-01-01&to={hasta}-12-31"
+
+            for nombre, mensual, serie in (
+                ("expenses", "/expenses/{}/{}", f"/analytics/series?{query}"),
+                ("incomes", "/incomes/{}/{}", f"/analytics/series?{query}&source=incomes"),
+                ("cards", "/getResumeExpenses/{}/{}", f"/analytics/series?{query}&source=cards"),
+            ):
+                def loop():
+                    # Sin cache de respuestas: el caso de un dashboard que abre un rango nuevo
+                    response_cache.clear()
+                    for anio, mes in meses:
+                        client.get(mensual.format(anio, mes))
+
+                loop_ms = medir(loop)
+                serie_ms = medir(lambda: client.get(serie))
+                print(f"{rango:>10} {nombre:<9} | {len(meses):>3} llamadas: {loop_ms:8.2f} ms | "
+                      f"/analytics/series: {serie_ms:7.2f} ms | x{loop_ms / serie_ms:5.1f}")
+        db_pool.pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Arranque en frio: tiempo de `import app.main`, del lifespan (migraciones) y del primer
+request, cada corrida en un proceso nuevo, y modulos pesados cargados para servir una
+lectura.
+
+Escenarios: base nueva (se aplican todas las migraciones), base de antes del runner (sin
+schema_version: las migraciones se registran) y base ya migrada (solo se lee la version,
+el caso de cada worker y de cada --reload).
+
+Uso: python -m bench.cold_start [--rows 100000 --runs 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PESADOS = ("gspread", "google.auth", "requests", "httpx")
+URL = "/expenses/2020/6"
+
+
+async def _pedir(app, path):
+    # Request ASGI directo: TestClient importaria httpx y ensuciaria la medicion de modulos
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("bench", 1), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return mensajes[0]["status"]
+
+
+def hijo(directorio):
+    t0 = time.perf_counter()
+    from app import database
+    database.REGISTROS_DB = Path(directorio) / "registros.db"
+    database.TARJETAS_DB = Path(directorio) / "tarjetas.db"
+    from app import main
+    t1 = time.perf_counter()
+
+    async def arrancar_y_pedir():
+        async with main.app.router.lifespan_context(main.app):
+            t2 = time.perf_counter()
+            status = await _pedir(main.app, URL)
+            return t2, status
+
+    t2, status = asyncio.run(arrancar_y_pedir())
+    t3 = time.perf_counter()
+    assert status == 200, status
+    print(json.dumps({
+        "import_ms": (t1 - t0) * 1000,
+        "startup_ms": (t2 - t1) * 1000,
+        "first_request_ms": (t3 - t2) * 1000,
+        "pesados": [m for m in PESADOS if m in sys.modules],
+    }))
+
+
+def correr(directorio):
+    env = {**os.environ, "JOBS_CURRENT_MONTH_INTERVAL_MIN": "0", "LOG_LEVEL": "WARNING"}
+    salida = subprocess.run(
+        [sys.executable, "-m", "bench.cold_start", "--hijo", str(directorio)],
+        capture_output=True, text=True, env=env, check=True,
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--hijo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.hijo:
+        return hijo(args.hijo)
+
+    from app import database, db_pool
+    from bench import generador
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        migrada = tmp / "migrada"
+        migrada.mkdir()
+        database.REGISTROS_DB = migrada / "registros.db"
+        database.TARJETAS_DB = migrada / "tarjetas.db"
+        generador.generar(args.rows)
+        db_pool.pool.cerrar()
+
+        # Misma base sin schema_version, como la dejaba la version anterior
+        anterior = tmp / "anterior"
+        shutil.copytree(migrada, anterior)
+        for nombre in ("registros.db", "tarjetas.db"):
+            conn = sqlite3.connect(anterior / nombre)
+            conn.execute("DROP TABLE schema_version")
+            conn.commit()
+            conn.close()
+
+        escenarios = [
+            ("base nueva", lambda: Path(tempfile.mkdtemp(dir=tmp))),
+            ("base sin schema_version", lambda: Path(shutil.copytree(anterior, tempfile.mkdtemp(dir=tmp), dirs_exist_ok=True))),
+            ("base migrada", lambda: migrada),
+        ]
+        print(f"{args.rows} filas, {args.runs} procesos por escenario (mediana)")
+        for nombre, preparar in escenarios:
+            corridas = [correr(preparar()) for _ in range(args.runs)]
+            mediana = {k: statistics.median(c[k] for c in corridas) for k in ("import_ms", "startup_ms", "first_request_ms")}
+            total = sum(mediana.values())
+            print(f"  {nombre:24} import {mediana['import_ms']:7.1f} ms | startup {mediana['startup_ms']:7.1f} ms | "
+                  f"primer request {mediana['first_request_ms']:6.1f} ms | total {total:7.1f} ms")
+        print(f"  modulos pesados cargados: {corridas[-1]['pesados'] or 'ninguno'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Lectores de /expenses mientras un sync historico escribe, con y sin WAL.
+
+Uso: python -m bench.concurrent_reads [--rows 100000 --readers 8 --seconds 5]
+"""
+import argparse
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app import database, db_pool
+
+
+def filas_hoja(desde: int, cantidad: int):
+    base = datetime(2024, 1, 1)
+    return [
+        {
+            "UUID": f"u{i}",
+            "Marca temporal": (base + timedelta(hours=i)).strftime("%d/%m/%Y %H:%M:%S"),
+            "Descripción": f"gasto {i}",
+            "Importe": f"${(i % 5000) + 0.5:,.2f}",
+            "Tipo de gatos": "Otros",
+        }
+        for i in range(desde, desde + cantidad)
+    ]
+
+
+def correr(journal_mode: str, rows: int, readers: int, seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.pool.cerrar()
+        db_pool.JOURNAL_MODE = journal_mode
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        database.crear_tabla_registros()
+        database.create_income_table()
+        database.crear_tablas_resumen_tarjeta()
+        database.create_monthly_totals_tables()
+        database.insert_expenses(filas_hoja(0, rows))
+
+        fin = time.perf_counter() + seconds
+        latencias = []
+        escrituras = [0]
+        lock = threading.Lock()
+
+        def escritor():
+            # Simula /syncHistoricExpenses: borra y reinserta lotes de filas
+            siguiente = rows
+            while time.perf_counter() < fin:
+                database.insert_expenses(filas_hoja(siguiente, 2000))
+                database.delete_expenses({f"u{i}" for i in range(siguiente, siguiente + 2000)})
+                siguiente += 2000
+                escrituras[0] += 1
+
+        def lector():
+            propias = []
+            while time.perf_counter() < fin:
+                t0 = time.perf_counter()
+                database.obtener_registros(2024, 1)
+                propias.append(time.perf_counter() - t0)
+            with lock:
+                latencias.extend(propias)
+
+        hilos = [threading.Thread(target=escritor)] + [threading.Thread(target=lector) for _ in range(readers)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        db_pool.pool.cerrar()
+
+    latencias.sort()
+    p50 = latencias[len(latencias) // 2] * 1000
+    p95 = latencias[int(len(latencias) * 0.95)] * 1000
+    print(f"{journal_mode:>6} | lecturas: {len(latencias):6} | p50 {p50:8.2f} ms | p95 {p95:8.2f} ms | lotes escritos: {escrituras[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for mode in ("DELETE", "WAL"):
+        correr(mode, args.rows, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
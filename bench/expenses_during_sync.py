@@ -0,0 +1,120 @@
+"""
+Latencia de /expenses/{anio}/{mes} en reposo y mientras corre /syncResumes,
+contra un uvicorn real y el parser falso.
+
+Uso: python -m bench.expenses_during_sync [--rows 100000 --files 40 --lines 2000 --clients 16]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+from app import database
+from bench.fake_parser import iniciar_en_segundo_plano
+from bench.month_queries import poblar
+from bench.sync_resumes import crear_pdfs
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_uvicorn(app):
+    port = puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, f"http://127.0.0.1:{port}"
+
+
+async def cargar_lecturas(url, clientes, hasta_que):
+    latencias = []
+
+    async def cliente(http):
+        while not hasta_que():
+            t0 = time.perf_counter()
+            respuesta = await http.get(f"{url}/expenses/2020/6")
+            respuesta.raise_for_status()
+            latencias.append(time.perf_counter() - t0)
+
+    async with httpx.AsyncClient(timeout=60) as http:
+        await asyncio.gather(*(cliente(http) for _ in range(clientes)))
+    return latencias
+
+
+def resumen(nombre, latencias, duracion):
+    latencias.sort()
+    p50 = latencias[len(latencias) // 2] * 1000
+    p95 = latencias[int(len(latencias) * 0.95)] * 1000
+    print(f"{nombre:>22} | {len(latencias):6} lecturas | {len(latencias) / duracion:7.1f} req/s "
+          f"| p50 {p50:8.2f} ms | p95 {p95:8.2f} ms")
+
+
+async def medir(url, clientes, segundos):
+    fin = time.perf_counter() + segundos
+    t0 = time.perf_counter()
+    latencias = await cargar_lecturas(url, clientes, lambda: time.perf_counter() >= fin)
+    resumen("en reposo", latencias, time.perf_counter() - t0)
+
+    terminado = asyncio.Event()
+
+    async def sync():
+        async with httpx.AsyncClient(timeout=None) as http:
+            respuesta = await http.get(f"{url}/syncResumes", params={"force": True})
+        terminado.set()
+        return respuesta
+
+    t0 = time.perf_counter()
+    tarea = asyncio.create_task(sync())
+    latencias = await cargar_lecturas(url, clientes, terminado.is_set)
+    respuesta = await tarea
+    duracion = time.perf_counter() - t0
+    resumen("durante /syncResumes", latencias, duracion)
+    datos = respuesta.json()
+    print(f"{'':>22} | sync: {len(datos['procesados_ok'])} PDFs en {duracion:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--delay", type=float, default=0.1)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    parser_falso, parser_url = iniciar_en_segundo_plano(delay=args.delay, lines=args.lines)
+    os.environ["PARSE_PDF_ENDPOINT"] = parser_url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        database.crear_tabla_registros()
+        poblar(database.REGISTROS_DB, args.rows)
+        from app import main as app_main
+
+        crear_pdfs(Path(tmp) / "resumenes", args.files)
+        os.environ["RESUMES_LOCAL_LOCATION"] = str(Path(tmp) / "resumenes")
+
+        servidor, url = iniciar_uvicorn(app_main.app)
+        try:
+            asyncio.run(medir(url, args.clients, args.seconds))
+        finally:
+            servidor.should_exit = True
+
+    parser_falso.shutdown()
+
+
+if __name__ == "__main__":
+    main()
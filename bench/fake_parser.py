@@ -0,0 +1,104 @@
+"""
+Servidor local que reemplaza a PARSE_PDF_ENDPOINT: devuelve un resumen sintetico
+(distinto por cada PDF) despues de una demora configurable. Lo usan el benchmark de
+/syncResumes y los tests: un PDF que contiene PDF_LENTO tarda `slow_delay` (timeouts) y
+uno con PDF_INVALIDO recibe un resumen mal formado; con fail_first las primeras
+respuestas de cada PDF son 503 (fallas transitorias).
+
+Uso: python -m bench.fake_parser [--port 8765 --delay 0.5 --lines 200]
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PDF_LENTO = b"%fake-parser:lento"
+PDF_INVALIDO = b"%fake-parser:invalido"
+
+
+def resumen_sintetico(seed: str, holders: int = 2, lines: int = 200):
+    rnd = random.Random(seed)
+    payload = {"Total": {"pesos": "0,00", "dolares": "0,00"}}
+    total = 0.0
+    for h in range(holders):
+        detalle = []
+        for i in range(lines):
+            importe = round(rnd.uniform(100, 90000), 2)
+            total += importe
+            detalle.append({
+                "fechaTimestamp": (datetime(2024, 1, 1) + timedelta(days=rnd.randrange(365))).isoformat(),
+                "descripcion": f"COMERCIO {rnd.randrange(5000)}",
+                "importe": f"{importe:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
+            })
+        payload[f"TITULAR {h}"] = {"Detail": detalle}
+    payload["Total"]["pesos"] = f"{total:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
+    return payload
+
+
+def crear_servidor(port: int = 0, delay: float = 0.5, lines: int = 200, fail_every: int = 0,
+                   fail_first: int = 0, slow_delay: float = 30):
+    contador = {"n": 0}
+    # POSTs recibidos por PDF (sha256 del cuerpo sin el boundary): servidor.intentos en los tests
+    intentos = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            # El boundary del multipart cambia en cada POST: se quita para que el mismo PDF
+            # produzca siempre el mismo resumen
+            boundary = self.headers.get("Content-Type", "").partition("boundary=")[2].encode()
+            if boundary:
+                cuerpo = cuerpo.replace(boundary, b"")
+            semilla = hashlib.sha256(cuerpo).hexdigest()
+            with lock:
+                contador["n"] += 1
+                n = contador["n"]
+                intentos[semilla] = intento = intentos.get(semilla, 0) + 1
+            time.sleep(slow_delay if PDF_LENTO in cuerpo else delay)
+            if (fail_every and n % fail_every == 0) or intento <= fail_first:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if PDF_INVALIDO in cuerpo:
+                # Titular sin "Detail": el parser respondio pero el resumen no se puede guardar
+                resumen = {"TITULAR 0": {"pesos": "1,00"}}
+            else:
+                resumen = resumen_sintetico(semilla, lines=lines)
+            data = json.dumps(resumen).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    servidor.intentos = intentos
+    return servidor
+
+
+def iniciar_en_segundo_plano(**kwargs):
+    servidor = crear_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/parse"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+    print(f"Parser falso en http://127.0.0.1:{args.port}/parse")
+    crear_servidor(args.port, args.delay, args.lines).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
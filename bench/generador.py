@@ -0,0 +1,147 @@
+"""
+Datos sinteticos reproducibles (misma semilla -> mismas filas) para los benchmarks.
+
+Las filas se generan en el formato de la planilla y se cargan por los mismos caminos que
+usa la app (apply_*_sync e insertar_resumenes_tarjeta), asi los content_hash, los
+centavos y los agregados mensuales quedan igual que en produccion.
+
+Escalas: `filas` gastos, filas / 10 ingresos y ~`filas` lineas de resumen repartidas en
+un resumen por tarjeta y mes entre 2015 y 2025.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from app import database, migrations
+
+HEADER_GASTOS = ["Marca temporal", "Descripción", "Importe", "Tipo de gatos", "UUID"]
+HEADER_INGRESOS = ["Marca temporal", "Descripcion", "Importe", "Moneda", "UUID"]
+TIPOS = ["Supermercado", "Servicios", "Salidas", "Transporte", "Otros"]
+TARJETAS = ["visa", "mastercard"]
+TITULARES = ["TITULAR", "ADICIONAL"]
+
+DESDE = datetime(2015, 1, 1)
+HASTA = datetime(2025, 12, 31)
+MESES = [(anio, mes) for anio in range(DESDE.year, HASTA.year + 1) for mes in range(1, 13)]
+
+
+def _fecha(rnd):
+    return DESDE + timedelta(seconds=rnd.randrange(int((HASTA - DESDE).total_seconds())))
+
+
+def _importe_planilla(centavos):
+    # Formato de la planilla: $123,456.78
+    return f"${centavos // 100:,}.{centavos % 100:02d}"
+
+
+def _importe_es_ar(centavos):
+    return f"{centavos // 100:,}".replace(",", ".") + f",{centavos % 100:02d}"
+
+
+def hoja_gastos(filas: int, seed: int = 42) -> list[list]:
+    """Valores de la hoja de gastos (encabezado + filas), como los devuelve get_values."""
+    rnd = random.Random(seed)
+    valores = [HEADER_GASTOS]
+    for i in range(filas):
+        valores.append([
+            _fecha(rnd).strftime("%d/%m/%Y %H:%M:%S"),
+            f"gasto {i}",
+            _importe_planilla(rnd.randrange(10_000, 5_000_000)),
+            rnd.choice(TIPOS),
+            f"g{i}",
+        ])
+    return valores
+
+
+def hoja_ingresos(filas: int, seed: int = 42) -> list[list]:
+    rnd = random.Random(seed + 1)
+    valores = [HEADER_INGRESOS]
+    for i in range(filas):
+        moneda = "USD" if rnd.random() < 0.2 else "ARS"
+        centavos = rnd.randrange(10_000, 200_000) if moneda == "USD" else rnd.randrange(1_000_000, 300_000_000)
+        valores.append([
+            _fecha(rnd).strftime("%d/%m/%Y %H:%M:%S"),
+            f"ingreso {i}",
+            _importe_planilla(centavos),
+            moneda,
+            f"i{i}",
+        ])
+    return valores
+
+
+def modificar(valores: list[list], fraccion: float, seed: int = 7) -> list[list]:
+    """Copia de la hoja con `fraccion` de las filas con otro importe (ediciones en la planilla)."""
+    rnd = random.Random(seed)
+    copia = [list(fila) for fila in valores]
+    for fila in rnd.sample(copia[1:], int((len(copia) - 1) * fraccion)):
+        fila[2] = _importe_planilla(rnd.randrange(10_000, 5_000_000))
+    return copia
+
+
+def registros(valores: list[list]) -> list[dict]:
+    # Mismo formato que get_all_records
+    header = valores[0]
+    return [dict(zip(header, fila)) for fila in valores[1:]]
+
+
+def resumen(rnd, lineas: int, anio: int, mes: int) -> dict:
+    """Payload como el que devuelve el parser de PDFs, con `lineas` gastos por titular."""
+    payload = {"Total": {}}
+    total = 0
+    for titular in TITULARES:
+        detalle = []
+        for _ in range(lineas):
+            centavos = rnd.randrange(10_000, 9_000_000)
+            total += centavos
+            detalle.append({
+                "fechaTimestamp": datetime(anio, mes, rnd.randrange(1, 29)).isoformat(),
+                "descripcion": f"COMERCIO {rnd.randrange(5000)}" + (" USD" if rnd.random() < 0.05 else ""),
+                "importe": _importe_es_ar(centavos),
+            })
+        payload[titular] = {"Detail": detalle}
+    payload["Total"] = {"pesos": _importe_es_ar(total), "dolares": "0,00"}
+    return payload
+
+
+def resumenes(lineas_totales: int, seed: int = 42):
+    """(document_number, resume_date, payload, card_type) para un resumen por tarjeta y mes."""
+    rnd = random.Random(seed + 2)
+    por_titular = max(1, lineas_totales // (len(MESES) * len(TARJETAS) * len(TITULARES)))
+    for anio, mes in MESES:
+        for tarjeta in TARJETAS:
+            yield f"{tarjeta}-{anio}-{mes:02d}", date(anio, mes, 1), resumen(rnd, por_titular, anio, mes), tarjeta
+
+
+def fx_rates():
+    # Una cotizacion por semana, creciente, para que la conversion de ingresos use el historico
+    dia = DESDE.date()
+    valor = 10.0
+    while dia <= HASTA.date():
+        yield dia.isoformat(), round(valor, 2)
+        dia += timedelta(days=7)
+        valor *= 1.006
+
+
+def crear_tablas():
+    migrations.aplicar_migraciones()
+
+
+def generar(filas: int, seed: int = 42, lote_resumenes: int = 24):
+    """
+    Carga las bases apuntadas por database.REGISTROS_DB / TARJETAS_DB (que ya deben ser
+    temporales). Devuelve las hojas generadas para reusarlas como planilla falsa.
+    """
+    crear_tablas()
+    gastos = hoja_gastos(filas, seed)
+    ingresos = hoja_ingresos(max(1, filas // 10), seed)
+    database.apply_expenses_sync(registros(gastos), set())
+    database.apply_incomes_sync(registros(ingresos), set())
+    database.insert_fx_rates(fx_rates())
+
+    lote = []
+    for item in resumenes(filas, seed):
+        lote.append(item)
+        if len(lote) >= lote_resumenes:
+            database.insertar_resumenes_tarjeta(lote)
+            lote = []
+    database.insertar_resumenes_tarjeta(lote)
+    return gastos, ingresos
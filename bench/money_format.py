@@ -0,0 +1,55 @@
+"""
+Formateo y parseo de importes: cadena de str.replace vs app.money.
+
+Uso: python -m bench.money_format [--valores 200000]
+"""
+import argparse
+import random
+import time
+
+from app import money
+
+
+def reemplazos(importe):
+    return f"{importe:,.2f}".replace(",", "#").replace(".", ",").replace("#", ".")
+
+
+def parseo_reemplazos(texto):
+    return float(texto.replace(".", "").replace(",", "."))
+
+
+def medir(func, repeticiones=5):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func()
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--valores", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    importes = [round(rnd.uniform(-50_000, 5_000_000), 2) for _ in range(args.valores)]
+    centavos = [money.to_cents(i) for i in importes]
+    textos = [reemplazos(i) for i in importes]
+    assert money.format_column(centavos) == textos
+
+    casos = [
+        ("formato str.replace x3", lambda: [reemplazos(i) for i in importes]),
+        ("formato format_amount", lambda: [money.format_amount(i) for i in importes]),
+        ("formato format_column", lambda: money.format_column(centavos)),
+        ("salida raw (centavos)", lambda: [money.to_cents(i) for i in importes]),
+        ("parseo str.replace", lambda: [parseo_reemplazos(t) for t in textos]),
+        ("parseo parse_column", lambda: money.parse_column(textos)),
+    ]
+    for nombre, func in casos:
+        ms = medir(func)
+        print(f"{nombre:>24} | {args.valores} valores | {ms:8.1f} ms | {ms * 1e6 / args.valores:6.0f} ns/valor")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Latencia de obtener_registros para un mes fijo a medida que crece la tabla.
+
+Uso: python -m bench.month_queries [--sizes 10000,100000,1000000]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app import database
+
+TIPOS = ["Supermercado", "Servicios", "Salidas", "Transporte", "Otros"]
+
+
+def poblar(db_path: Path, filas: int, seed: int = 42):
+    rnd = random.Random(seed)
+    inicio = datetime(2015, 1, 1)
+    segundos = int((datetime(2025, 12, 31) - inicio).total_seconds())
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO registros (uuid, marca_temporal, descripcion, importe_cents, tipo) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    f"u{i}",
+                    (inicio + timedelta(seconds=rnd.randrange(segundos))).isoformat(),
+                    f"gasto {i}",
+                    rnd.randrange(10_000, 5_000_000),
+                    rnd.choice(TIPOS),
+                )
+                for i in range(filas)
+            ),
+        )
+        conn.commit()
+
+
+def medir(func, repeticiones=20):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    for filas in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.REGISTROS_DB = Path(tmp) / "registros.db"
+            database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+            database.crear_tabla_registros()
+            database.create_income_table()
+            database.crear_tablas_resumen_tarjeta()
+            poblar(database.REGISTROS_DB, filas)
+            # Los totales del mes salen de los agregados, que se arman sobre los datos cargados
+            database.create_monthly_totals_tables()
+
+            indexada = medir(lambda: database.obtener_registros(2020, 6))
+
+            with sqlite3.connect(database.REGISTROS_DB) as conn:
+                escaneo = medir(lambda: conn.execute("""
+                    SELECT uuid, marca_temporal, descripcion, importe_cents, tipo FROM registros
+                    WHERE strftime('%Y', marca_temporal) = '2020' AND strftime('%m', marca_temporal) = '06'
+                """).fetchall())
+
+            print(f"{filas:>9} filas | rango indexado: {indexada:8.2f} ms | strftime (scan): {escaneo:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Carga contra `uvicorn --workers N` sobre las mismas bases: requests por segundo de
+lecturas mezcladas (meses y endpoints al azar, sin cache de respuestas para que cada
+request consulte la base) con 1, 2, 4... workers.
+
+Los clientes corren en procesos aparte para que el generador de carga no sea el cuello
+de botella. La escala esperable depende de los nucleos libres: con un solo CPU todos los
+workers se lo reparten y el throughput queda plano.
+
+Uso: python -m bench.multi_worker [--rows 100000 --workers 1,2,4 --seconds 10 --clients 4 --concurrency 16]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench import generador
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def rutas(rnd):
+    anio, mes = rnd.randint(2016, 2024), rnd.randint(1, 12)
+    return rnd.choice([
+        f"/expenses/{anio}/{mes}",
+        f"/incomes/{anio}/{mes}",
+        f"/getResumeExpenses/{anio}/{mes}",
+        f"/expenses/{anio}/{mes}?limit=50",
+    ])
+
+
+async def _cargar(url, segundos, concurrencia, semilla):
+    import httpx
+
+    rnd = random.Random(semilla)
+    fin = time.monotonic() + segundos
+    hechos, errores = 0, 0
+
+    async def cliente(c):
+        nonlocal hechos, errores
+        while time.monotonic() < fin:
+            respuesta = await c.get(rutas(rnd))
+            if respuesta.status_code == 200:
+                hechos += 1
+            else:
+                errores += 1
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as c:
+        await asyncio.gather(*(cliente(c) for _ in range(concurrencia)))
+    return hechos, errores
+
+
+def cliente(url, segundos, concurrencia, semilla):
+    hechos, errores = asyncio.run(_cargar(url, segundos, concurrencia, semilla))
+    print(json.dumps({"ok": hechos, "errors": errores}))
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _esperar(url, proceso, timeout=60):
+    import httpx
+
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("uvicorn termino antes de arrancar")
+        try:
+            httpx.get(url + "/expenses/2020/6", timeout=5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise TimeoutError(url)
+
+
+def correr(directorio, workers, args):
+    puerto = _puerto_libre()
+    url = f"http://127.0.0.1:{puerto}"
+    env = {
+        **os.environ,
+        "DATA_DIR": str(directorio),
+        "RESPONSE_CACHE_MAX_ENTRIES": "0",
+        "JOBS_CURRENT_MONTH_INTERVAL_MIN": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=RAIZ, env=env,
+    )
+    try:
+        _esperar(url, servidor)
+        # Calentamiento: cada worker abre sus conexiones y llena el page cache
+        subprocess.run([sys.executable, "-m", "bench.multi_worker", "--cliente", url, "--seconds", "2",
+                        "--concurrency", str(args.concurrency)], cwd=RAIZ, capture_output=True, check=True)
+        clientes = [
+            subprocess.Popen([sys.executable, "-m", "bench.multi_worker", "--cliente", url,
+                              "--seconds", str(args.seconds), "--concurrency", str(args.concurrency),
+                              "--seed", str(i)], cwd=RAIZ, stdout=subprocess.PIPE, text=True)
+            for i in range(args.clients)
+        ]
+        resultados = [json.loads(c.communicate()[0].strip().splitlines()[-1]) for c in clientes]
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    ok = sum(r["ok"] for r in resultados)
+    return ok / args.seconds, sum(r["errors"] for r in resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cliente", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cliente:
+        return cliente(args.cliente, args.seconds, args.concurrency, args.seed)
+
+    from app import database, db_pool
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        generador.generar(args.rows)
+        db_pool.pool.cerrar()
+
+        print(f"{args.rows} filas, {os.cpu_count()} CPUs, {args.clients} procesos cliente x {args.concurrency} conexiones, {args.seconds:g} s")
+        base = None
+        for workers in (int(w) for w in args.workers.split(",")):
+            rps, errores = correr(tmp, workers, args)
+            base = base or rps
+            print(f"  {workers:2} workers: {rps:8.1f} req/s  (x{rps / base:4.2f}){f'  {errores} errores' if errores else ''}")
+
+
+if __name__ == "__main__":
+    main()
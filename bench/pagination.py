@@ -0,0 +1,74 @@
+"""
+Mes completo contra una pagina (limit/cursor, fields) en /expenses, /incomes y
+/getResumeExpenses: bytes y latencia de la primera pagina y de una del final del mes.
+
+Uso: python -m bench.pagination [--rows 1000000 --limit 50]
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from app import database, db_pool
+from app.cache import response_cache
+from bench import generador
+from bench.analytics_series import medir
+
+ANIO, MES = 2020, 6
+
+
+def ultima_pagina(client, url, params):
+    # Recorre el mes para quedarse con el cursor de la ultima pagina
+    cursor, anterior = None, None
+    while True:
+        respuesta = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        if not respuesta["next_cursor"]:
+            return anterior
+        anterior, cursor = cursor, respuesta["next_cursor"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.pool.cerrar()
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        generador.generar(args.rows)
+
+        from fastapi.testclient import TestClient
+        from app import main as app_main
+        client = TestClient(app_main.app)
+
+        def get(url, params=None):
+            # Sin cache: se mide el calculo de cada respuesta
+            def pedir():
+                response_cache.clear()
+                return client.get(url, params=params)
+            return pedir
+
+        casos = [
+            ("expenses", f"/expenses/{ANIO}/{MES}", "uuid,datetime,amount"),
+            ("incomes", f"/incomes/{ANIO}/{MES}", "uuid,datetime,amount_pesos"),
+            ("cards", f"/getResumeExpenses/{ANIO}/{MES}", "date,amount_pesos"),
+        ]
+        print(f"{args.rows} filas, mes {ANIO}-{MES:02d}, paginas de {args.limit}")
+        for nombre, url, campos in casos:
+            pagina = {"limit": args.limit}
+            cursor = ultima_pagina(client, url, pagina)
+            variantes = [
+                ("mes completo", None),
+                ("primera pagina", pagina),
+                ("ultima pagina", {**pagina, "cursor": cursor} if cursor else pagina),
+                ("pagina + fields", {**pagina, "fields": campos}),
+            ]
+            for etiqueta, params in variantes:
+                kib = len(get(url, params)().content) / 1024
+                ms = medir(get(url, params))
+                print(f"  {nombre:9} {etiqueta:16} {kib:9.1f} KiB {ms:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
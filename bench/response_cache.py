@@ -0,0 +1,48 @@
+"""
+Latencia de /expenses/{anio}/{mes} sin cache, con cache y con If-None-Match (304).
+
+Uso: python -m bench.response_cache [--rows 100000]
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import database, migrations
+from app.cache import response_cache
+from bench.month_queries import medir, poblar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        database.crear_tabla_registros()
+        poblar(database.REGISTROS_DB, args.rows)
+        migrations.aplicar_migraciones()
+        from app import main as app_main
+
+        client = TestClient(app_main.app)
+        url = "/expenses/2020/6"
+
+        def sin_cache():
+            response_cache.clear()
+            return client.get(url)
+
+        etag = client.get(url).headers["etag"]
+        miss = medir(sin_cache)
+        hit = medir(lambda: client.get(url))
+        not_modified = medir(lambda: client.get(url, headers={"If-None-Match": etag}))
+
+        print(f"{args.rows} filas, {len(client.get(url).content) / 1024:.0f} KiB por respuesta")
+        print(f"  miss: {miss:8.2f} ms | hit: {hit:8.2f} ms | 304: {not_modified:8.2f} ms")
+        print(f"  {response_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+obtener_resumen con consultas por lotes contra la cascada N+1 anterior.
+
+Uso: python -m bench.resume_fetch [--cards 20 --holders 5 --lines 500]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app import database
+
+
+def poblar(db_path: Path, cards: int, holders: int, lines: int):
+    with sqlite3.connect(db_path) as conn:
+        for c in range(cards):
+            doc = f"doc{c:04}"
+            conn.execute(
+                "INSERT INTO cards_resume_header VALUES (?, ?, ?, ?, ?)",
+                (doc, "visa" if c % 2 else "mastercard", datetime(2024, 5, 1).isoformat(), 100000, 1000),
+            )
+            for h in range(holders):
+                holder = f"Titular {h}"
+                conn.execute("INSERT INTO card_resume_holder VALUES (?, ?, ?, ?)", (doc, holder, 10000, 100))
+                conn.executemany(
+                    "INSERT INTO card_holder_expenses (document_number, holder, position, date, description, amount_cents) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        (doc, holder, i, datetime(2024, 4, 1 + i % 28).isoformat(), f"COMPRA {i}", 123456)
+                        for i in range(lines)
+                    ),
+                )
+        conn.commit()
+
+
+def n_mas_uno(anio, mes):
+    # Patron de acceso previo: una consulta por header y otra por titular
+    inicio, fin = database.rango_mes(anio, mes)
+    cards = []
+    with sqlite3.connect(database.TARJETAS_DB) as conn:
+        for row in conn.execute(
+            "SELECT * FROM cards_resume_header WHERE resume_date >= ? AND resume_date < ?", (inicio, fin)
+        ).fetchall():
+            card = {"card_type": row[1], "holders": []}
+            for h_name, h_ars, h_usd in conn.execute(
+                "SELECT holder, total_ars_cents, total_usd_cents FROM card_resume_holder WHERE document_number = ?", (row[0],)
+            ).fetchall():
+                holder_info = {"holder": h_name, "expenses": []}
+                for e_date, e_desc, e_amount in conn.execute(
+                    "SELECT date, description, amount_cents FROM card_holder_expenses WHERE document_number = ? AND holder = ?",
+                    (row[0], h_name),
+                ).fetchall():
+                    holder_info["expenses"].append({
+                        "date": datetime.fromisoformat(e_date).strftime("%d-%b-%y"),
+                        "descriptions": e_desc,
+                        "amount_pesos": f"{e_amount / 100:,.2f}".replace(",", "#").replace(".", ",").replace("#", "."),
+                        "amount_usd": "",
+                    })
+                card["holders"].append(holder_info)
+            cards.append(card)
+    return cards
+
+
+def medir(func, repeticiones=10):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=20)
+    parser.add_argument("--holders", type=int, default=5)
+    parser.add_argument("--lines", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        database.crear_tablas_resumen_tarjeta()
+        poblar(database.TARJETAS_DB, args.cards, args.holders, args.lines)
+
+        lotes = medir(lambda: database.obtener_resumen(2024, 5))
+        cascada = medir(lambda: n_mas_uno(2024, 5))
+        print(f"{args.cards} tarjetas x {args.holders} titulares x {args.lines} lineas")
+        print(f"  N+1 ({1 + args.cards + args.cards * args.holders} consultas): {cascada:8.2f} ms")
+        print(f"  por lotes (3 consultas): {lotes:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Ingesta de resumes: un INSERT por linea (camino anterior) contra executemany por lotes.
+
+Uso: python -m bench.resume_ingest [--lines 10000 --holders 2 --resumes 1]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app import database, db_pool
+from app.money import parse_cents
+from bench.fake_parser import resumen_sintetico
+
+
+def por_fila(document_number, resume_date, payload_dict, card_type):
+    # Patron anterior: header repetido por titular y un execute por cada linea
+    with database.conectar(database.TARJETAS_DB, escritura=True) as conn:
+        total = payload_dict["Total"]
+        total_ars, total_usd = parse_cents(total["pesos"]), parse_cents(total["dolares"])
+        for holder, data in payload_dict.items():
+            if holder == "Total":
+                continue
+            conn.execute(
+                "INSERT OR IGNORE INTO cards_resume_header (document_number, card_type, resume_date, total_ars_cents, total_usd_cents) VALUES (?, ?, ?, ?, ?)",
+                (document_number, card_type, resume_date.isoformat(), total_ars, total_usd),
+            )
+            conn.execute(
+                "INSERT INTO card_resume_holder (document_number, holder, total_ars_cents, total_usd_cents) VALUES (?, ?, ?, ?)",
+                (document_number, holder, total_ars, total_usd),
+            )
+            for idx, gasto in enumerate(data["Detail"]):
+                conn.execute(
+                    "INSERT INTO card_holder_expenses (document_number, holder, position, date, description, amount_cents) VALUES (?, ?, ?, ?, ?, ?)",
+                    (document_number, holder, idx, gasto["fechaTimestamp"], gasto["descripcion"], parse_cents(gasto["importe"])),
+                )
+        conn.commit()
+
+
+def correr(nombre, insertar, resumenes):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.pool.cerrar()
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.crear_tablas_resumen_tarjeta()
+        database.crear_tabla_registros()
+        database.create_income_table()
+        database.create_monthly_totals_tables()
+
+        t0 = time.perf_counter()
+        insertar(resumenes)
+        duracion = time.perf_counter() - t0
+
+        with sqlite3.connect(database.TARJETAS_DB) as conn:
+            lineas = conn.execute("SELECT COUNT(*) FROM card_holder_expenses").fetchone()[0]
+        db_pool.pool.cerrar()
+    print(f"{nombre:>28} | {lineas} lineas | {duracion * 1000:8.1f} ms | {lineas / duracion:10.0f} lineas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10_000, help="Lineas totales por corrida")
+    parser.add_argument("--holders", type=int, default=2)
+    parser.add_argument("--resumes", type=int, default=1)
+    args = parser.parse_args()
+
+    por_resumen = args.lines // (args.holders * args.resumes)
+    resumenes = [
+        (f"doc{r}", datetime(2024, 5, 1), resumen_sintetico(f"seed{r}", args.holders, por_resumen), "visa")
+        for r in range(args.resumes)
+    ]
+
+    def fila_a_fila(lote):
+        for resumen in lote:
+            por_fila(*resumen)
+
+    correr("por fila", fila_a_fila, resumenes)
+    correr("executemany (un commit)", database.insertar_resumenes_tarjeta, resumenes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+/search (FTS5) contra el LIKE '%...%' que haria falta sin indice, sobre las lineas de
+resumen, y costo de los triggers del indice al ingerir resumenes.
+
+Uso: python -m bench.search [--rows 1000000 --terms "COMERCIO 123,COMERCIO 4,USD"]
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from app import database, db_pool
+from bench import generador
+from bench.analytics_series import medir
+
+
+def like(texto, limit=50):
+    with database.conectar(database.TARJETAS_DB) as conn:
+        return conn.execute("""
+            SELECT t.document_number, c.card_type, t.holder, t.date, t.description, t.amount_cents
+            FROM card_holder_expenses t
+            JOIN cards_resume_header c ON c.document_number = t.document_number
+            WHERE t.description LIKE ?
+            ORDER BY t.date DESC
+            LIMIT ?
+        """, (f"%{texto}%", limit)).fetchall()
+
+
+def ingesta(anio, tarjetas=24):
+    # Resumenes de un anio fuera del rango generado, para no chocar con los existentes
+    rnd = random.Random(anio)
+    por_titular = 200
+    lote = [
+        (f"bench-{anio}-{i}", date(anio, i % 12 + 1, 1), generador.resumen(rnd, por_titular, anio, i % 12 + 1), "visa")
+        for i in range(tarjetas)
+    ]
+    t0 = time.perf_counter()
+    database.insertar_resumenes_tarjeta(lote)
+    return (time.perf_counter() - t0) * 1000, tarjetas * por_titular * len(generador.TITULARES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--terms", default="COMERCIO 123,COMERCIO 4,USD")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool.pool.cerrar()
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        generador.generar(args.rows)
+        with database.conectar(database.TARJETAS_DB) as conn:
+            lineas = conn.execute("SELECT COUNT(*) FROM card_holder_expenses").fetchone()[0]
+
+        print(f"{lineas} lineas de resumen")
+        for termino in args.terms.split(","):
+            # Como el LIKE, palabras completas ordenadas por fecha; rank ordena por relevancia
+            fts_fecha = medir(lambda: database.buscar("cards", termino, order="date", prefijo=False))
+            fts_rank = medir(lambda: database.buscar("cards", termino, prefijo=False))
+            sin_indice = medir(lambda: like(termino), repeticiones=3)
+            print(f"  {termino!r:18} LIKE: {sin_indice:9.2f} ms | FTS fecha: {fts_fecha:8.2f} ms | FTS rank: {fts_rank:8.2f} ms")
+
+        con_indice, filas = ingesta(2030)
+        with database.conectar(database.TARJETAS_DB, escritura=True) as conn:
+            for evento in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER trg_card_holder_expenses_fts_{evento}")
+            conn.commit()
+        sin_triggers, _ = ingesta(2031)
+        print(f"  ingesta de {filas} lineas: {con_indice:.1f} ms con indice, {sin_triggers:.1f} ms sin indice")
+
+
+if __name__ == "__main__":
+    main()
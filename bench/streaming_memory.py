@@ -0,0 +1,72 @@
+"""
+Memoria pico y time-to-first-byte de un rango grande de gastos:
+respuesta armada en memoria (obtener_registros) vs streaming (stream_expenses).
+
+Uso: python -m bench.streaming_memory [--filas 500000]
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app import database
+from app.streaming import stream_expenses
+from bench.month_queries import poblar
+
+
+def medir(func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    primer_byte, total = func(t0)
+    duracion = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return primer_byte * 1000, duracion * 1000, pico / 2**20, total
+
+
+def en_memoria(desde, hasta):
+    def correr(t0):
+        # Igual que el endpoint clasico: lista completa + serializacion del cuerpo entero
+        totales = {}
+        registros = list(database.iter_registros(desde, hasta, totales))
+        cuerpo = json.dumps({"expenses": {"expenses": registros, **totales}}).encode()
+        return time.perf_counter() - t0, len(cuerpo)
+    return correr
+
+
+def en_streaming(desde, hasta):
+    def correr(t0):
+        primer_byte = None
+        total = 0
+        for parte in stream_expenses(desde, hasta):
+            if primer_byte is None:
+                primer_byte = time.perf_counter() - t0
+            total += len(parte)
+        return primer_byte, total
+    return correr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filas", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.crear_tabla_registros()
+        poblar(database.REGISTROS_DB, args.filas)
+
+        # Todo el rango generado por poblar (2015-2025)
+        desde, hasta = "2015-01-01", "2026-01-01"
+        for nombre, func in (("en memoria", en_memoria(desde, hasta)), ("streaming", en_streaming(desde, hasta))):
+            ttfb, duracion, pico, total = medir(func)
+            print(
+                f"{nombre:>10} | {args.filas} filas | TTFB: {ttfb:9.1f} ms | total: {duracion:9.1f} ms "
+                f"| pico: {pico:8.1f} MiB | {total / 2**20:6.1f} MiB de JSON"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Suite de benchmarks reproducible, sin red: endpoints de lectura, sync_data contra una
+planilla falsa, ingesta de resumes y /syncResumes contra el parser falso.
+
+Cada escala se genera con bench.generador (misma semilla -> mismos datos) en un
+directorio temporal. Los resultados (mediana en ms) se comparan contra un baseline JSON;
+si algun benchmark empeora mas que --tolerance el proceso sale con codigo 1.
+
+Uso:
+    python -m bench.suite [--scales 10000,100000,1000000] [--repeat 15]
+                          [--baseline bench/baseline.json] [--save-baseline] [--only expenses]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import database, db_pool
+from app.googlesheet import SHEET_HISTORIC_EXPENSES, SHEET_HISTORIC_INCOME, sheets
+from app.googlesheet_stub import LocalSheetClient
+from app.rates import StaticRateProvider
+from bench import generador
+from bench.fake_parser import iniciar_en_segundo_plano, resumen_sintetico
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Mes y rango consultados en todos los benchmarks de lectura
+ANIO, MES = 2020, 6
+RANGO = "from=2020-01-01&to=2020-12-31"
+
+
+def medir(func, repeticiones):
+    func()  # calentamiento: conexiones, caches de SQLite y del sistema de archivos
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        func()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return round(tiempos[len(tiempos) // 2] * 1000, 3)
+
+
+def preparar_escala(tmp: Path, filas: int, seed: int):
+    db_pool.pool.cerrar()
+    database.REGISTROS_DB = tmp / "registros.db"
+    database.TARJETAS_DB = tmp / "tarjetas.db"
+    t0 = time.perf_counter()
+    gastos, ingresos = generador.generar(filas, seed)
+    print(f"  datos generados en {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    return gastos, ingresos
+
+
+def benchmarks_lectura(client, response_cache):
+    def get(url):
+        def pedir():
+            # Sin cache: se mide el calculo de la respuesta, no el LRU
+            response_cache.clear()
+            respuesta = client.get(url)
+            assert respuesta.status_code == 200, (url, respuesta.status_code)
+            return respuesta
+        return pedir
+
+    def get_cacheado(url):
+        client.get(url)
+        return lambda: client.get(url)
+
+    return {
+        "expenses_month": get(f"/expenses/{ANIO}/{MES}"),
+        "expenses_month_raw": get(f"/expenses/{ANIO}/{MES}?raw=true"),
+        "expenses_month_stream": get(f"/expenses/{ANIO}/{MES}?stream=true"),
+        "expenses_month_cache_hit": get_cacheado(f"/expenses/{ANIO}/{MES}"),
+        "expenses_month_page": get(f"/expenses/{ANIO}/{MES}?limit=50"),
+        "incomes_month_page": get(f"/incomes/{ANIO}/{MES}?limit=50"),
+        "resume_expenses_page": get(f"/getResumeExpenses/{ANIO}/{MES}?limit=50"),
+        "expenses_range_year": get(f"/expenses?{RANGO}"),
+        "incomes_month": get(f"/incomes/{ANIO}/{MES}"),
+        "incomes_month_stream": get(f"/incomes/{ANIO}/{MES}?stream=true"),
+        "incomes_range_year": get(f"/incomes?{RANGO}"),
+        "resume_expenses": get(f"/getResumeExpenses/{ANIO}/{MES}"),
+        "resume_expenses_card": get(f"/getResumeExpenses/{ANIO}/{MES}/visa"),
+        "resume_expenses_holder": get(f"/getResumeExpenses/{ANIO}/{MES}/visa/TITULAR"),
+        "resume_expenses_stream": get(f"/getResumeExpenses/{ANIO}/{MES}?stream=true"),
+        "available_resumes": get(f"/getAvailableResumes/{ANIO}/{MES}"),
+        "analytics_series_expenses_year": get(f"/analytics/series?{RANGO}&group_by=type"),
+        "analytics_series_incomes_year": get(f"/analytics/series?{RANGO}&source=incomes"),
+        "analytics_series_cards_year": get(f"/analytics/series?{RANGO}&source=cards&group_by=card,holder"),
+        "analytics_series_card_expenses_year": get(f"/analytics/series?{RANGO}&source=card_expenses"),
+        "search_cards": get("/search?q=COMERCIO+123&source=cards&prefix=false"),
+        "search_cards_date": get("/search?q=COMERCIO+123&source=cards&prefix=false&order=date"),
+        "search_expenses_prefix": get("/search?q=gasto+12"),
+        "balance": get("/balance"),
+        "check_monthly_totals": get("/checkMonthlyTotals"),
+        "jobs": get("/jobs"),
+        "cache_stats": get("/cacheStats"),
+        "metrics": get("/metrics"),
+    }
+
+
+def benchmarks_sync(app_main, gastos, ingresos):
+    # Planilla falsa con las mismas filas que la base; la version "editada" cambia el 1%
+    editada = generador.modificar(gastos, 0.01)
+    hojas = {SHEET_HISTORIC_EXPENSES: gastos, SHEET_HISTORIC_INCOME: ingresos}
+    cliente = LocalSheetClient(hojas)
+    sheets.use_client(cliente)
+
+    def sync_gastos():
+        resultado = app_main.sync_data(app_main.get_historic_expenses, database.apply_expenses_sync,
+                                       database.get_sqlite_expense_uuids, "bench")
+        assert "error" not in resultado, resultado
+        return resultado
+
+    alternar = [editada, gastos]
+
+    def sync_con_cambios():
+        # Cada corrida alterna entre la hoja original y la editada: siempre hay 1% de updates
+        cliente.spreadsheet.worksheets()[SHEET_HISTORIC_EXPENSES].values = alternar[0]
+        alternar.reverse()
+        resultado = sync_gastos()
+        assert resultado["updated"] > 0 or len(gastos) < 101, resultado
+
+    def sync_sin_cambios():
+        cliente.spreadsheet.worksheets()[SHEET_HISTORIC_EXPENSES].values = gastos
+        resultado = sync_gastos()
+        assert resultado["updated"] == 0, resultado
+
+    def sync_ingresos():
+        resultado = app_main.sync_data(app_main.get_historic_income, database.apply_incomes_sync,
+                                       database.get_sqlite_income_uuids, "bench incomes")
+        assert "error" not in resultado, resultado
+
+    # El primer sync deja la hoja original aplicada antes de medir
+    sync_sin_cambios()
+    return {
+        "sync_expenses_unchanged": sync_sin_cambios,
+        "sync_expenses_1pct_updated": sync_con_cambios,
+        "sync_incomes_unchanged": sync_ingresos,
+    }
+
+
+def benchmarks_ingesta():
+    contador = {"n": 0}
+    payload = resumen_sintetico("bench-ingesta", holders=2, lines=500)
+
+    def insertar():
+        # Un resumen nuevo por corrida (document_number distinto), 1000 lineas
+        contador["n"] += 1
+        documento = f"bench-{contador['n']}"
+        assert database.insertar_resumen_tarjeta(documento, generador.date(2026, 1, 1), payload, "visa")
+
+    return {"ingest_resume_1000_lines": insertar}
+
+
+def benchmarks_sync_resumes(app_main, tmp: Path):
+    servidor, url = iniciar_en_segundo_plano(delay=0)
+    os.environ["PARSE_PDF_ENDPOINT"] = url
+    carpeta = tmp / "resumenes"
+    for tarjeta in ("visa", "mastercard"):
+        (carpeta / tarjeta).mkdir(parents=True, exist_ok=True)
+        for mes in range(1, 5):
+            (carpeta / tarjeta / f"{mes:02}-2026.pdf").write_bytes(os.urandom(50_000))
+    os.environ["RESUMES_LOCAL_LOCATION"] = str(carpeta)
+
+    def sync_resumes():
+        # force=true vuelve a parsear los 8 PDFs; desde la segunda corrida los documentos ya
+        # cargados se informan como existentes y no se insertan de nuevo
+        respuesta = asyncio.run(app_main.procesar_resumenes(force=True))
+        errores = [f for f in respuesta["procesados_fallidos"] if f["motivo"] != "Resumen ya existe"]
+        assert not errores, errores
+
+    return {"sync_resumes_8_pdfs": sync_resumes}, servidor
+
+
+def correr_escala(filas, seed, repeticiones, solo):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        gastos, ingresos = preparar_escala(tmp, filas, seed)
+
+        # Imports despues de apuntar las bases al directorio temporal
+        from fastapi.testclient import TestClient
+        from app import main as app_main
+        from app.cache import response_cache
+
+        database.dolar_blue.provider = StaticRateProvider(1000)
+        database.dolar_blue.invalidate()
+        client = TestClient(app_main.app)
+
+        servidor = None
+        grupos = [
+            (benchmarks_lectura(client, response_cache), repeticiones),
+            (benchmarks_sync(app_main, gastos, ingresos), max(3, repeticiones // 5)),
+            (benchmarks_ingesta(), repeticiones),
+        ]
+        parser_benchs, servidor = benchmarks_sync_resumes(app_main, tmp)
+        grupos.append((parser_benchs, max(3, repeticiones // 5)))
+
+        try:
+            for benchs, veces in grupos:
+                for nombre, func in benchs.items():
+                    if solo and not any(s in nombre for s in solo):
+                        continue
+                    resultados[nombre] = medir(func, veces)
+                    print(f"  {nombre:<38} {resultados[nombre]:>10.3f} ms", file=sys.stderr)
+        finally:
+            servidor.shutdown()
+            db_pool.pool.cerrar()
+    return resultados
+
+
+def comparar(actual, baseline, tolerancia, minimo_ms):
+    """
+    Devuelve las regresiones: benchmarks mas lentos que el baseline por encima de la
+    tolerancia relativa y de `minimo_ms` absolutos (los de pocos ms son ruidosos).
+    """
+    regresiones = []
+    for escala, benchs in actual.items():
+        base = baseline.get("results", {}).get(escala, {})
+        for nombre, ms in benchs.items():
+            anterior = base.get(nombre)
+            if anterior is None:
+                continue
+            cambio = (ms - anterior) / anterior if anterior else 0.0
+            marca = ""
+            if cambio > tolerancia and ms - anterior > minimo_ms:
+                marca = "  <-- regresion"
+                regresiones.append((escala, nombre, anterior, ms))
+            print(f"{escala:>8} {nombre:<38} {anterior:>10.3f} -> {ms:>10.3f} ms ({cambio:+7.1%}){marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", default="", help="Subcadenas de nombres de benchmark, separadas por coma")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo permitido (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Diferencia absoluta minima para contar una regresion")
+    parser.add_argument("--output", help="Guardar los resultados de esta corrida en un JSON")
+    args = parser.parse_args()
+
+    # Los logs de la app (JSON por linea) no se mezclan con la salida del benchmark
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    solo = [s for s in args.only.split(",") if s]
+
+    resultados = {}
+    for filas in [int(s) for s in args.scales.split(",")]:
+        print(f"escala {filas} filas", file=sys.stderr)
+        resultados[str(filas)] = correr_escala(filas, args.seed, args.repeat, solo)
+
+    corrida = {
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "results": resultados,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(corrida, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        # Se conservan las escalas y los benchmarks del baseline que no se corrieron esta vez
+        anterior = json.loads(baseline_path.read_text()).get("results", {}) if baseline_path.exists() else {}
+        for escala, benchs in resultados.items():
+            anterior[escala] = {**anterior.get(escala, {}), **benchs}
+        corrida["results"] = anterior
+        baseline_path.write_text(json.dumps(corrida, indent=2) + "\n")
+        print(f"baseline guardado en {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"sin baseline en {baseline_path}; correr con --save-baseline para crearlo")
+        return
+    regresiones = comparar(resultados, json.loads(baseline_path.read_text()), args.tolerance, args.min_delta_ms)
+    if regresiones:
+        print(f"{len(regresiones)} regresiones por encima de {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
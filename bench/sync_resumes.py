@@ -0,0 +1,59 @@
+"""
+Throughput de /syncResumes contra el parser falso con distintos niveles de concurrencia.
+
+Uso: python -m bench.sync_resumes [--files 24 --delay 0.3 --concurrency 1,4,8]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app import database, migrations
+from bench.fake_parser import iniciar_en_segundo_plano
+
+
+def crear_pdfs(carpeta: Path, cantidad: int):
+    for tarjeta in ("visa", "mastercard"):
+        (carpeta / tarjeta).mkdir(parents=True)
+        for i in range(cantidad // 2):
+            anio, mes = 2015 + i // 12, i % 12 + 1
+            (carpeta / tarjeta / f"{mes:02}-{anio}.pdf").write_bytes(os.urandom(200_000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--delay", type=float, default=0.3)
+    parser.add_argument("--concurrency", default="1,4,8")
+    args = parser.parse_args()
+
+    servidor, url = iniciar_en_segundo_plano(delay=args.delay)
+    os.environ["PARSE_PDF_ENDPOINT"] = url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.REGISTROS_DB = Path(tmp) / "registros.db"
+        database.TARJETAS_DB = Path(tmp) / "tarjetas.db"
+        migrations.aplicar_migraciones()
+        from app import main as app_main
+
+        crear_pdfs(Path(tmp) / "resumenes", args.files)
+        os.environ["RESUMES_LOCAL_LOCATION"] = str(Path(tmp) / "resumenes")
+
+        for concurrencia in [int(c) for c in args.concurrency.split(",")]:
+            database.TARJETAS_DB = Path(tmp) / f"tarjetas-{concurrencia}.db"
+            database.crear_tablas_resumen_tarjeta()
+            app_main.PARSE_PDF_CONCURRENCY = concurrencia
+
+            t0 = time.perf_counter()
+            respuesta = asyncio.run(app_main.sync_resumes())
+            duracion = time.perf_counter() - t0
+            print(f"concurrencia {concurrencia:>2}: {args.files} PDFs en {duracion:6.2f} s "
+                  f"({args.files / duracion:5.2f} PDFs/s) | status {respuesta.status_code}")
+
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
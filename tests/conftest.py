@@ -0,0 +1,17 @@
+import pytest
+
+from app import database, db_pool, migrations
+from app.cache import response_cache
+
+
+@pytest.fixture
+def bases(tmp_path, monkeypatch):
+    """Bases nuevas y migradas en un directorio temporal, con el cache de respuestas vacio."""
+    db_pool.pool.cerrar()
+    monkeypatch.setattr(database, "REGISTROS_DB", tmp_path / "registros.db")
+    monkeypatch.setattr(database, "TARJETAS_DB", tmp_path / "tarjetas.db")
+    migrations.aplicar_migraciones()
+    response_cache.clear()
+    yield tmp_path
+    response_cache.clear()
+    db_pool.pool.cerrar()
@@ -0,0 +1,163 @@
+"""Invalidacion del cache de respuestas: versiones por (dominio, mes), ETag/304 y escrituras."""
+import json
+import threading
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app import main
+from app.cache import CARDS, EXPENSES, INCOMES, ResponseCache, Versiones, response_cache
+
+
+# ------------------- Versiones -------------------
+
+def test_bump_de_un_mes_no_toca_los_demas():
+    versiones = Versiones()
+    antes = versiones.version(EXPENSES, 2024, 3), versiones.version(EXPENSES, 2024, 4)
+    versiones.bump(EXPENSES, ["2024-03"])
+    assert versiones.version(EXPENSES, 2024, 3) != antes[0]
+    assert versiones.version(EXPENSES, 2024, 4) == antes[1]
+
+
+def test_dominios_aislados():
+    versiones = Versiones()
+    antes = versiones.version(INCOMES, 2024, 3), versiones.version(CARDS, 2024, 3)
+    versiones.bump(EXPENSES, ["2024-03"])
+    versiones.bump(EXPENSES)
+    assert (versiones.version(INCOMES, 2024, 3), versiones.version(CARDS, 2024, 3)) == antes
+
+
+def test_bump_del_dominio_invalida_todos_sus_meses():
+    versiones = Versiones()
+    antes = [versiones.version(INCOMES, 2024, m) for m in (1, 2, 12)]
+    versiones.bump(INCOMES)
+    assert all(versiones.version(INCOMES, 2024, m) != v for m, v in zip((1, 2, 12), antes))
+
+
+def test_versiones_compartidas_entre_workers(bases):
+    # Dos instancias sobre la misma base: como dos procesos de uvicorn
+    worker_a, worker_b = Versiones(), Versiones()
+    for versiones in (worker_a, worker_b):
+        versiones.usar_base(lambda: database.REGISTROS_DB)
+    antes = worker_b.version(EXPENSES, 2024, 3)
+    worker_a.bump(EXPENSES, ["2024-03"])
+    assert worker_b.version(EXPENSES, 2024, 3) != antes
+    assert worker_b.version(EXPENSES, 2024, 4) == (0, 0)
+
+
+# ------------------- ResponseCache -------------------
+
+def test_entrada_con_version_vieja_no_se_sirve():
+    cache = ResponseCache(max_entries=10, max_bytes=1 << 20)
+    cache.put("k", (0, 1), b"viejo")
+    assert cache.get("k", (0, 2)) is None
+    assert cache.stale == 1
+    # La entrada vieja se descarta: ni siquiera con la version anterior vuelve
+    assert cache.get("k", (0, 1)) is None
+
+
+def test_etag_cambia_con_el_cuerpo():
+    cache = ResponseCache(max_entries=10, max_bytes=1 << 20)
+    assert cache.put("a", (0, 0), b"uno").etag == cache.put("b", (0, 0), b"uno").etag
+    assert cache.put("a", (0, 0), b"uno").etag != cache.put("a", (0, 1), b"dos").etag
+
+
+def test_limites_de_entradas_y_bytes():
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    for clave in "abc":
+        cache.put(clave, 0, b"x")
+    assert cache.get("a", 0) is None and cache.get("c", 0) is not None
+    cache.put("grande", 0, b"x" * 11)
+    assert cache.get("grande", 0) is None
+
+
+# ------------------- Endpoints -------------------
+
+@pytest.fixture
+def client(bases):
+    database.insertar_registro("g1", "2024-03-10T10:00:00", "cafe", 100.5, "Salidas")
+    database.insertar_registro("g2", "2024-04-10T10:00:00", "taxi", 50, "Transporte")
+    return TestClient(main.app)
+
+
+def hits():
+    return response_cache.stats()["hits"]
+
+
+def test_segundo_get_sale_del_cache_con_el_mismo_etag(client):
+    primero = client.get("/expenses/2024/3")
+    antes = hits()
+    segundo = client.get("/expenses/2024/3")
+    assert hits() == antes + 1
+    assert segundo.content == primero.content
+    assert segundo.headers["etag"] == primero.headers["etag"]
+
+
+def test_version_se_lee_fuera_del_event_loop(client, monkeypatch):
+    # cache_versions es una consulta a SQLite: tiene que ir por el executor de lectura
+    hilos = []
+    original = main.versiones.version
+
+    def version(*args):
+        hilos.append(threading.current_thread().name)
+        return original(*args)
+
+    monkeypatch.setattr(main.versiones, "version", version)
+    client.get("/expenses/2024/3")
+    client.get("/expenses/2024/3")
+    assert len(hilos) == 2 and all(h.startswith("db-read") for h in hilos)
+
+
+def test_if_none_match_devuelve_304(client):
+    etag = client.get("/expenses/2024/3").headers["etag"]
+    respuesta = client.get("/expenses/2024/3", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 304
+    assert respuesta.content == b""
+    assert client.get("/expenses/2024/3", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_escritura_invalida_el_mes_y_no_queda_nada_viejo(client):
+    etag = client.get("/expenses/2024/3").headers["etag"]
+    database.insertar_registro("g3", "2024-03-20T10:00:00", "super", 10, "Supermercado")
+
+    respuesta = client.get("/expenses/2024/3", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["etag"] != etag
+    assert {g["uuid"] for g in respuesta.json()["expenses"]["expenses"]} == {"g1", "g3"}
+    # Las paginas del mismo mes tambien se recalculan
+    assert len(client.get("/expenses/2024/3", params={"limit": 10}).json()["expenses"]["expenses"]) == 2
+
+
+def test_escritura_no_invalida_otros_meses_ni_dominios(client):
+    client.get("/expenses/2024/4")
+    client.get("/incomes/2024/3")
+    database.insertar_registro("g3", "2024-03-20T10:00:00", "super", 10, "Supermercado")
+    antes = hits()
+    client.get("/expenses/2024/4")
+    client.get("/incomes/2024/3")
+    assert hits() == antes + 2
+
+
+def test_cotizacion_solo_invalida_ingresos_si_cambia(client):
+    database.save_rate("dolar_blue_buy", 1000.0, "2024-03-01T10:00:00")
+    client.get("/incomes/2024/3")
+    antes = hits()
+    database.save_rate("dolar_blue_buy", 1000.0, "2024-03-01T11:00:00")
+    client.get("/incomes/2024/3")
+    assert hits() == antes + 1
+
+    database.save_rate("dolar_blue_buy", 1100.0, "2024-03-01T12:00:00")
+    client.get("/incomes/2024/3")
+    assert hits() == antes + 1
+
+
+def test_carga_de_resumen_invalida_el_mes_de_tarjetas(client):
+    ahora = datetime.now()
+    url = f"/getResumeExpenses/{ahora.year}/{ahora.month}"
+    assert client.get(url).json()["cards"] == []
+    payload = {"TITULAR": {"Detail": [{"descripcion": "COMERCIO", "importe": "10,00", "fechaTimestamp": "2024-01-01"}]}}
+    cargado = client.post("/loadCardResume", content=json.dumps(payload), headers={"card_type": "visa"})
+    assert cargado.status_code == 200
+    assert [c["card_type"] for c in client.get(url).json()["cards"]] == ["visa"]
@@ -0,0 +1,104 @@
+"""Sync incremental de las hojas historicas contra el cliente local (sin Google)."""
+import pytest
+
+from app import database
+from app import main
+from app.googlesheet import SHEET_HISTORIC_EXPENSES, sheets
+from app.googlesheet_stub import LocalSheetClient
+from bench import generador
+
+
+@pytest.fixture
+def hoja(bases):
+    valores = generador.hoja_gastos(50)
+    cliente = LocalSheetClient({SHEET_HISTORIC_EXPENSES: valores})
+    sheets.use_client(cliente)
+    yield cliente.spreadsheet, valores
+    sheets.use_client(None)
+
+
+def sync():
+    resultado = main.correr_sync_historic_expenses()
+    assert "error" not in resultado, resultado
+    return resultado
+
+
+def uuids(valores):
+    return {fila[4] for fila in valores[1:]}
+
+
+def test_primer_sync_es_completo(hoja):
+    _, valores = hoja
+    resultado = sync()
+    assert resultado["mode"] == "full"
+    assert resultado["inserted"] == 50
+    assert database.get_sqlite_expense_uuids() == uuids(valores)
+
+
+def test_sin_cambios_en_last_update_time_no_lee_filas(hoja):
+    spreadsheet, valores = hoja
+    sync()
+    # Una fila nueva sin tocar lastUpdateTime: el sync confia en el token y no la ve
+    valores.append(["01/01/2025 10:00:00", "nuevo", "$10.00", "Otros", "g-nuevo"])
+    resultado = sync()
+    assert resultado["mode"] == "incremental"
+    assert resultado["state"].endswith("unchanged")
+    assert "g-nuevo" not in database.get_sqlite_expense_uuids()
+
+
+def test_filas_agregadas_se_leen_incrementalmente(hoja):
+    spreadsheet, valores = hoja
+    sync()
+    valores.extend([
+        ["01/01/2025 10:00:00", "nuevo 1", "$10.00", "Otros", "g-nuevo-1"],
+        ["02/01/2025 10:00:00", "nuevo 2", "$20.50", "Salidas", "g-nuevo-2"],
+    ])
+    spreadsheet.touch()
+    resultado = sync()
+    assert resultado["mode"] == "incremental"
+    assert resultado["inserted"] == 2
+    assert database.get_sqlite_expense_uuids() == uuids(valores)
+
+    # El estado avanzo: la siguiente corrida solo ve lo que se agregue despues
+    valores.append(["03/01/2025 10:00:00", "nuevo 3", "$5.00", "Otros", "g-nuevo-3"])
+    spreadsheet.touch()
+    resultado = sync()
+    assert (resultado["mode"], resultado["inserted"]) == ("incremental", 1)
+
+
+def test_edicion_de_la_fila_ancla_fuerza_sync_completo(hoja):
+    spreadsheet, valores = hoja
+    sync()
+    # La ultima fila sincronizada es el ancla: si cambia, el incremental no es confiable
+    valores[-1][2] = "$999.99"
+    spreadsheet.touch()
+    resultado = sync()
+    assert resultado["mode"] == "full"
+    assert resultado["updated"] == 1
+    with database.conectar(database.REGISTROS_DB) as conn:
+        importe = conn.execute("SELECT importe_cents FROM registros WHERE uuid = ?", (valores[-1][4],)).fetchone()[0]
+    assert importe == 99999
+
+
+def test_fila_insertada_en_el_medio_fuerza_sync_completo(hoja):
+    spreadsheet, valores = hoja
+    sync()
+    # Una fila en el medio corre el ancla una posicion
+    valores.insert(10, ["05/05/2020 10:00:00", "en el medio", "$1.00", "Otros", "g-medio"])
+    spreadsheet.touch()
+    resultado = sync()
+    assert resultado["mode"] == "full"
+    assert resultado["inserted"] == 1
+    assert database.get_sqlite_expense_uuids() == uuids(valores)
+
+
+def test_filas_borradas_se_eliminan_con_sync_completo(hoja):
+    spreadsheet, valores = hoja
+    sync()
+    borrada = valores.pop(20)
+    spreadsheet.touch()
+    resultado = sync()
+    assert resultado["mode"] == "full"
+    assert resultado["deleted"] == 1
+    assert borrada[4] not in database.get_sqlite_expense_uuids()
+    assert database.get_sqlite_expense_uuids() == uuids(valores)
@@ -0,0 +1,108 @@
+"""/syncResumes contra el parser falso de bench: reintentos, timeouts e inserts por lotes."""
+import asyncio
+import os
+
+import pytest
+
+from app import database
+from app import main
+from bench.fake_parser import PDF_INVALIDO, PDF_LENTO, iniciar_en_segundo_plano
+
+
+@pytest.fixture
+def parser(bases, monkeypatch):
+    """Arranca el parser falso (fail_first, slow_delay...) y apunta /syncResumes a el."""
+    servidores = []
+
+    def iniciar(**kwargs):
+        servidor, url = iniciar_en_segundo_plano(delay=0.01, lines=5, **kwargs)
+        servidores.append(servidor)
+        monkeypatch.setenv("PARSE_PDF_ENDPOINT", url)
+        return servidor
+
+    monkeypatch.setenv("RESUMES_LOCAL_LOCATION", str(bases / "resumenes"))
+    monkeypatch.setattr(main, "PARSE_PDF_RETRIES", 1)
+    monkeypatch.setattr(main, "PARSE_PDF_BACKOFF_SEC", 0.01)
+    monkeypatch.setattr(main, "RESUMES_INSERT_BATCH", 1)
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def crear_pdfs(directorio, cantidad, extra=None):
+    """PDFs visa/01-2024.pdf, 02-2024.pdf...; extra: {nombre: marcador del parser falso}."""
+    carpeta = directorio / "resumenes" / "visa"
+    carpeta.mkdir(parents=True)
+    for i in range(cantidad):
+        (carpeta / f"{i + 1:02}-2024.pdf").write_bytes(os.urandom(1000))
+    for nombre, marcador in (extra or {}).items():
+        (carpeta / nombre).write_bytes(marcador + os.urandom(1000))
+
+
+def documentos():
+    with database.conectar(database.TARJETAS_DB) as conn:
+        return conn.execute("SELECT COUNT(*) FROM cards_resume_header").fetchone()[0]
+
+
+def sync():
+    return asyncio.run(main.procesar_resumenes())
+
+
+def test_falla_transitoria_se_reintenta(parser, bases):
+    servidor = parser(fail_first=1)
+    crear_pdfs(bases, 3)
+
+    resultado = sync()
+    assert len(resultado["procesados_ok"]) == 3
+    assert resultado["procesados_fallidos"] == []
+    # Un 503 y el reintento por cada PDF
+    assert sorted(servidor.intentos.values()) == [2, 2, 2]
+    assert documentos() == 3
+
+
+def test_timeout_por_pdf_no_frena_a_los_demas(parser, bases, monkeypatch):
+    monkeypatch.setattr(main, "PARSE_PDF_TIMEOUT_SEC", 0.2)
+    parser(slow_delay=2)
+    crear_pdfs(bases, 2, {"12-2024.pdf": PDF_LENTO})
+
+    resultado = sync()
+    assert {r["archivo"] for r in resultado["procesados_ok"]} == {"01-2024.pdf", "02-2024.pdf"}
+    assert [(f["archivo"], f["motivo"]) for f in resultado["procesados_fallidos"]] == [("12-2024.pdf", "POST fallido: timeout")]
+    assert documentos() == 2
+
+
+def test_pdf_mal_formado_se_saltea_y_los_demas_se_guardan(parser, bases, monkeypatch):
+    # Todos en el mismo lote: el resumen invalido no tiene que tirar la transaccion
+    monkeypatch.setattr(main, "RESUMES_INSERT_BATCH", 0)
+    parser()
+    crear_pdfs(bases, 3, {"12-2024.pdf": PDF_INVALIDO})
+
+    resultado = sync()
+    assert len(resultado["procesados_ok"]) == 3
+    [fallido] = resultado["procesados_fallidos"]
+    assert fallido["archivo"] == "12-2024.pdf"
+    assert fallido["motivo"].startswith("Resumen invalido: KeyError")
+    assert documentos() == 3
+    # Queda fuera del indice: el proximo sync lo vuelve a intentar y saltea los guardados
+    resultado = sync()
+    assert resultado["omitidos_por_indice"] == 3
+    assert [f["archivo"] for f in resultado["procesados_fallidos"]] == ["12-2024.pdf"]
+
+
+def test_se_inserta_mientras_se_sigue_parseando(parser, bases, monkeypatch):
+    monkeypatch.setattr(main, "PARSE_PDF_TIMEOUT_SEC", 0.5)
+    parser(slow_delay=2)
+    crear_pdfs(bases, 3, {"12-2024.pdf": PDF_LENTO})
+
+    async def correr():
+        tarea = asyncio.create_task(main.procesar_resumenes())
+        # El PDF lento retiene el sync (dos timeouts); los rapidos ya tienen que estar guardados
+        while not tarea.done() and await main.repo.leer(documentos) < 3:
+            await asyncio.sleep(0.01)
+        en_curso = not tarea.done()
+        await tarea
+        return en_curso
+
+    assert asyncio.run(correr())
+    assert documentos() == 3